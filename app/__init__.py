@@ -1,25 +1,53 @@
 # app/__init__.py
 
+import atexit
 import os
-from dotenv import load_dotenv
-load_dotenv()  # ✅ Load .env variables at app startup
+from .config import Config  # ✅ Loads .env first, so every module below sees it
 
+import click
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
 from flask_login import LoginManager
-from .config import Config
 from .models import db, User
 
-migrate = Migrate()
+migrate = None  # ✅ Flask-Migrate, set up only for CLI commands (see _init_migrate)
 login_manager = LoginManager()
 
+def _init_migrate(app):
+    """
+    Register Flask-Migrate when running a `flask` command (`flask db upgrade` ...).
+
+    Web workers never run migrations, so they skip importing flask_migrate
+    and alembic, which are a large part of a cold start.
+    """
+    global migrate
+    if click.get_current_context(silent=True) is None:
+        return
+    from flask_migrate import Migrate
+    migrate = Migrate()
+    migrate.init_app(app, db)
+
 def create_app():
     app = Flask(__name__)
     app.config.from_object(Config)
 
-    db.init_app(app)
-    migrate.init_app(app, db)
+    # ✅ Engine options + SQLite pragmas from the DB tuning profile
+    from app.services.db_tuning import init_database
+    init_database(app, db)
+    _init_migrate(app)
+
+    # ✅ Note content is stored compressed on SQLite; load the dictionaries and note_text()
+    from app.services.compression_service import init_compression
+    with app.app_context():
+        init_compression(db.engine)
+
+    # ✅ Opt-in (METRICS_ENABLED=1): Server-Timing header, /metrics, slow-request profiles
+    from app.services.metrics_service import init_metrics
+    init_metrics(app, db)
+
+    # ✅ Compiled templates cached on disk, {% cache %} fragments in memory
+    from app.services.template_service import init_templates
+    init_templates(app)
 
     login_manager.init_app(app)
     login_manager.login_view = 'auth.login'  # Redirect to login if not authenticated
@@ -28,9 +56,19 @@ def create_app():
     from app.routes import bp as main_bp
     app.register_blueprint(main_bp)
 
+    # ✅ Close pooled LLM clients (and their keep-alive connections) on shutdown
+    from app.services.client_registry import shutdown_clients
+    atexit.register(shutdown_clients)
+
+    # ✅ Password hashing runs in a worker pool; stop it with the app
+    from app.services.auth_service import password_hasher, user_cache
+    atexit.register(password_hasher.shutdown)
+    user_cache.watch(User)
+
     return app
 
-# ✅ Load user from session
+# ✅ Load user from session (short-lived per-process cache, dropped when the user is updated)
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    from app.services.auth_service import user_cache
+    return user_cache.get(db.session, User, int(user_id))
@@ -1,16 +1,46 @@
-from flask import Flask, render_template, redirect, url_for, request, flash, session, send_file, jsonify
+import config  # noqa: F401  (loads .env once, before any service reads its defaults)
+from flask import Flask, render_template, redirect, url_for, request, flash, session, send_file, jsonify, make_response, Response, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
-from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.utils import secure_filename
-from io import BytesIO
-from fpdf import FPDF
 from models import db, User, Topic, Subtopic, Notebook, Note, CustomPrompt
-from services.llm_service import generate_llm_response
+from services.llm_service import STRATEGIES, LLMError, generate_llm_response, stream_llm_response, is_error_response
+from services.llm_backends import BACKENDS
+from services.cache_service import get_response_cache
+from services.client_registry import shutdown_clients
+from services.prompt_service import max_tokens_for, prompt_registry
+from services.token_service import PromptTooLong, TokenUsage, count_tokens, fit_custom_prompt
+from services.semantic_cache import semantic_cache
+from services.rate_limit_service import RateLimited, quotas
+from services.auth_service import HashingBusy, password_hasher, user_cache
+from services.startup_service import WARM_UP_ON_START, import_breakdown, import_times, startup
+from services.template_service import init_templates
+from services.import_service import SUPPORTED_EXTENSIONS, SyllabusFormatError, read_syllabus, sync_syllabus
+from services.search_service import DEFAULT_PER_PAGE, MAX_PER_PAGE, init_search, search_notes
+from services.compression_service import init_compression, note_codec, recompress, store_dictionary, train_dictionary
+from services.notebook_service import DEFAULT_PAGE_SIZE, list_notes, note_to_dict
+from services.export_service import (
+    FORMATS as EXPORT_FORMATS, WRITERS as EXPORT_WRITERS, iter_notes, notebook_version, stream_text
+)
+from services.artifact_service import artifact_store, version_key
+from services.job_service import JobQueue, QueueFull
+from services.history_service import HistoryStore, new_history_id
+from services.reference_service import saved_prompts, topic_cache
+from services.db_tuning import init_database
+from services.schema_service import add_missing_columns
+from services.metrics_service import init_metrics
+from services.batch_service import (
+    DEFAULT_BATCH_CHUNK_SIZE, DEFAULT_BATCH_CONCURRENCY, DEFAULT_REQUESTS_PER_MINUTE,
+    RateLimiter, retry_with_backoff, run_batch
+)
+from sqlalchemy import insert
+import atexit
+import click
+import math
 import os
-import glob
-import unicodedata
-import pandas as pd
+import json
+import threading
+import time
 
 # ------------------------
 # App Config
@@ -19,19 +49,83 @@ app = Flask(__name__)
 app.config['SECRET_KEY'] = 'your_secret_key_here'
 
 basedir = os.path.abspath(os.path.dirname(__file__))
-app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(basedir, '../instance/app.db')}"
-db.init_app(app)
+# APP_DEBUG_DATABASE_URL points the standalone app at another database (benchmarks, a scratch copy)
+app.config['SQLALCHEMY_DATABASE_URI'] = (os.getenv('APP_DEBUG_DATABASE_URL')
+                                         or f"sqlite:///{os.path.join(basedir, '../instance/app.db')}")
+# WAL, synchronous=NORMAL, busy_timeout and mmap pragmas on every connection (see services/db_tuning.py)
+with startup.phase('database'):
+    init_database(app, db)
+
+# Opt-in instrumentation (METRICS_ENABLED=1): Server-Timing header, /metrics, slow-request profiles
+with startup.phase('metrics'):
+    init_metrics(app, db)
+
+# Compiled templates cached on disk; {% cache %} fragments (note cards, topic list) cached in memory
+init_templates(app)
 
 login_manager = LoginManager()
 login_manager.login_view = 'login'
 login_manager.init_app(app)
 
+# Response history lives server-side; the session cookie only holds its id and position
+history_store = HistoryStore()
+
+def _topic_tree():
+    """Topics/subtopics served from memory; reloaded only after a syllabus import."""
+    return topic_cache.get(db.session, Topic, Subtopic)
+
+# Full-text search index (no-op until the tables exist); columns added since the DB was created;
+# note compression dictionaries
+with startup.phase('schema + search index'), app.app_context():
+    add_missing_columns(db.engine, db.metadata)
+    init_compression(db.engine)
+    init_search(db.engine)
+
+# Close pooled LLM clients and the password hashing pool on worker shutdown
+atexit.register(shutdown_clients)
+atexit.register(password_hasher.shutdown)
+
+# ------------------------
+# Rate Limits
+# ------------------------
+@app.errorhandler(RateLimited)
+def rate_limited(e):
+    """429 with Retry-After; JSON for API, async and streaming callers, a plain message for form posts."""
+    retry_after = max(1, math.ceil(e.retry_after))
+    if request.path.startswith('/api/') or request.path == '/generate_stream' or request.form.get('async') == '1':
+        response = jsonify({"error": str(e), "retry_after": retry_after})
+    else:
+        response = make_response(str(e))
+    response.status_code = 429
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
+@app.errorhandler(HashingBusy)
+def hashing_busy(e):
+    """503 with Retry-After when the password hashing queue is full (a login storm)."""
+    response = make_response(str(e))
+    response.status_code = 503
+    response.headers['Retry-After'] = str(max(1, math.ceil(e.retry_after)))
+    return response
+
+def _reserve_user_quota(prompt, max_tokens):
+    """Charge this request to the user's requests/tokens per minute before any provider call (429 when exhausted)."""
+    return quotas.reserve_user(current_user.id, count_tokens(prompt) + max_tokens)
+
+def _tokens_used(usage):
+    if usage.prompt_tokens is None and usage.completion_tokens is None:
+        return None
+    return (usage.prompt_tokens or 0) + (usage.completion_tokens or 0)
+
 # ------------------------
 # Login Manager
 # ------------------------
+# Users are served from a short-lived per-process cache; ORM updates to a user drop its entry
+user_cache.watch(User)
+
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    return user_cache.get(db.session, User, int(user_id))
 
 # ------------------------
 # Routes
@@ -49,9 +143,15 @@ def login():
         email = request.form['email']
         password = request.form['password']
         user = User.query.filter_by(email=email).first()
-        if user and check_password_hash(user.password, password):
-            login_user(user)
-            return redirect(url_for('select'))
+        if user:
+            matches, new_hash = password_hasher.verify(user.password, password)
+            if matches:
+                if new_hash:
+                    # Hash parameters changed since this password was stored
+                    user.password = new_hash
+                    db.session.commit()
+                login_user(user)
+                return redirect(url_for('select'))
         flash('Invalid credentials')
     return render_template('login.html')
 
@@ -60,10 +160,10 @@ def register():
     if request.method == 'POST':
         username = request.form['email'].split('@')[0]
         email = request.form['email']
-        password = generate_password_hash(request.form['password'])
         if User.query.filter_by(email=email).first():
             flash('Email already registered')
         else:
+            password = password_hasher.hash(request.form['password'])
             user = User(username=username, email=email, password=password)
             db.session.add(user)
             db.session.commit()
@@ -81,31 +181,51 @@ def logout():
 # ------------------------
 # Topic Selection & Prompt Page
 # ------------------------
+# Saved prompts for the select page are cached per user; saving a new prompt drops that user's entry
+saved_prompts.watch(CustomPrompt)
+
 @app.route('/select')
 @login_required
 def select():
-    topics = Topic.query.all()
-    prompt_dir = os.path.join(basedir, 'prompts/templates/')
-    prompt_types = []
-    if os.path.exists(prompt_dir):
-        prompt_files = glob.glob(os.path.join(prompt_dir, '*.txt'))
-        prompt_types = [os.path.splitext(os.path.basename(p))[0] for p in prompt_files]
-    custom_prompts = CustomPrompt.query.filter_by(user_id=current_user.id).all()
-    return render_template('select.html', topics=topics, prompt_types=prompt_types, custom_prompts=custom_prompts)
+    topic_tree = _topic_tree()
+    topics = topic_tree.topics
+    prompt_types = prompt_registry.prompt_types()
+    custom_prompts = saved_prompts.get(db.session, CustomPrompt, current_user.id)
+    return render_template('select.html', topics=topics, prompt_types=prompt_types, custom_prompts=custom_prompts,
+                           topics_version=topic_tree.etag)
 
 # ------------------------
 # API: Get Subtopics
 # ------------------------
+SUBTOPICS_MAX_AGE = int(os.getenv("SUBTOPICS_MAX_AGE", "86400"))
+
 @app.route('/api/subtopics/<int:topic_id>')
 @login_required
 def get_subtopics(topic_id):
-    subtopics = Subtopic.query.filter_by(topic_id=topic_id).all()
-    return jsonify({"subtopics": [{"id": s.id, "name": s.name} for s in subtopics]})
+    topic_tree = _topic_tree()
+    response = jsonify({"subtopics": [{"id": s.id, "name": s.name} for s in topic_tree.subtopics(topic_id)]})
+    response.set_etag(f"{topic_tree.etag}-{topic_id}")
+    # ✅ select.html versions the URL with ?v=<tree etag>, so a matching URL can be cached outright;
+    # anything else is revalidated against the ETag (a 304 costs no DB query)
+    if request.args.get('v') == topic_tree.etag:
+        response.cache_control.max_age = SUBTOPICS_MAX_AGE
+    else:
+        response.cache_control.no_cache = True
+    response.cache_control.private = True
+    return response.make_conditional(request)
 
 # ------------------------
-# Excel Upload for Topics & Subtopics
+# API: LLM Response Cache Stats
 # ------------------------
-ALLOWED_EXTENSIONS = {'xlsx'}
+@app.route('/api/llm_cache')
+@login_required
+def llm_cache_stats():
+    return jsonify(dict(get_response_cache().stats(), semantic=semantic_cache.stats()))
+
+# ------------------------
+# Excel/CSV Upload for Topics & Subtopics
+# ------------------------
+ALLOWED_EXTENSIONS = SUPPORTED_EXTENSIONS
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
@@ -130,34 +250,19 @@ def upload_excel():
         file.save(filepath)
 
         try:
-            df = pd.read_excel(filepath)
-
-            if 'Topic' not in df.columns or 'Subtopic' not in df.columns:
-                flash('Excel must have columns: Topic and Subtopic')
-                return redirect(url_for('select'))
-
-            Subtopic.query.delete()
-            Topic.query.delete()
-            db.session.commit()
-
-            for _, row in df.iterrows():
-                topic_name = str(row['Topic']).strip()
-                subtopic_name = str(row['Subtopic']).strip()
-                if not topic_name or not subtopic_name:
-                    continue
-
-                topic = Topic.query.filter_by(name=topic_name).first()
-                if not topic:
-                    topic = Topic(name=topic_name)
-                    db.session.add(topic)
-                    db.session.flush()
-
-                subtopic = Subtopic(name=subtopic_name, topic_id=topic.id)
-                db.session.add(subtopic)
-
-            db.session.commit()
-            flash('Topics and Subtopics updated successfully!')
+            stats = sync_syllabus(db.session, read_syllabus(filepath), Topic, Subtopic, Note)
+            topic_cache.invalidate()
+            flash(
+                f"Topics and Subtopics updated successfully! "
+                f"{stats['rows']} rows in {stats['seconds']:.2f}s ({stats['rows_per_sec']:,.0f} rows/sec): "
+                f"+{stats['topics_added']}/-{stats['topics_removed']} topics, "
+                f"+{stats['subtopics_added']}/-{stats['subtopics_removed']} subtopics."
+            )
+        except SyllabusFormatError as e:
+            db.session.rollback()
+            flash(str(e))
         except Exception as e:
+            db.session.rollback()
             flash(f'Error processing file: {str(e)}')
         finally:
             if os.path.exists(filepath):
@@ -166,46 +271,49 @@ def upload_excel():
     return redirect(url_for('select'))
 
 # ------------------------
-# Generate Answer
+# Response History (server-side)
 # ------------------------
-@app.route('/generate', methods=['POST'])
-@login_required
-def generate():
-    topic_id = request.form['topic_id']
-    subtopic_id = request.form['subtopic_id']
-    prompt_type = request.form.get('prompt_type', '').strip()
-    custom_prompt = request.form.get('custom_prompt', '').strip()
-    llm_provider = request.form.get('llm_provider', 'openai').lower()
-    llm_api_key = request.form.get('llm_api_key', '').strip()
+def _remember_response(content, prompt, usage=None):
+    """Append a response to this session's history and point the session at it."""
+    if 'history_id' not in session:
+        session['history_id'] = new_history_id()
+    seq = history_store.append(session['history_id'], content, prompt)
+    session['history_seq'] = seq
+    # Token counts of the latest answer, recorded on the Note if it is saved
+    session['token_usage'] = dict(usage.as_dict(), seq=seq) if usage else None
+    return history_store.get(session['history_id'], seq)
 
-    # ✅ Validate LLM Provider
-    if llm_provider not in ['openai', 'groq']:
-        flash("Invalid LLM provider selected. Please choose OpenAI or Groq.")
-        return redirect(url_for('select'))
-
-    topic = Topic.query.get(topic_id)
-    subtopic = Subtopic.query.get(subtopic_id)
-
-    if not topic or not subtopic:
-        flash("Invalid topic or subtopic selected.")
-        return redirect(url_for('select'))
+def _current_history_entry(offset=0):
+    if 'history_id' not in session or 'history_seq' not in session:
+        return None
+    entry = history_store.step(session['history_id'], session['history_seq'], offset)
+    if entry:
+        session['history_seq'] = entry['seq']
+    return entry
 
-    if not prompt_type and not custom_prompt:
-        flash("Please select an answer type or enter a custom prompt.")
-        return redirect(url_for('select'))
+def _render_history_entry(entry):
+    return render_template(
+        'response.html',
+        response=entry['content'],
+        topic=session.get('topic', 'N/A'),
+        subtopic=session.get('subtopic', 'N/A'),
+        answer_type=session.get('answer_type', 'N/A'),
+        editable_prompt=entry['prompt'] or '',
+        has_previous=entry['has_previous'],
+        has_next=entry['has_next']
+    )
 
+# ------------------------
+# Generate Answer
+# ------------------------
+def _build_prompt(topic, subtopic, prompt_type, custom_prompt):
+    """Render the full LLM prompt; returns (prompt, answer_type). Records new custom prompts."""
     if prompt_type and not custom_prompt:
-        prompt_path = os.path.join(basedir, f'prompts/templates/{prompt_type}.txt')
-        try:
-            with open(prompt_path, 'r', encoding='utf-8') as f:
-                template = f.read()
-        except FileNotFoundError:
-            template = f"[Error] Prompt file '{prompt_type}.txt' not found."
-
-        filled_prompt = (
-            template.replace("{{topic}}", topic.name)
-                    .replace("{{subtopic}}", subtopic.name)
-        )
+        template = prompt_registry.get(prompt_type)
+        if template is not None:
+            filled_prompt = template.render(topic=topic.name, subtopic=subtopic.name)
+        else:
+            filled_prompt = f"[Error] Prompt file '{prompt_type}.txt' not found."
 
         full_prompt = f"""
 You are an AI tutor explaining a concept.
@@ -219,9 +327,9 @@ Explain clearly in plain text (no markdown, no bullet points).
 Prompt:
 {filled_prompt}
 """.strip()
+        return full_prompt, prompt_type
 
-    else:
-        full_prompt = f"""
+    full_prompt = f"""
 You are an AI assistant.
 
 Topic: {topic.name}
@@ -231,35 +339,260 @@ Instruction: {custom_prompt}
 Answer in plain English (paragraph style, no formatting).
 """.strip()
 
-        existing_prompt = CustomPrompt.query.filter_by(prompt_text=custom_prompt, user_id=current_user.id).first()
-        if not existing_prompt:
-            custom_prompt_entry = CustomPrompt(prompt_text=custom_prompt, answer_type="custom", user_id=current_user.id)
-            db.session.add(custom_prompt_entry)
-            db.session.commit()
-        prompt_type = "custom"
+    existing_prompt = CustomPrompt.query.filter_by(prompt_text=custom_prompt, user_id=current_user.id).first()
+    if not existing_prompt:
+        custom_prompt_entry = CustomPrompt(prompt_text=custom_prompt, answer_type="custom", user_id=current_user.id)
+        db.session.add(custom_prompt_entry)
+        db.session.commit()
+    return full_prompt, "custom"
+
+def _semantic_lookup(instruction, topic_id, subtopic_id, prompt_type):
+    """Earlier answer to a near-identical custom instruction for the same topic/subtopic, or None."""
+    if prompt_type != 'custom':
+        return None
+    return semantic_cache.lookup(instruction, topic_id, subtopic_id)
+
+def _semantic_store(instruction, topic_id, subtopic_id, prompt_type, answer, note_id=None):
+    if prompt_type == 'custom' and not is_error_response(answer):
+        semantic_cache.store(instruction, answer, topic_id, subtopic_id, note_id=note_id)
+
+def _get_or_create_notebook(user_id):
+    notebook = Notebook.query.filter_by(user_id=user_id).first()
+    if not notebook:
+        notebook = Notebook(title='Default', user_id=user_id)
+        db.session.add(notebook)
+        db.session.commit()
+    return notebook
+
+def _parse_generate_form():
+    """Read and validate the generate form; returns (fields, error_message)."""
+    fields = {
+        'topic_id': request.form.get('topic_id'),
+        'subtopic_id': request.form.get('subtopic_id'),
+        'prompt_type': request.form.get('prompt_type', '').strip(),
+        'custom_prompt': request.form.get('custom_prompt', '').strip(),
+        'llm_provider': request.form.get('llm_provider', 'openai').lower(),
+        'llm_api_key': request.form.get('llm_api_key', '').strip(),
+    }
+
+    # ✅ Validate LLM Provider
+    if fields['llm_provider'] not in ['openai', 'groq']:
+        return fields, "Invalid LLM provider selected. Please choose OpenAI or Groq."
+
+    topic_tree = _topic_tree()
+    fields['topic'] = topic_tree.topic(fields['topic_id'])
+    fields['subtopic'] = topic_tree.subtopic(fields['subtopic_id'])
+
+    if not fields['topic'] or not fields['subtopic']:
+        return fields, "Invalid topic or subtopic selected."
+
+    if not fields['prompt_type'] and not fields['custom_prompt']:
+        return fields, "Please select an answer type or enter a custom prompt."
+
+    # ✅ Cap free-text instructions (CUSTOM_PROMPT_MAX_TOKENS): truncate, or reject with CUSTOM_PROMPT_OVERFLOW=reject
+    fields['prompt_truncated'] = False
+    if fields['custom_prompt']:
+        try:
+            fields['custom_prompt'], fields['prompt_truncated'] = fit_custom_prompt(fields['custom_prompt'])
+        except PromptTooLong as e:
+            return fields, str(e)
+
+    return fields, None
+
+# ------------------------
+# Background Generation Jobs
+# ------------------------
+def _run_generation_job(payload):
+    """Worker-thread side of a generation job: call the provider and store the Note."""
+    usage = TokenUsage()
+    semantic_key = (payload['custom_prompt'], payload['topic_id'], payload['subtopic_id'], payload['answer_type'])
+    hit = _semantic_lookup(*semantic_key)
+    if hit:
+        llm_response = hit.answer
+        usage.update(completion_text=llm_response)
+    else:
+        llm_response = generate_llm_response(payload['prompt'], provider=payload['llm_provider'], api_key=payload['llm_api_key'],
+                                             max_tokens=max_tokens_for(payload['answer_type']), usage=usage)
+    if is_error_response(llm_response):
+        raise RuntimeError(llm_response)
 
-    llm_response = generate_llm_response(full_prompt, provider=llm_provider, api_key=llm_api_key)
+    with app.app_context():
+        note = Note(
+            content=llm_response,
+            topic_id=payload['topic_id'],
+            subtopic_id=payload['subtopic_id'],
+            note_type=payload['answer_type'],
+            notebook_id=payload['notebook_id'],
+            prompt_tokens=usage.prompt_tokens,
+            completion_tokens=usage.completion_tokens
+        )
+        db.session.add(note)
+        db.session.commit()
+        if not hit:
+            _semantic_store(*semantic_key, llm_response, note_id=note.id)
+        return {"note_id": note.id}
+
+generation_jobs = JobQueue(_run_generation_job, kind='generate', redact=('llm_api_key',))
+atexit.register(generation_jobs.shutdown, False)
 
-    if 'responses' not in session:
-        session['responses'] = []
-    session['responses'].append(llm_response)
-    session['response_index'] = len(session['responses']) - 1
+def _enqueue_generation(fields):
+    full_prompt, prompt_type = _build_prompt(fields['topic'], fields['subtopic'], fields['prompt_type'], fields['custom_prompt'])
+    # The worker can't refund unused tokens, so a queued job keeps its whole estimate
+    reservation = _reserve_user_quota(full_prompt, max_tokens_for(prompt_type))
+    payload = {
+        'prompt': full_prompt,
+        'topic_id': fields['topic'].id,
+        'subtopic_id': fields['subtopic'].id,
+        'answer_type': prompt_type,
+        'custom_prompt': fields['custom_prompt'],
+        'notebook_id': _get_or_create_notebook(current_user.id).id,
+        'llm_provider': fields['llm_provider'],
+        'llm_api_key': fields['llm_api_key'],
+    }
+    try:
+        job_id = generation_jobs.submit(payload, owner=current_user.id)
+    except QueueFull as e:
+        reservation.settle(0)  # nothing was generated
+        response = jsonify({"error": str(e)})
+        response.status_code = 429
+        response.headers['Retry-After'] = '5'
+        return response
+    response = jsonify({"job_id": job_id, "status": "queued", "status_url": url_for('job_status', job_id=job_id)})
+    response.status_code = 202
+    return response
+
+@app.route('/api/jobs', methods=['POST'])
+@login_required
+def create_job():
+    fields, error = _parse_generate_form()
+    if error:
+        return jsonify({"error": error}), 400
+    return _enqueue_generation(fields)
+
+@app.route('/api/jobs/<job_id>')
+@login_required
+def job_status(job_id):
+    job = generation_jobs.get(job_id)
+    if not job or job['owner'] != str(current_user.id):
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify({
+        "job_id": job['id'],
+        "status": job['status'],
+        "result": job['result'],
+        "error": job['error'],
+        "created_at": job['created_at'],
+        "updated_at": job['updated_at'],
+    })
+
+@app.route('/generate', methods=['POST'])
+@login_required
+def generate():
+    fields, error = _parse_generate_form()
+    if error:
+        flash(error)
+        return redirect(url_for('select'))
+
+    # ✅ async=1 enqueues the generation and returns a job id instead of blocking this worker
+    if request.form.get('async') == '1':
+        return _enqueue_generation(fields)
+
+    topic, subtopic = fields['topic'], fields['subtopic']
+    llm_provider, llm_api_key = fields['llm_provider'], fields['llm_api_key']
+    full_prompt, prompt_type = _build_prompt(topic, subtopic, fields['prompt_type'], fields['custom_prompt'])
+
+    # ✅ A near-identical custom prompt on this subtopic was already answered: reuse it
+    reservation = _reserve_user_quota(full_prompt, max_tokens_for(prompt_type))
+    semantic_key = (fields['custom_prompt'], topic.id, subtopic.id, prompt_type)
+    hit = _semantic_lookup(*semantic_key)
+    usage = TokenUsage()
+    if hit:
+        llm_response = hit.answer
+        usage.update(completion_text=llm_response)
+        reservation.settle(0)
+    else:
+        # ✅ Answer length per answer type (template metadata), so short types don't pay for 1200 tokens
+        llm_response = generate_llm_response(full_prompt, provider=llm_provider, api_key=llm_api_key,
+                                             max_tokens=max_tokens_for(prompt_type), usage=usage)
+        reservation.settle(_tokens_used(usage))
+        _semantic_store(*semantic_key, llm_response)
+    if fields['prompt_truncated']:
+        flash("Your custom prompt was too long and has been shortened.")
 
     session.update({
         'topic': topic.name,
         'subtopic': subtopic.name,
-        'answer_type': prompt_type,
-        'last_prompt': full_prompt
+        'answer_type': prompt_type
     })
+    return _render_history_entry(_remember_response(llm_response, full_prompt, usage))
 
-    return render_template(
-        'response.html',
-        response=llm_response,
-        topic=topic.name,
-        subtopic=subtopic.name,
-        answer_type=prompt_type,
-        editable_prompt='',
-        has_previous=len(session['responses']) > 1
+# ------------------------
+# Generate Answer (Server-Sent Events)
+# ------------------------
+def _sse(data, event=None):
+    message = f"event: {event}\n" if event else ""
+    return message + f"data: {json.dumps(data)}\n\n"
+
+@app.route('/generate_stream', methods=['POST'])
+@login_required
+def generate_stream():
+    """Stream the answer to the browser as it is generated; the Note is saved once the stream completes."""
+    fields, error = _parse_generate_form()
+    if error:
+        return Response(_sse({"error": error}, event="error"), mimetype='text/event-stream')
+
+    topic, subtopic = fields['topic'], fields['subtopic']
+    full_prompt, prompt_type = _build_prompt(topic, subtopic, fields['prompt_type'], fields['custom_prompt'])
+    notebook_id = _get_or_create_notebook(current_user.id).id
+    topic_id, subtopic_id = topic.id, subtopic.id
+
+    semantic_key = (fields['custom_prompt'], topic_id, subtopic_id, prompt_type)
+    reservation = _reserve_user_quota(full_prompt, max_tokens_for(prompt_type))
+
+    def events():
+        parts = []
+        usage = TokenUsage()
+        hit = _semantic_lookup(*semantic_key)
+        if hit:
+            usage.update(completion_text=hit.answer)
+            deltas = [hit.answer]
+        else:
+            deltas = stream_llm_response(full_prompt, provider=fields['llm_provider'], api_key=fields['llm_api_key'],
+                                         max_tokens=max_tokens_for(prompt_type), usage=usage)
+        try:
+            for delta in deltas:
+                parts.append(delta)
+                yield _sse({"delta": delta})
+        except LLMError as e:
+            yield _sse({"error": str(e)}, event="error")
+            return
+        finally:
+            # Also on errors and client disconnects: release the provider call, charge what was streamed
+            if not hit:
+                deltas.close()
+            used = 0 if hit else _tokens_used(usage)
+            if used is None:
+                used = count_tokens(full_prompt) + count_tokens("".join(parts))
+            reservation.settle(used)
+
+        note = Note(
+            content="".join(parts).strip(),
+            topic_id=topic_id,
+            subtopic_id=subtopic_id,
+            note_type=prompt_type,
+            notebook_id=notebook_id,
+            prompt_tokens=usage.prompt_tokens,
+            completion_tokens=usage.completion_tokens
+        )
+        db.session.add(note)
+        db.session.commit()
+        if not hit:
+            _semantic_store(*semantic_key, note.content, note_id=note.id)
+        yield _sse({"note_id": note.id, **usage.as_dict()}, event="done")
+
+    return Response(
+        stream_with_context(events()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
     )
 
 # ------------------------
@@ -269,7 +602,17 @@ Answer in plain English (paragraph style, no formatting).
 @login_required
 def regenerate_custom():
     custom_prompt_input = request.form.get('custom_prompt', '').strip()
-    last_prompt = custom_prompt_input if custom_prompt_input else session.get('last_prompt', '')
+    prompt_truncated = False
+    if custom_prompt_input:
+        # ✅ Same custom-prompt token limit as /generate
+        try:
+            last_prompt, prompt_truncated = fit_custom_prompt(custom_prompt_input)
+        except PromptTooLong as e:
+            flash(str(e))
+            return redirect(url_for('select'))
+    else:
+        entry = _current_history_entry()
+        last_prompt = entry['prompt'] if entry else ''
 
     if not last_prompt:
         flash("No prompt available to regenerate.")
@@ -278,23 +621,17 @@ def regenerate_custom():
     llm_provider = request.form.get('llm_provider', 'openai').lower()
     llm_api_key = request.form.get('llm_api_key', '').strip()
 
-    llm_response = generate_llm_response(last_prompt, provider=llm_provider, api_key=llm_api_key)
+    # Regenerating means the user wants a fresh answer, so skip the response cache
+    max_tokens = max_tokens_for(session.get('answer_type'))
+    reservation = _reserve_user_quota(last_prompt, max_tokens)
+    usage = TokenUsage()
+    llm_response = generate_llm_response(last_prompt, provider=llm_provider, api_key=llm_api_key, use_cache=False,
+                                         max_tokens=max_tokens, usage=usage)
+    reservation.settle(_tokens_used(usage))
+    if prompt_truncated:
+        flash("Your custom prompt was too long and has been shortened.")
 
-    if 'responses' not in session:
-        session['responses'] = []
-    session['responses'].append(llm_response)
-    session['response_index'] = len(session['responses']) - 1
-    session['last_prompt'] = last_prompt
-
-    return render_template(
-        'response.html',
-        response=llm_response,
-        topic=session['topic'],
-        subtopic=session['subtopic'],
-        answer_type=session['answer_type'],
-        editable_prompt=last_prompt,
-        has_previous=session['response_index'] > 0
-    )
+    return _render_history_entry(_remember_response(llm_response, last_prompt, usage))
 
 # ------------------------
 # Word Explanation
@@ -308,7 +645,12 @@ def word_explanation():
         return redirect(url_for('select'))
 
     prompt = f"Explain the meaning of the word '{word}' in simple terms, with an example in one sentence."
-    llm_response = generate_llm_response(prompt, provider='openai')
+    max_tokens = max_tokens_for('word_explanation')
+    reservation = _reserve_user_quota(prompt, max_tokens)
+    usage = TokenUsage()
+    llm_response = generate_llm_response(prompt, provider='openai', max_tokens=max_tokens, usage=usage)
+    reservation.settle(_tokens_used(usage))
+    entry = _current_history_entry()
 
     return render_template(
         'response.html',
@@ -316,7 +658,7 @@ def word_explanation():
         topic=session.get('topic', 'N/A'),
         subtopic=session.get('subtopic', 'N/A'),
         answer_type="Word Explanation",
-        editable_prompt='',
+        editable_prompt=entry['prompt'] if entry else '',
         has_previous=False
     )
 
@@ -326,99 +668,407 @@ def word_explanation():
 @app.route('/previous_response')
 @login_required
 def previous_response():
-    if 'responses' in session and session['response_index'] > 0:
-        session['response_index'] -= 1
-    return render_template(
-        'response.html',
-        response=session['responses'][session['response_index']],
-        topic=session['topic'],
-        subtopic=session['subtopic'],
-        answer_type=session['answer_type'],
-        editable_prompt=session.get('last_prompt', ''),
-        has_previous=session['response_index'] > 0
-    )
+    entry = _current_history_entry(-1)
+    if entry is None:
+        flash("No response history yet.")
+        return redirect(url_for('select'))
+    return _render_history_entry(entry)
 
 @app.route('/next_response')
 @login_required
 def next_response():
-    if 'responses' in session and session['response_index'] < len(session['responses']) - 1:
-        session['response_index'] += 1
-    return render_template(
-        'response.html',
-        response=session['responses'][session['response_index']],
-        topic=session['topic'],
-        subtopic=session['subtopic'],
-        answer_type=session['answer_type'],
-        editable_prompt=session.get('last_prompt', ''),
-        has_previous=session['response_index'] > 0
-    )
+    entry = _current_history_entry(1)
+    if entry is None:
+        flash("No response history yet.")
+        return redirect(url_for('select'))
+    return _render_history_entry(entry)
+
+HISTORY_STEPS = {'previous': -1, 'current': 0, 'next': 1}
+
+@app.route('/api/response/<direction>')
+@login_required
+def api_response(direction):
+    """The previous/current/next response as JSON, so the response page can swap it in place."""
+    if direction not in HISTORY_STEPS:
+        return jsonify({"error": "direction must be previous, current or next"}), 404
+    entry = _current_history_entry(HISTORY_STEPS[direction])
+    if entry is None:
+        return jsonify({"error": "No response history yet."}), 404
+    return jsonify({
+        "seq": entry['seq'],
+        "content": entry['content'],
+        "prompt": entry['prompt'] or '',
+        "has_previous": entry['has_previous'],
+        "has_next": entry['has_next'],
+    })
 
 # ------------------------
 # Notebook & Download
 # ------------------------
+def _saved_note_tokens(content):
+    """(prompt_tokens, completion_tokens) for a saved answer: the provider's counts, else estimated locally."""
+    usage = session.get('token_usage')
+    if usage and usage.get('seq') == session.get('history_seq'):
+        return usage['prompt_tokens'], usage['completion_tokens']
+    entry = _current_history_entry()
+    return (count_tokens(entry['prompt']) if entry and entry['prompt'] else None), count_tokens(content)
+
 @app.route('/save', methods=['POST'])
 @login_required
 def save():
     content = request.form['note']
-    topic = Topic.query.filter_by(name=session['topic']).first()
-    subtopic = Subtopic.query.filter_by(name=session['subtopic']).first()
-    notebook = Notebook.query.filter_by(user_id=current_user.id).first()
-    if not notebook:
-        notebook = Notebook(title='Default', user_id=current_user.id)
-        db.session.add(notebook)
-        db.session.commit()
+    topic_tree = _topic_tree()
+    topic = topic_tree.topic_named(session.get('topic'))
+    subtopic = topic_tree.subtopic_named(session.get('subtopic'), topic.id if topic else None)
+    notebook = _get_or_create_notebook(current_user.id)
+    prompt_tokens, completion_tokens = _saved_note_tokens(content)
     note = Note(
         content=content,
         topic_id=topic.id if topic else None,
         subtopic_id=subtopic.id if subtopic else None,
         note_type=session.get('answer_type'),
-        notebook_id=notebook.id
+        notebook_id=notebook.id,
+        prompt_tokens=prompt_tokens,
+        completion_tokens=completion_tokens
     )
     db.session.add(note)
     db.session.commit()
     flash("Note saved to your notebook.")
     return redirect(url_for('notebook'))
 
+def _notebook_page():
+    notebook = Notebook.query.filter_by(user_id=current_user.id).first()
+    if not notebook:
+        return [], None
+    try:
+        return list_notes(
+            db.session, Note, notebook.id,
+            cursor=request.args.get('cursor'),
+            limit=request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+        )
+    except ValueError:
+        return [], None
+
 @app.route('/notebook')
 @login_required
 def notebook():
+    notes, next_cursor = _notebook_page()
+    return render_template('notebook.html', notebook=notes, next_cursor=next_cursor,
+                           is_first_page=not request.args.get('cursor'), topics_version=_topic_tree().etag)
+
+@app.route('/api/notebook')
+@login_required
+def api_notebook():
+    notes, next_cursor = _notebook_page()
+    return jsonify({"notes": [note_to_dict(n) for n in notes], "next_cursor": next_cursor})
+
+# ------------------------
+# Notebook Search
+# ------------------------
+def _search_current_notebook():
     notebook = Notebook.query.filter_by(user_id=current_user.id).first()
-    notes = notebook.notes if notebook else []
-    return render_template('notebook.html', notebook=notes)
+    return search_notes(
+        db.session,
+        notebook.id if notebook else None,
+        request.args.get('q', '').strip(),
+        Note, Topic, Subtopic,
+        page=request.args.get('page', 1, type=int),
+        per_page=max(1, min(request.args.get('per_page', DEFAULT_PER_PAGE, type=int), MAX_PER_PAGE))
+    )
+
+@app.route('/search')
+@login_required
+def search():
+    return render_template('search.html', **_search_current_notebook())
+
+@app.route('/api/search')
+@login_required
+def api_search():
+    return jsonify(_search_current_notebook())
+
+# ------------------------
+# Background Export Jobs
+# ------------------------
+EXPORT_WAIT_SECONDS = float(os.getenv("EXPORT_WAIT_SECONDS", "15"))
+
+def _export_key(notebook_id, filetype):
+    # Note count/max id/last edit + topic names (headings): an indexed aggregate, not a hash of every note
+    return version_key(filetype, *notebook_version(db.session, Note, notebook_id), _topic_tree().etag)
+
+def _run_export_job(payload):
+    """Worker-thread side of an export: render the notebook into the artifact store."""
+    filetype = payload['filetype']
+    try:
+        with app.app_context():
+            # Versioned before rendering: a note edited meanwhile gets a newer key, so it's rendered again
+            key = _export_key(payload['notebook_id'], filetype)
+            notes = iter_notes(db.session, Note, Topic, Subtopic, payload['notebook_id'])
+            artifact_store.put(payload['scope'], key, filetype,
+                               lambda fileobj: EXPORT_WRITERS[filetype](notes, fileobj))
+            return {"scope": payload['scope'], "key": key, "filetype": filetype}
+    finally:
+        with _export_inflight_lock:
+            _export_inflight.pop((payload['scope'], payload['key'], filetype), None)
+
+export_jobs = JobQueue(_run_export_job, kind='export', workers=int(os.getenv("EXPORT_WORKERS", "2")))
+atexit.register(export_jobs.shutdown, False)
+# (scope, key, filetype) -> id of the job rendering it. Entries are removed when the job finishes, so this
+# holds at most the export queue's pending + running jobs.
+_export_inflight = {}
+_export_inflight_lock = threading.Lock()
+
+def _submit_export(scope, notebook_id, filetype, key):
+    """Queue a render unless the same artifact is already being rendered."""
+    inflight_key = (scope, key, filetype)
+    with _export_inflight_lock:
+        job_id = _export_inflight.get(inflight_key)
+        if job_id:
+            return job_id
+        job_id = export_jobs.submit({'scope': scope, 'notebook_id': notebook_id, 'filetype': filetype, 'key': key},
+                                    owner=current_user.id)
+        _export_inflight[inflight_key] = job_id
+    return job_id
+
+def _wait_for_job(queue, job_id, timeout):
+    deadline = time.monotonic() + timeout
+    job = queue.get(job_id)
+    while job['status'] in ('queued', 'running') and time.monotonic() < deadline:
+        time.sleep(0.1)
+        job = queue.get(job_id)
+    return job
+
+def _send_artifact(path, key, filetype):
+    # conditional=True answers If-None-Match with 304 and Range requests with 206
+    return send_file(path, mimetype=EXPORT_FORMATS[filetype], as_attachment=True,
+                     download_name=f'notebook.{filetype}', conditional=True, etag=key, max_age=0)
 
 @app.route('/download/<filetype>')
 @login_required
 def download(filetype):
+    if filetype not in EXPORT_FORMATS:
+        flash("Unsupported format")
+        return redirect(url_for('notebook'))
+
     notebook = Notebook.query.filter_by(user_id=current_user.id).first()
-    notes = notebook.notes if notebook else []
-    if not notes:
+    if not notebook or not db.session.query(Note.id).filter_by(notebook_id=notebook.id).first():
         flash('No notes available to download.')
         return redirect(url_for('notebook'))
 
-    content = "\n\n---\n\n".join(note.content for note in notes)
+    download_name = f'notebook.{filetype}'
 
-    if filetype == 'txt':
-        return send_file(BytesIO(content.encode('utf-8')), mimetype='text/plain', as_attachment=True, download_name='notebook.txt')
+    # ✅ Text formats are streamed as chunks straight from the DB cursor
+    if filetype in ('txt', 'md'):
+        return Response(
+            stream_with_context(stream_text(filetype, iter_notes(db.session, Note, Topic, Subtopic, notebook.id))),
+            mimetype=EXPORT_FORMATS[filetype],
+            headers={'Content-Disposition': f'attachment; filename={download_name}'}
+        )
 
-    elif filetype == 'pdf':
-        clean_content = unicodedata.normalize('NFKD', content).encode('ascii', 'ignore').decode('ascii')
-        pdf = FPDF()
-        pdf.add_page()
-        pdf.set_font("Arial", size=12)
-        for line in clean_content.split('\n'):
-            pdf.multi_cell(0, 10, txt=line)
-        pdf_output = pdf.output(dest='S').encode('latin1')
-        pdf_bytes = BytesIO(pdf_output)
-        return send_file(pdf_bytes, mimetype='application/pdf', as_attachment=True, download_name='notebook.pdf')
+    # ✅ PDF/Word: serve the cached artifact for this exact notebook content, or render it in the background
+    scope = f'notebook{notebook.id}'
+    key = _export_key(notebook.id, filetype)
+    path = artifact_store.get(scope, key, filetype)
+    if path:
+        return _send_artifact(path, key, filetype)
 
-    else:
-        flash("Unsupported format")
+    try:
+        job_id = _submit_export(scope, notebook.id, filetype, key)
+    except QueueFull:
+        flash('The export queue is busy, please try again in a moment.')
         return redirect(url_for('notebook'))
 
+    if request.args.get('async') == '1':
+        response = jsonify({"job_id": job_id, "status": "queued", "status_url": url_for('export_status', job_id=job_id)})
+        response.status_code = 202
+        return response
+
+    job = _wait_for_job(export_jobs, job_id, EXPORT_WAIT_SECONDS)
+    if job['status'] == 'done':
+        result = job['result']
+        path = artifact_store.get(result['scope'], result['key'], filetype)
+        if path:
+            return _send_artifact(path, result['key'], filetype)
+    if job['status'] == 'failed':
+        flash(f"Export failed: {job['error']}")
+    else:
+        flash(f'Your {filetype.upper()} is still being prepared. Click download again in a moment.')
+    return redirect(url_for('notebook'))
+
+@app.route('/api/exports/<job_id>')
+@login_required
+def export_status(job_id):
+    job = export_jobs.get(job_id)
+    if not job or job['owner'] != str(current_user.id):
+        return jsonify({"error": "Job not found"}), 404
+    body = {"job_id": job['id'], "status": job['status'], "error": job['error']}
+    if job['status'] == 'done':
+        body['download_url'] = url_for('download', filetype=job['result']['filetype'])
+    return jsonify(body)
+
+# ------------------------
+# CLI: Generate the Whole Syllabus
+# ------------------------
+@app.cli.command('generate-syllabus')
+@click.option('--email', required=True, help='Owner of the notebook the notes are saved into.')
+@click.option('--provider', default='openai', type=click.Choice(sorted(BACKENDS)))
+@click.option('--strategy', default='single', type=click.Choice(STRATEGIES),
+              help='race/fallback spread calls over LLM_PROVIDERS (--provider is tried first).')
+@click.option('--prompt-type', 'prompt_types', multiple=True, help='Answer types to generate (default: all templates).')
+@click.option('--concurrency', default=DEFAULT_BATCH_CONCURRENCY, show_default=True)
+@click.option('--chunk-size', default=DEFAULT_BATCH_CHUNK_SIZE, show_default=True, help='Notes inserted per commit.')
+@click.option('--rpm', default=DEFAULT_REQUESTS_PER_MINUTE, show_default=True, help='Provider requests per minute.')
+def generate_syllabus(email, provider, strategy, prompt_types, concurrency, chunk_size, rpm):
+    """Generate notes for every subtopic x answer type. Safe to re-run: existing notes are skipped."""
+    user = User.query.filter_by(email=email).first()
+    if not user:
+        raise click.ClickException(f"No user with email {email}")
+    notebook_id = _get_or_create_notebook(user.id).id
+
+    if not prompt_types:
+        prompt_types = prompt_registry.prompt_types()
+    if not prompt_types:
+        raise click.ClickException("No answer types found.")
+
+    # ✅ Resume after a crash: skip (subtopic, answer type) pairs that already have a note
+    done = set(
+        db.session.query(Note.subtopic_id, Note.note_type)
+        .filter(Note.notebook_id == notebook_id, Note.subtopic_id.isnot(None))
+        .all()
+    )
+    subtopics = db.session.query(Subtopic, Topic).join(Topic, Subtopic.topic_id == Topic.id).all()
+    tasks = [
+        (topic, subtopic, prompt_type)
+        for subtopic, topic in subtopics
+        for prompt_type in prompt_types
+        if (subtopic.id, prompt_type) not in done
+    ]
+    click.echo(f"{len(tasks)} notes to generate ({len(done)} already present).")
+
+    jobs = [
+        (topic.id, subtopic.id, prompt_type, _build_prompt(topic, subtopic, prompt_type, '')[0])
+        for topic, subtopic, prompt_type in tasks
+    ]
+    limiter = RateLimiter(per_minute=rpm)
+
+    def call_provider(job):
+        def attempt():
+            limiter.acquire()
+            usage = TokenUsage()
+            text = generate_llm_response(job[3], provider=provider, strategy=strategy, raise_errors=True,
+                                         max_tokens=max_tokens_for(job[2]), usage=usage)
+            return text, usage
+        return retry_with_backoff(attempt)
+
+    def insert_chunk(results):
+        db.session.execute(insert(Note), [
+            {
+                'content': text,
+                'topic_id': topic_id,
+                'subtopic_id': subtopic_id,
+                'note_type': prompt_type,
+                'notebook_id': notebook_id,
+                'prompt_tokens': usage.prompt_tokens,
+                'completion_tokens': usage.completion_tokens,
+            }
+            for (topic_id, subtopic_id, prompt_type, _), (text, usage) in results
+        ])
+        db.session.commit()
+        click.echo(f"  saved {len(results)} notes")
+
+    stats = run_batch(jobs, call_provider, insert_chunk, concurrency=concurrency, chunk_size=chunk_size)
+    click.echo(f"Done in {stats['seconds']:.1f}s: {stats['succeeded']} generated, {stats['failed']} failed.")
+    for (_, subtopic_id, prompt_type, _), error in stats['failures']:
+        click.echo(f"  failed subtopic={subtopic_id} type={prompt_type}: {error}")
+
+# ------------------------
+# CLI: Note Compression
+# ------------------------
+@app.cli.command('recompress-notes')
+@click.option('--batch-size', default=1000, show_default=True, help='Rows rewritten per transaction.')
+def recompress_notes(batch_size):
+    """Rewrite stored notes with the current NOTE_COMPRESSION settings and dictionary (content is unchanged)."""
+    with db.engine.connect() as conn:
+        for table, column, use_dictionary in (('notes', 'content', True), ('custom_prompts', 'prompt_text', False)):
+            seen, rewritten = recompress(conn, table, column, use_dictionary, batch_size)
+            click.echo(f"{table}.{column}: {rewritten} of {seen} rows rewritten")
+    click.echo(f"Compression: {note_codec.algorithm}, dictionary {note_codec.stats()['dictionary'] or 'none'}")
+
+@app.cli.command('train-compression-dictionary')
+@click.option('--samples', default=5000, show_default=True, help='Most recent notes to train on.')
+def train_compression_dictionary(samples):
+    """Train a dictionary on recent notes; new notes use it (run recompress-notes to apply it to old ones)."""
+    if not note_codec.enabled:
+        raise click.ClickException("NOTE_COMPRESSION is 'none'")
+    texts = [content for (content,) in db.session.query(Note.content).order_by(Note.id.desc()).limit(samples)]
+    if not texts:
+        raise click.ClickException("No notes to train on.")
+    dictionary_id = store_dictionary(db.engine, train_dictionary(texts))
+    click.echo(f"Dictionary {dictionary_id} trained on {len(texts)} notes.")
+
+# ------------------------
+# CLI: Startup Report / Warm-Up
+# ------------------------
+@startup.warmup('database connection')
+def _warm_database():
+    with app.app_context():
+        db.session.execute(db.text('SELECT 1'))
+        _topic_tree()
+
+@startup.warmup('templates')
+def _warm_templates():
+    # Compiles every template once (or loads it from the bytecode cache)
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
+
+@startup.warmup('password hashing pool')
+def _warm_password_hasher():
+    password_hasher.start()
+
+@startup.warmup('semantic cache')
+def _warm_semantic_cache():
+    # Imports NumPy and maps the vector file
+    semantic_cache.lookup('warm up', None, None)
+
+@startup.warmup('provider SDKs')
+def _warm_provider_sdks():
+    for module in ('openai', 'groq'):
+        try:
+            __import__(module)
+        except ImportError:
+            pass
+
+@app.cli.command('warm-up')
+def warm_up():
+    """Open connections, start pools and import lazily-loaded SDKs before the worker takes traffic."""
+    for name, seconds, error in startup.run_warmups():
+        click.echo(f"  {name:<24} {seconds * 1000:8.1f} ms" + (f"  failed: {error}" if error else ""))
+
+@app.cli.command('startup-report')
+@click.option('--top', default=15, show_default=True, help='Packages to list in the import breakdown.')
+def startup_report(top):
+    """Where a cold worker spends its time: imports (fresh interpreter), setup phases, warm-up steps."""
+    rows = import_times('import app_debug', cwd=basedir)
+    total = sum(row[1] for row in rows)
+    click.echo(f"Imports: {total * 1000:.0f} ms, {len(rows)} modules")
+    for package, seconds, count in import_breakdown(rows, top):
+        click.echo(f"  {package:<24} {seconds * 1000:8.1f} ms  ({count} modules)")
+    click.echo("Setup phases:")
+    for name, seconds in startup.phases:
+        click.echo(f"  {name:<24} {seconds * 1000:8.1f} ms")
+    click.echo("Warm-up (run `flask warm-up`, or WARM_UP_ON_START=1):")
+    for name, seconds, error in startup.run_warmups():
+        click.echo(f"  {name:<24} {seconds * 1000:8.1f} ms" + (f"  failed: {error}" if error else ""))
+
+# Warm this worker's caches before it serves its first request
+if WARM_UP_ON_START:
+    startup.run_warmups()
+
 # ------------------------
 # App Start
 # ------------------------
 if __name__ == '__main__':
     with app.app_context():
         db.create_all()
+        init_compression(db.engine)
+        init_search(db.engine)
     app.run(debug=True)  
\ No newline at end of file
@@ -1,9 +1,14 @@
 import os
 from dotenv import load_dotenv
 
-load_dotenv()  # Load from .env
+# The one place .env is loaded: import this module before any service reads its defaults
+load_dotenv()
 
 class Config:
     SECRET_KEY = os.getenv("SECRET_KEY")
     SQLALCHEMY_DATABASE_URI = os.getenv("DATABASE_URL")
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Pool sizing/pre-ping (Postgres/MySQL) and SQLite pragmas are applied by
+    # services/db_tuning.init_database; set DB_TUNING=0 to use SQLAlchemy defaults.
+    # Anything set here is merged over the tuned options.
+    SQLALCHEMY_ENGINE_OPTIONS = {}
@@ -1,8 +1,22 @@
+from datetime import datetime, timezone
+
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
 
+# Imported both as app.models (create_app) and as a top-level module (app_debug)
+if __package__:
+    from .services.compression_service import CompressedText
+else:
+    from services.compression_service import CompressedText
+
 db = SQLAlchemy()
 
+
+def _utcnow():
+    # Naive UTC like created_at, but to the microsecond: two edits in one second still differ
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
 class User(UserMixin, db.Model):
     __tablename__ = 'users'
 
@@ -37,6 +51,11 @@ class Subtopic(db.Model):
     name = db.Column(db.String(100), nullable=False)
     topic_id = db.Column(db.Integer, db.ForeignKey('topics.id'), nullable=False)
 
+    __table_args__ = (
+        # Subtopics of a topic (dropdown API, syllabus import diff)
+        db.Index('ix_subtopics_topic_name', 'topic_id', 'name'),
+    )
+
     def __repr__(self):
         return f"<Subtopic {self.name}>"
 
@@ -46,7 +65,7 @@ class Notebook(db.Model):
 
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(100), nullable=False)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
 
     notes = db.relationship('Note', backref='notebook', lazy=True)
 
@@ -58,12 +77,24 @@ class Note(db.Model):
     __tablename__ = 'notes'
 
     id = db.Column(db.Integer, primary_key=True)
-    content = db.Column(db.Text, nullable=False)
-    topic_id = db.Column(db.Integer, db.ForeignKey('topics.id'), nullable=True)
-    subtopic_id = db.Column(db.Integer, db.ForeignKey('subtopics.id'), nullable=True)
+    content = db.Column(CompressedText(), nullable=False)  # compressed on SQLite, see compression_service
+    topic_id = db.Column(db.Integer, db.ForeignKey('topics.id'), nullable=True, index=True)
+    subtopic_id = db.Column(db.Integer, db.ForeignKey('subtopics.id'), nullable=True, index=True)
     note_type = db.Column(db.String(50))  # summary, explanation, code
     notebook_id = db.Column(db.Integer, db.ForeignKey('notebooks.id'), nullable=False)
     created_at = db.Column(db.DateTime, server_default=db.func.now())
+    prompt_tokens = db.Column(db.Integer, nullable=True)  # reported by the provider, or estimated locally
+    completion_tokens = db.Column(db.Integer, nullable=True)
+    # Set on insert/update by the ORM (and Core insert/update); keys the rendered note card cache
+    updated_at = db.Column(db.DateTime, nullable=True, default=_utcnow, onupdate=_utcnow)
+
+    topic = db.relationship('Topic', lazy=True)
+    subtopic = db.relationship('Subtopic', lazy=True)
+
+    __table_args__ = (
+        # Keyset pagination of a notebook, newest first
+        db.Index('ix_notes_notebook_created', 'notebook_id', 'created_at', 'id'),
+    )
 
     def __repr__(self):
         return f"<Note {self.note_type} - {self.created_at}>"
@@ -73,10 +104,15 @@ class CustomPrompt(db.Model):
 
     id = db.Column(db.Integer, primary_key=True)
     prompt_name = db.Column(db.String(100), nullable=False)  # ✅ Add this line
-    prompt_text = db.Column(db.Text, nullable=False)
+    prompt_text = db.Column(CompressedText(use_dictionary=False), nullable=False)  # looked up with ==
     answer_type = db.Column(db.String(100), nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
 
+    __table_args__ = (
+        # A user's saved prompts, and the "already saved?" check in generate
+        db.Index('ix_custom_prompts_user_prompt', 'user_id', 'prompt_text'),
+    )
+
     def __repr__(self):
         return f"<CustomPrompt {self.prompt_name} - {self.answer_type}>"
 
@@ -1,10 +1,16 @@
 from flask import Blueprint, render_template, request, redirect, flash, url_for
 from app.models import db, User
-from werkzeug.security import generate_password_hash, check_password_hash
+from app.services.auth_service import HashingBusy, password_hasher
 from flask_login import login_user, logout_user, login_required
 
 auth_bp = Blueprint('auth', __name__)
 
+# ✅ Login storm: the password hashing queue is full
+@auth_bp.app_errorhandler(HashingBusy)
+def hashing_busy(e):
+    flash(f"⚠️ {e}", "warning")
+    return render_template("login.html"), 503, {"Retry-After": str(max(1, round(e.retry_after)))}
+
 # -----------------------------
 # SIGNUP (REGISTER) ROUTE
 # -----------------------------
@@ -20,7 +26,7 @@ def register():
             flash("⚠️ Email already registered. Please log in.", "warning")
             return redirect(url_for("auth.login"))
 
-        hashed_password = generate_password_hash(password)
+        hashed_password = password_hasher.hash(password)
         new_user = User(username=username, email=email, password=hashed_password)
         db.session.add(new_user)
         db.session.commit()
@@ -41,7 +47,12 @@ def login():
 
         user = User.query.filter_by(email=email).first()
 
-        if user and check_password_hash(user.password, password):
+        matches, new_hash = password_hasher.verify(user.password, password) if user else (False, None)
+        if matches:
+            if new_hash:
+                # ✅ Hash parameters changed since this password was stored
+                user.password = new_hash
+                db.session.commit()
             login_user(user)
             flash("✅ Login successful!", "success")
             return redirect(url_for("note.select"))  # 👈 redirect to note selection
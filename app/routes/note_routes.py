@@ -1,19 +1,27 @@
-from flask import Blueprint, render_template, request, flash, redirect, send_file, jsonify, Response
+from flask import Blueprint, render_template, request, flash, redirect, send_file, jsonify, Response, stream_with_context
 from flask_login import login_required, current_user
 from app.models import db, Topic, Subtopic, Note, Notebook
-from app.services.prompt_service import load_prompt_template
-from app.services.llm_service import generate_llm_response
-from fpdf import FPDF
+from app.services.prompt_service import load_prompt_template, max_tokens_for
+from app.services.llm_service import LLMError, generate_llm_response, stream_llm_response
+from app.services.export_service import FORMATS as EXPORT_FORMATS, WRITERS as EXPORT_WRITERS, export_row, stream_text
+from app.services.artifact_service import artifact_key, artifact_store
+from app.services.reference_service import topic_cache
+from app.services.token_service import TokenUsage
 import os
-from io import BytesIO
+import json
 
 note_bp = Blueprint('note', __name__)
 
+SUBTOPICS_MAX_AGE = int(os.getenv("SUBTOPICS_MAX_AGE", "86400"))
+
+def _topic_tree():
+    return topic_cache.get(db.session, Topic, Subtopic)
+
 @note_bp.route("/select", methods=["GET"])
 @login_required
 def select():
-    topics = Topic.query.order_by(Topic.name).all()
-    return render_template("select.html", topics=topics)
+    topic_tree = _topic_tree()
+    return render_template("select.html", topics=topic_tree.topics, topics_version=topic_tree.etag)
 
 @note_bp.route("/generate", methods=["POST"])
 @login_required
@@ -22,15 +30,17 @@ def generate_note():
     subtopic_id = request.form.get("subtopic_id")
     prompt_type = request.form.get("prompt_type")
 
-    topic = Topic.query.get(topic_id)
-    subtopic = Subtopic.query.get(subtopic_id)
+    topic_tree = _topic_tree()
+    topic = topic_tree.topic(topic_id)
+    subtopic = topic_tree.subtopic(subtopic_id)
 
     if not topic or not subtopic:
         flash("❌ Invalid topic or subtopic.", "danger")
         return redirect("/select")
 
     prompt = load_prompt_template(prompt_type, topic.name, subtopic.name)
-    response = generate_llm_response(prompt)
+    usage = TokenUsage()
+    response = generate_llm_response(prompt, max_tokens=max_tokens_for(prompt_type), usage=usage)
 
     # Save to DB
     notebook = Notebook.query.filter_by(user_id=current_user.id).first()
@@ -39,12 +49,64 @@ def generate_note():
         db.session.add(notebook)
         db.session.commit()
 
-    note = Note(topic_id=topic.id, subtopic_id=subtopic.id, content=response, notebook_id=notebook.id)
+    note = Note(topic_id=topic.id, subtopic_id=subtopic.id, content=response, notebook_id=notebook.id,
+                prompt_tokens=usage.prompt_tokens, completion_tokens=usage.completion_tokens)
     db.session.add(note)
     db.session.commit()
 
     return render_template("note_result.html", note=note, topic=topic.name, subtopic=subtopic.name)
 
+def _sse(data, event=None):
+    message = f"event: {event}\n" if event else ""
+    return message + f"data: {json.dumps(data)}\n\n"
+
+@note_bp.route("/generate/stream", methods=["POST"])
+@login_required
+def generate_note_stream():
+    """Server-Sent Events variant of /generate; the Note is persisted when the stream completes."""
+    topic_id = request.form.get("topic_id")
+    subtopic_id = request.form.get("subtopic_id")
+    prompt_type = request.form.get("prompt_type")
+
+    topic_tree = _topic_tree()
+    topic = topic_tree.topic(topic_id)
+    subtopic = topic_tree.subtopic(subtopic_id)
+
+    if not topic or not subtopic:
+        return Response(_sse({"error": "❌ Invalid topic or subtopic."}, event="error"), mimetype="text/event-stream")
+
+    prompt = load_prompt_template(prompt_type, topic.name, subtopic.name)
+
+    notebook = Notebook.query.filter_by(user_id=current_user.id).first()
+    if not notebook:
+        notebook = Notebook(user_id=current_user.id)
+        db.session.add(notebook)
+        db.session.commit()
+    notebook_id, topic_id, subtopic_id = notebook.id, topic.id, subtopic.id
+
+    def events():
+        parts = []
+        usage = TokenUsage()
+        try:
+            for delta in stream_llm_response(prompt, max_tokens=max_tokens_for(prompt_type), usage=usage):
+                parts.append(delta)
+                yield _sse({"delta": delta})
+        except LLMError as e:
+            yield _sse({"error": str(e)}, event="error")
+            return
+
+        note = Note(topic_id=topic_id, subtopic_id=subtopic_id, content="".join(parts).strip(), notebook_id=notebook_id,
+                    prompt_tokens=usage.prompt_tokens, completion_tokens=usage.completion_tokens)
+        db.session.add(note)
+        db.session.commit()
+        yield _sse({"note_id": note.id, **usage.as_dict()}, event="done")
+
+    return Response(
+        stream_with_context(events()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @note_bp.route("/download/<int:note_id>/<string:filetype>")
 @login_required
 def download_note(note_id, filetype):
@@ -55,32 +117,29 @@ def download_note(note_id, filetype):
         return redirect("/select")
 
     filename = f"{note.topic.name}_{note.subtopic.name}.{filetype}"
-    
-    if filetype == "txt":
-        content = note.content
+
+    if filetype in ("txt", "md"):
         return Response(
-            content,
-            mimetype="text/plain",
+            "".join(stream_text(filetype, [export_row(note)])),
+            mimetype=EXPORT_FORMATS[filetype],
             headers={"Content-Disposition": f"attachment;filename={filename}"}
         )
 
-    elif filetype == "pdf":
-        pdf = FPDF()
-        pdf.add_page()
-        pdf.set_font("Arial", size=12)
-
-        for line in note.content.splitlines():
-            pdf.multi_cell(0, 10, line)
-
-        pdf_output = BytesIO()
-        pdf.output(pdf_output)
-        pdf_output.seek(0)
-
+    elif filetype in ("pdf", "docx"):
+        # Rendered once per note content; repeat downloads come from the artifact cache
+        rows = [export_row(note)]
+        scope, key = f"note{note.id}", artifact_key(filetype, rows)
+        path = artifact_store.get(scope, key, filetype)
+        if not path:
+            path, key = artifact_store.put(scope, key, filetype, lambda fileobj: EXPORT_WRITERS[filetype](rows, fileobj))
         return send_file(
-            pdf_output,
+            path,
             as_attachment=True,
             download_name=filename,
-            mimetype="application/pdf"
+            mimetype=EXPORT_FORMATS[filetype],
+            conditional=True,
+            etag=key,
+            max_age=0
         )
 
     else:
@@ -90,7 +149,15 @@ def download_note(note_id, filetype):
 @note_bp.route("/api/subtopics/<int:topic_id>", methods=["GET"])
 @login_required
 def get_subtopics(topic_id):
-    subtopics = Subtopic.query.filter_by(topic_id=topic_id).order_by(Subtopic.name).all()
-    return jsonify({
-        "subtopics": [{"id": s.id, "name": s.name} for s in subtopics]
+    topic_tree = _topic_tree()
+    response = jsonify({
+        "subtopics": [{"id": s.id, "name": s.name} for s in topic_tree.subtopics(topic_id)]
     })
+    response.set_etag(f"{topic_tree.etag}-{topic_id}")
+    # Versioned URLs (?v=<tree etag>) are cached outright, anything else is revalidated
+    if request.args.get("v") == topic_tree.etag:
+        response.cache_control.max_age = SUBTOPICS_MAX_AGE
+    else:
+        response.cache_control.no_cache = True
+    response.cache_control.private = True
+    return response.make_conditional(request)
@@ -0,0 +1,140 @@
+# Content-addressed export artifacts on disk (rendered once, served with ETag/Range)
+import glob
+import hashlib
+import os
+import tempfile
+import threading
+
+from .state_dir import APP_STATE_DIR, private_dir
+
+# Default values from environment (fallback)
+ARTIFACT_DIR = os.getenv("EXPORT_ARTIFACT_DIR", os.path.join(APP_STATE_DIR, "exports"))
+ARTIFACT_MAX_BYTES = int(os.getenv("EXPORT_ARTIFACT_MAX_BYTES", str(512 * 1024 * 1024)))
+
+
+class ArtifactHasher:
+    """
+    Hash of (format, note ids, note contents, headings) identifying one export.
+
+    Any edit, addition or deletion of a note changes the key, so a cached
+    artifact can never be served for a notebook that has changed since.
+    `wrap()` hashes rows while they are being rendered.
+    """
+
+    def __init__(self, filetype):
+        self._digest = hashlib.sha256(filetype.encode("utf-8"))
+
+    def wrap(self, rows):
+        for row in rows:
+            for value in (row.id, row.content, row.note_type, row.topic, row.subtopic):
+                self._digest.update(b"\x1f" + str(value).encode("utf-8"))
+            self._digest.update(b"\x1e")
+            yield row
+
+    def hexdigest(self):
+        return self._digest.hexdigest()
+
+
+def artifact_key(filetype, rows):
+    hasher = ArtifactHasher(filetype)
+    for _ in hasher.wrap(rows):
+        pass
+    return hasher.hexdigest()
+
+
+def version_key(filetype, *version):
+    """
+    Key from a cheap version of the content (e.g. notebook_version() plus the topic tree etag).
+
+    Used for whole notebooks, where hashing every note on each download
+    would cost as much as reading the notebook.
+    """
+    digest = hashlib.sha256(filetype.encode("utf-8"))
+    for part in version:
+        digest.update(b"\x1f" + str(part).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class ArtifactStore:
+    """
+    Directory of rendered exports named `<scope>-<key>.<ext>`.
+
+    `scope` groups the artifacts of one notebook/note: writing a new artifact
+    removes older ones of the same scope and format, and the directory is
+    trimmed (least recently served first) to `max_bytes`.
+    """
+
+    def __init__(self, root=ARTIFACT_DIR, max_bytes=ARTIFACT_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        private_dir(root)
+
+    def path_for(self, scope, key, filetype):
+        return os.path.join(self.root, f"{scope}-{key}.{filetype}")
+
+    def get(self, scope, key, filetype):
+        """Path of the cached artifact or None; a hit refreshes its mtime for LRU eviction."""
+        path = self.path_for(scope, key, filetype)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put(self, scope, key, filetype, writer):
+        """
+        Render with `writer(fileobj)` into a temp file and atomically move it into place.
+
+        `key` may be a callable, evaluated after rendering (see ArtifactHasher.wrap).
+        Returns (path, key).
+        """
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as fileobj:
+                writer(fileobj)
+            if callable(key):
+                key = key()
+            path = self.path_for(scope, key, filetype)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self.invalidate(scope, filetype, keep=path)
+        self.evict()
+        return path, key
+
+    def invalidate(self, scope, filetype=None, keep=None):
+        """Delete a scope's artifacts (optionally one format), except `keep`."""
+        pattern = f"{scope}-*.{filetype}" if filetype else f"{scope}-*"
+        for path in glob.glob(os.path.join(self.root, pattern)):
+            if path != keep:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+    def evict(self):
+        """Delete least recently used artifacts until the directory fits in max_bytes."""
+        with self._lock:
+            entries = []
+            for entry in os.scandir(self.root):
+                if entry.is_file() and not entry.name.endswith(".part"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total = sum(size for _, size, _ in entries)
+            removed = 0
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    continue
+                total -= size
+                removed += 1
+            return removed
+
+
+artifact_store = ArtifactStore()
@@ -0,0 +1,234 @@
+# Password hashing off the request threads (bounded thread pool) and a short-lived per-process user cache
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import event, inspect as sa_inspect
+from sqlalchemy.orm import make_transient_to_detached
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, check_password_hash, generate_password_hash
+
+# Default values from environment (fallback)
+PASSWORD_HASH_METHOD = os.getenv("PASSWORD_HASH_METHOD", "scrypt:32768:8:1")  # werkzeug method string
+PASSWORD_SALT_LENGTH = int(os.getenv("PASSWORD_SALT_LENGTH", "16"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))  # 0 = hash inline
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "64"))
+PASSWORD_HASH_QUEUE_TIMEOUT = float(os.getenv("PASSWORD_HASH_QUEUE_TIMEOUT", "10"))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "30"))  # seconds; 0 disables the cache
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "2048"))
+
+
+class HashingBusy(Exception):
+    """Too many password hashes are already queued; the caller should retry later."""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Too many sign-ins at once. Try again in {max(1, round(retry_after))}s.")
+        self.retry_after = retry_after
+
+
+def canonical_method(method):
+    """Fill in werkzeug's defaults, so "scrypt" and "scrypt:32768:8:1" compare equal to a stored hash's prefix."""
+    name, *args = method.split(":")
+    if name == "scrypt" and not args:
+        return "scrypt:32768:8:1"
+    if name == "pbkdf2":
+        hash_name = args[0] if args else "sha256"
+        iterations = args[1] if len(args) > 1 else DEFAULT_PBKDF2_ITERATIONS
+        return f"pbkdf2:{hash_name}:{iterations}"
+    return method
+
+
+# ------------------------
+# Worker functions (run in the pool)
+# ------------------------
+def _hash(password, method, salt_length):
+    return generate_password_hash(password, method=method, salt_length=salt_length)
+
+
+def _verify(stored, password, method, salt_length):
+    """(matches, new hash or None): a matching password stored with other parameters is rehashed in the same trip."""
+    if not check_password_hash(stored, password):
+        return False, None
+    if stored.split("$", 1)[0] == method:
+        return True, None
+    return True, generate_password_hash(password, method=method, salt_length=salt_length)
+
+
+class PasswordHasher:
+    """
+    werkzeug password hashing in a bounded thread pool.
+
+    At most `workers` hashes run at once, so a burst of logins can't take
+    every core (or every request thread's CPU time) away from the rest of
+    the app. hashlib's scrypt and pbkdf2_hmac release the GIL, so threads
+    hash in parallel without the memory and start-up cost of worker
+    processes (which would re-import the app's entry script). Up to
+    `max_pending` callers queue for the pool; beyond that, callers wait up
+    to `queue_timeout` seconds for room and then get HashingBusy. The pool
+    is started on first use in each process (so a forking server gets one
+    per worker); with `workers=0` hashing runs inline.
+    """
+
+    def __init__(self, method=PASSWORD_HASH_METHOD, salt_length=PASSWORD_SALT_LENGTH,
+                 workers=PASSWORD_HASH_WORKERS, max_pending=PASSWORD_HASH_MAX_PENDING,
+                 queue_timeout=PASSWORD_HASH_QUEUE_TIMEOUT):
+        self.method = canonical_method(method)
+        self.salt_length = salt_length
+        self.workers = workers
+        self.queue_timeout = queue_timeout
+        self._slots = threading.BoundedSemaphore(max(1, workers) + max_pending)
+        self._pool = None
+        self._pool_pid = None
+        self._lock = threading.Lock()
+        self.hashed = self.verified = self.rehashed = self.rejected = 0
+
+    def _executor(self):
+        if self.workers <= 0:
+            return None
+        with self._lock:
+            if self._pool is None or self._pool_pid != os.getpid():
+                # A forked child has the parent's pool object but none of its threads
+                self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix="password-hash")
+                self._pool_pid = os.getpid()
+            return self._pool
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            with self._lock:
+                self.rejected += 1
+            raise HashingBusy(self.queue_timeout)
+        try:
+            pool = self._executor()
+            if pool is None:
+                return fn(*args)
+            return pool.submit(fn, *args).result()
+        finally:
+            self._slots.release()
+
+    def start(self):
+        """Start the pool's threads now instead of on the first login."""
+        pool = self._executor()
+        if pool is not None:
+            list(pool.map(int, range(self.workers)))
+
+    def hash(self, password):
+        self.hashed += 1
+        return self._run(_hash, password, self.method, self.salt_length)
+
+    def verify(self, stored, password):
+        """
+        Check `password` against the stored hash.
+
+        :return: (matches, new_hash). new_hash is set when the password matched
+            but was stored with other parameters than the configured ones;
+            save it in place of the old hash.
+        """
+        self.verified += 1
+        matches, new_hash = self._run(_verify, stored, password, self.method, self.salt_length)
+        if new_hash:
+            self.rehashed += 1
+        return matches, new_hash
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None and self._pool_pid == os.getpid():
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self):
+        return {
+            "method": self.method.split(":", 1)[0],
+            "workers": self.workers,
+            "pool_started": self._pool is not None and self._pool_pid == os.getpid(),
+            "hashed": self.hashed,
+            "verified": self.verified,
+            "rehashed": self.rehashed,
+            "rejected": self.rejected,
+        }
+
+
+class UserCache:
+    """
+    Per-process cache of user rows for the login manager's user loader.
+
+    Entries are detached snapshots of the row's columns; a hit is attached
+    to the request's session with `merge(load=False)`, so the rest of the
+    request gets a normal persistent object without a SELECT. `watch`
+    invalidates a user's entry whenever the ORM updates or deletes the row;
+    changes made by other processes show up after at most `ttl` seconds.
+    """
+
+    def __init__(self, ttl=USER_CACHE_TTL, max_entries=USER_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # id -> (snapshot, expires_at)
+        self._lock = threading.Lock()
+        self._watched = set()
+        self.hits = self.misses = self.invalidated = 0
+
+    def get(self, session, model, user_id):
+        """The user with this id in `session` (None if there's no such row)."""
+        if self.ttl <= 0:
+            return session.get(model, user_id)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                snapshot = entry[0]
+            else:
+                snapshot = None
+                self.misses += 1
+        if snapshot is not None:
+            return session.merge(snapshot, load=False)
+
+        user = session.get(model, user_id)
+        if user is not None:
+            self._store(model, user, now)
+        return user
+
+    def _store(self, model, user, now):
+        mapper = sa_inspect(model)
+        snapshot = model(**{attr.key: getattr(user, attr.key) for attr in mapper.column_attrs})
+        make_transient_to_detached(snapshot)
+        with self._lock:
+            self._entries[user.id] = (snapshot, now + self.ttl)
+            self._entries.move_to_end(user.id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            if self._entries.pop(user_id, None) is not None:
+                self.invalidated += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def watch(self, model):
+        """Drop a user's entry when the ORM flushes an update or delete of that row."""
+        if model in self._watched:
+            return
+        self._watched.add(model)
+
+        def _drop(mapper, connection, target):
+            self.invalidate(target.id)
+
+        event.listen(model, "after_update", _drop)
+        event.listen(model, "after_delete", _drop)
+
+    def stats(self):
+        return {
+            "size": len(self._entries),
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidated": self.invalidated,
+        }
+
+
+password_hasher = PasswordHasher()
+user_cache = UserCache()
@@ -0,0 +1,174 @@
+# Bulk note generation: bounded concurrency, rate limiting, retries, chunked writes
+import os
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# Default values from environment (fallback)
+DEFAULT_BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+DEFAULT_BATCH_CHUNK_SIZE = int(os.getenv("BATCH_CHUNK_SIZE", "50"))
+DEFAULT_BATCH_RETRIES = int(os.getenv("BATCH_RETRIES", "4"))
+DEFAULT_REQUESTS_PER_MINUTE = float(os.getenv("BATCH_REQUESTS_PER_MINUTE", "60"))
+
+
+class RateLimiter:
+    """Token bucket limiting calls to `per_minute`; acquire() blocks until a token is free."""
+
+    def __init__(self, per_minute=DEFAULT_REQUESTS_PER_MINUTE, burst=None):
+        self.rate = per_minute / 60.0
+        self.capacity = burst or max(1.0, self.rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait_for = (1 - self._tokens) / self.rate
+            time.sleep(wait_for)
+
+
+# Provider answers worth another attempt: timeout, conflict, too early, rate limited, server/gateway errors
+RETRYABLE_STATUS = frozenset({408, 409, 425, 429, 500, 502, 503, 504})
+# Network failures raised by the optional SDKs (openai/groq, httpx), matched by class name so neither is imported here
+_TRANSIENT_ERROR_NAMES = frozenset({"APIConnectionError", "APITimeoutError", "TransportError"})
+
+
+def _causes(error):
+    """`error` and the exceptions it was raised from (LLMError wraps the provider's error)."""
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        yield error
+        error = error.__cause__
+
+
+def _status_code(error):
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def _retry_after_header(error):
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    try:
+        return float(headers.get("retry-after"))
+    except (AttributeError, TypeError, ValueError):  # no response, no header, or an HTTP date
+        return None
+
+
+def retry_delay(error):
+    """
+    How to retry after `error`.
+
+    Args:
+        error (Exception): What the last attempt raised
+
+    Returns:
+        None if the error is permanent (bad request, auth, prompt too long, bugs),
+        else the minimum delay in seconds the server or our own quota asked for
+        (0.0 when it didn't say).
+    """
+    for e in _causes(error):
+        retry_after = getattr(e, "retry_after", None)  # RateLimited
+        if isinstance(retry_after, (int, float)):
+            return max(0.0, float(retry_after))
+        status = _status_code(e)
+        if status is not None:
+            return (_retry_after_header(e) or 0.0) if status in RETRYABLE_STATUS else None
+        if isinstance(e, (TimeoutError, ConnectionError)):
+            return 0.0
+        if _TRANSIENT_ERROR_NAMES.intersection(cls.__name__ for cls in type(e).__mro__):
+            return _retry_after_header(e) or 0.0
+    return None
+
+
+def retry_with_backoff(fn, retries=DEFAULT_BATCH_RETRIES, base_delay=1.0, max_delay=30.0, max_retry_after=300.0):
+    """
+    Call fn(), retrying transient errors with exponential backoff and full jitter.
+
+    Only timeouts, connection errors, 429/5xx answers and RateLimited are
+    retried (see retry_delay); anything else is raised at once. A Retry-After
+    from the provider (or RateLimited.retry_after) is a floor for the delay.
+
+    Args:
+        fn (callable): Zero-argument function to call
+        retries (int): Retries after the first attempt
+        base_delay (float): Delay cap for the first retry, doubled on each attempt
+        max_delay (float): Upper bound for a single backoff delay
+        max_retry_after (float): Give up instead of waiting when asked to wait longer than this
+
+    Returns:
+        Whatever fn() returns; the last exception is re-raised once retries are exhausted.
+    """
+    for attempt in range(retries + 1):
+        try:
+            return fn()
+        except Exception as e:
+            retry_after = retry_delay(e)
+            if attempt == retries or retry_after is None or retry_after > max_retry_after:
+                raise
+            time.sleep(max(retry_after, random.uniform(0, min(max_delay, base_delay * 2 ** attempt))))
+
+
+def run_batch(tasks, worker, on_chunk, concurrency=DEFAULT_BATCH_CONCURRENCY,
+              chunk_size=DEFAULT_BATCH_CHUNK_SIZE, progress=None):
+    """
+    Run `worker(task)` over `tasks` in a thread pool and hand results to `on_chunk` in batches.
+
+    At most `concurrency` tasks are in flight at once. `on_chunk(results)` is
+    always called from the calling thread (so it can safely use the DB
+    session) with a list of (task, result) pairs. Failed tasks are counted and
+    reported, not raised.
+
+    Returns:
+        dict: counts of succeeded/failed tasks, elapsed seconds and the failures list.
+    """
+    stats = {"succeeded": 0, "failed": 0, "failures": []}
+    buffer = []
+    started = time.perf_counter()
+    tasks = iter(tasks)
+
+    def flush():
+        if buffer:
+            on_chunk(list(buffer))
+            buffer.clear()
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        in_flight = {}
+
+        def fill():
+            while len(in_flight) < concurrency:
+                task = next(tasks, None)
+                if task is None:
+                    return
+                in_flight[pool.submit(worker, task)] = task
+
+        fill()
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                task = in_flight.pop(future)
+                try:
+                    buffer.append((task, future.result()))
+                    stats["succeeded"] += 1
+                except Exception as e:
+                    stats["failed"] += 1
+                    stats["failures"].append((task, str(e)))
+                if progress:
+                    progress(stats)
+            if len(buffer) >= chunk_size:
+                flush()
+            fill()
+        flush()
+
+    stats["seconds"] = time.perf_counter() - started
+    return stats
@@ -0,0 +1,268 @@
+# Response cache for LLM completions (in-process LRU + optional SQLite tier)
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# Default values from environment (fallback)
+DEFAULT_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1") not in ("0", "false", "no")
+DEFAULT_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "512"))
+DEFAULT_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", "86400"))
+DEFAULT_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "")  # empty = no persistent tier
+
+
+def make_cache_key(provider, model, temperature, system_message, prompt, **extra):
+    """
+    Build a stable cache key for one provider call.
+
+    :param provider: Any registered backend name (e.g. 'openai', 'groq', 'fake'), or
+                     "<strategy>:<name>,<name>" for race/fallback across several
+    :param model: Resolved model name
+    :param temperature: Sampling temperature
+    :param system_message: System prompt sent with the request
+    :param prompt: Fully rendered user prompt
+    :param extra: Any other request parameter that changes the output
+    :return: Hex digest identifying the request
+    """
+    payload = {
+        "provider": provider,
+        "model": model,
+        "temperature": temperature,
+        "system": system_message,
+        "prompt": prompt,
+    }
+    payload.update(extra)
+    raw = json.dumps(payload, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class LRUCache:
+    """Thread-safe in-process LRU cache with a per-entry TTL."""
+
+    def __init__(self, maxsize=DEFAULT_CACHE_SIZE, ttl=DEFAULT_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+class SQLiteCache:
+    """Persistent cache tier stored in a local SQLite file, shared by all workers on a host."""
+
+    def __init__(self, path, ttl=DEFAULT_CACHE_TTL, max_rows=50000):
+        self.path = path
+        self.ttl = ttl
+        self.max_rows = max_rows
+        self._local = threading.local()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._writes = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " expires_at REAL,"
+            " created_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_llm_cache_created ON llm_cache (created_at)")
+        conn.commit()
+
+    def _conn(self):
+        # sqlite3 connections can't be shared across threads; keep one per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        row = self._conn().execute(
+            "SELECT value, expires_at FROM llm_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None or (row[1] is not None and row[1] < time.time()):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return row[0]
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        now = time.time()
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO llm_cache (key, value, expires_at, created_at) VALUES (?, ?, ?, ?)",
+            (key, value, now + ttl if ttl else None, now),
+        )
+        conn.commit()
+        self._writes += 1
+        if self._writes % 500 == 0:
+            self.prune()
+
+    def delete(self, key):
+        conn = self._conn()
+        conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+        conn.commit()
+
+    def prune(self):
+        """Drop expired rows and trim the table down to max_rows (oldest first)."""
+        conn = self._conn()
+        removed = conn.execute("DELETE FROM llm_cache WHERE expires_at IS NOT NULL AND expires_at < ?",
+                               (time.time(),)).rowcount
+        removed += conn.execute(
+            "DELETE FROM llm_cache WHERE key IN ("
+            " SELECT key FROM llm_cache ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_rows,),
+        ).rowcount
+        conn.commit()
+        self.evictions += removed
+        return removed
+
+    def clear(self):
+        conn = self._conn()
+        conn.execute("DELETE FROM llm_cache")
+        conn.commit()
+
+    def stats(self):
+        size = self._conn().execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        return {
+            "size": size,
+            "max_rows": self.max_rows,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+class ResponseCache:
+    """
+    Two-tier cache in front of the provider call.
+
+    The memory tier is checked first; a hit in the persistent tier is promoted
+    into memory. Writes go to both tiers.
+    """
+
+    def __init__(self, memory=None, persistent=None, enabled=True):
+        self.memory = memory if memory is not None else LRUCache()
+        self.persistent = persistent
+        self.enabled = enabled
+        self.bypasses = 0
+        self.stores = 0
+
+    def get(self, key):
+        if not self.enabled:
+            return None
+        value = self.memory.get(key)
+        if value is None and self.persistent is not None:
+            value = self.persistent.get(key)
+            if value is not None:
+                self.memory.set(key, value)
+        return value
+
+    def set(self, key, value):
+        if not self.enabled:
+            return
+        self.memory.set(key, value)
+        if self.persistent is not None:
+            self.persistent.set(key, value)
+        self.stores += 1
+
+    def record_bypass(self):
+        self.bypasses += 1
+
+    def clear(self):
+        self.memory.clear()
+        if self.persistent is not None:
+            self.persistent.clear()
+
+    def stats(self):
+        """Hit/miss/eviction counters; `saved_calls` is the number of provider round-trips avoided."""
+        memory = self.memory.stats()
+        persistent = self.persistent.stats() if self.persistent is not None else None
+        saved = memory["hits"] + (persistent["hits"] if persistent else 0)
+        return {
+            "enabled": self.enabled,
+            "saved_calls": saved,
+            "stores": self.stores,
+            "bypasses": self.bypasses,
+            "memory": memory,
+            "persistent": persistent,
+        }
+
+
+def build_response_cache(enabled=DEFAULT_CACHE_ENABLED, size=DEFAULT_CACHE_SIZE,
+                         ttl=DEFAULT_CACHE_TTL, path=DEFAULT_CACHE_PATH):
+    persistent = SQLiteCache(path, ttl=ttl) if path else None
+    return ResponseCache(LRUCache(maxsize=size, ttl=ttl), persistent, enabled=enabled)
+
+
+# Shared cache used by llm_service; replace with configure_response_cache()
+response_cache = build_response_cache()
+
+
+def configure_response_cache(cache):
+    """Swap the process-wide response cache (e.g. a different backend or a disabled one)."""
+    global response_cache
+    response_cache = cache
+    return cache
+
+
+def get_response_cache():
+    return response_cache
@@ -0,0 +1,142 @@
+# Shared, long-lived LLM SDK clients (keeps HTTP connection pools warm)
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Default values from environment (fallback)
+DEFAULT_MAX_CLIENTS = int(os.getenv("LLM_CLIENT_POOL_SIZE", "16"))
+DEFAULT_IDLE_TIMEOUT = int(os.getenv("LLM_CLIENT_IDLE_TIMEOUT", "600"))
+DEFAULT_MAX_CONNECTIONS = int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "20"))
+DEFAULT_MAX_KEEPALIVE = int(os.getenv("LLM_HTTP_MAX_KEEPALIVE", "10"))
+DEFAULT_KEEPALIVE_EXPIRY = float(os.getenv("LLM_HTTP_KEEPALIVE_EXPIRY", "60"))
+DEFAULT_HTTP_TIMEOUT = float(os.getenv("LLM_HTTP_TIMEOUT", "60"))
+
+
+def _key_fingerprint(api_key):
+    # Never keep raw API keys as dict keys
+    return hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()[:16]
+
+
+def _close_client(client):
+    close = getattr(client, "close", None)
+    if callable(close):
+        try:
+            close()
+        except Exception:
+            pass
+
+
+class ClientRegistry:
+    """
+    Bounded, thread-safe registry of SDK clients keyed by (provider, api key hash).
+
+    SDK clients from openai/groq are safe to share between threads, so one
+    client per key keeps its connection pool alive across requests. Clients
+    idle for longer than `idle_timeout` seconds, and the least recently used
+    client when the registry is full, are dropped but not closed: another
+    thread may still be in the middle of a request with one. Its connection
+    pool is released when the last caller lets go of it.
+    """
+
+    def __init__(self, max_clients=DEFAULT_MAX_CLIENTS, idle_timeout=DEFAULT_IDLE_TIMEOUT):
+        self.max_clients = max_clients
+        self.idle_timeout = idle_timeout
+        self._clients = OrderedDict()  # key -> (client, last_used)
+        self._lock = threading.Lock()
+        self.created = 0
+        self.reused = 0
+        self.evicted = 0
+
+    def get(self, provider, api_key, factory):
+        """
+        Return the cached client for (provider, api_key), building it with `factory(api_key)` if needed.
+
+        The client is built outside the lock, so a slow SDK constructor
+        doesn't hold up requests for other keys. If two threads build the
+        same client at once, the first one registered wins and the other
+        (never handed out) is closed.
+        """
+        key = (provider, _key_fingerprint(api_key))
+        with self._lock:
+            client = self._touch(key, time.monotonic())
+        if client is not None:
+            return client
+
+        built = factory(api_key)
+        with self._lock:
+            client = self._touch(key, time.monotonic())
+            if client is None:
+                client = built
+                self._clients[key] = (client, time.monotonic())
+                self.created += 1
+                while len(self._clients) > self.max_clients:
+                    self._clients.popitem(last=False)
+                    self.evicted += 1
+        if client is not built:
+            _close_client(built)
+        return client
+
+    def _touch(self, key, now):
+        """The live client for `key` marked as just used, or None; drops idle clients. Call with the lock held."""
+        self._drop_idle(now)
+        entry = self._clients.get(key)
+        if entry is None:
+            return None
+        self._clients[key] = (entry[0], now)
+        self._clients.move_to_end(key)
+        self.reused += 1
+        return entry[0]
+
+    def _drop_idle(self, now):
+        if not self.idle_timeout:
+            return 0
+        idle = [k for k, (_, used) in self._clients.items() if now - used > self.idle_timeout]
+        for k in idle:
+            del self._clients[k]
+        self.evicted += len(idle)
+        return len(idle)
+
+    def evict_idle(self):
+        with self._lock:
+            return self._drop_idle(time.monotonic())
+
+    def close_all(self):
+        """Close every pooled client; registered as the shutdown hook in create_app (no requests left)."""
+        with self._lock:
+            clients = [c for c, _ in self._clients.values()]
+            self._clients.clear()
+        for client in clients:
+            _close_client(client)
+
+    def __len__(self):
+        return len(self._clients)
+
+    def stats(self):
+        return {
+            "size": len(self._clients),
+            "max_clients": self.max_clients,
+            "created": self.created,
+            "reused": self.reused,
+            "evicted": self.evicted,
+        }
+
+
+def build_http_client():
+    """httpx client with keep-alive pooling shared by one SDK client."""
+    import httpx
+
+    limits = httpx.Limits(
+        max_connections=DEFAULT_MAX_CONNECTIONS,
+        max_keepalive_connections=DEFAULT_MAX_KEEPALIVE,
+        keepalive_expiry=DEFAULT_KEEPALIVE_EXPIRY,
+    )
+    return httpx.Client(limits=limits, timeout=DEFAULT_HTTP_TIMEOUT)
+
+
+client_registry = ClientRegistry()
+
+
+def shutdown_clients():
+    client_registry.close_all()
@@ -0,0 +1,331 @@
+# Compressed text columns: zlib/zstd codec with optional trained dictionaries, a SQLAlchemy type and a SQLite decode function
+import os
+import struct
+import threading
+import time
+import zlib
+from collections import Counter
+
+from sqlalchemy import Text, event, func, text
+from sqlalchemy.sql import operators
+from sqlalchemy.types import TypeDecorator
+
+# Default values from environment (fallback)
+NOTE_COMPRESSION = os.getenv("NOTE_COMPRESSION", "zlib").lower()  # zlib | zstd | none
+NOTE_COMPRESSION_LEVEL = int(os.getenv("NOTE_COMPRESSION_LEVEL", "6"))
+NOTE_COMPRESSION_MIN_BYTES = int(os.getenv("NOTE_COMPRESSION_MIN_BYTES", "200"))  # shorter text is stored as is
+DICTIONARY_SIZE = int(os.getenv("NOTE_COMPRESSION_DICTIONARY_SIZE", str(32 * 1024)))
+
+# Stored format: MAGIC, algorithm byte, dictionary id (0 = none), compressed UTF-8.
+# Plain rows stay TEXT; a NUL can't start a TEXT note, so the two never clash.
+MAGIC = b"\x00NC"
+HEADER = struct.Struct(">3scI")
+ALGORITHMS = {"zlib": b"z", "zstd": b"s"}
+SQL_FUNCTION = "note_text"
+DICTIONARY_TABLE = "compression_dictionaries"
+
+
+def _zstd():
+    try:
+        import zstandard
+    except ImportError:
+        raise RuntimeError("NOTE_COMPRESSION=zstd needs the zstandard package (pip install zstandard)") from None
+    return zstandard
+
+
+class TextCodec:
+    """
+    Compresses text for storage and reads back compressed and plain values alike.
+
+    Text shorter than `min_bytes` (UTF-8), or that doesn't shrink, is stored
+    as is. With a dictionary (see `train_dictionary`) short, similar notes
+    compress much better; every dictionary ever used must stay loadable, so
+    they are kept in the database (`compression_dictionaries`) and looked
+    up by the id stored in each value's header.
+    """
+
+    def __init__(self, algorithm=NOTE_COMPRESSION, level=NOTE_COMPRESSION_LEVEL, min_bytes=NOTE_COMPRESSION_MIN_BYTES):
+        if algorithm not in ALGORITHMS and algorithm != "none":
+            raise ValueError(f"Unknown compression {algorithm!r} (zlib, zstd or none)")
+        self.algorithm = algorithm
+        self.level = level
+        self.min_bytes = min_bytes
+        self._dictionaries = {}  # id -> (algorithm, bytes)
+        self._current = None  # id of the newest dictionary for `algorithm`
+        self._loader = None
+        self._local = threading.local()  # zstd (de)compressors aren't thread-safe
+        self._lock = threading.Lock()
+        self.compressed = self.stored_plain = self.decompressed = 0
+
+    @property
+    def enabled(self):
+        return self.algorithm != "none"
+
+    # ------------------------
+    # Dictionaries
+    # ------------------------
+    def set_dictionaries(self, rows, loader=None):
+        """rows: (id, algorithm, data); the newest one for this codec's algorithm is used to compress."""
+        with self._lock:
+            self._dictionaries = {row_id: (algorithm, bytes(data)) for row_id, algorithm, data in rows}
+            ids = [row_id for row_id, (algorithm, _) in self._dictionaries.items() if algorithm == self.algorithm]
+            self._current = max(ids) if ids else None
+            self._local = threading.local()
+            if loader is not None:
+                self._loader = loader
+
+    def _dictionary(self, dictionary_id):
+        entry = self._dictionaries.get(dictionary_id)
+        if entry is None and self._loader is not None:
+            # Trained by another worker since this one loaded them
+            self.set_dictionaries(self._loader())
+            entry = self._dictionaries.get(dictionary_id)
+        if entry is None:
+            raise LookupError(f"Compression dictionary {dictionary_id} is not loaded (see init_compression)")
+        return entry[1]
+
+    def _zstd_compressor(self, dictionary_id):
+        key = ("c", dictionary_id)
+        compressor = getattr(self._local, "zstd", {}).get(key)
+        if compressor is None:
+            zstandard = _zstd()
+            dict_data = zstandard.ZstdCompressionDict(self._dictionary(dictionary_id)) if dictionary_id else None
+            compressor = zstandard.ZstdCompressor(level=self.level, dict_data=dict_data)
+            self._local.__dict__.setdefault("zstd", {})[key] = compressor
+        return compressor
+
+    def _zstd_decompressor(self, dictionary_id):
+        key = ("d", dictionary_id)
+        decompressor = getattr(self._local, "zstd", {}).get(key)
+        if decompressor is None:
+            zstandard = _zstd()
+            dict_data = zstandard.ZstdCompressionDict(self._dictionary(dictionary_id)) if dictionary_id else None
+            decompressor = zstandard.ZstdDecompressor(dict_data=dict_data)
+            self._local.__dict__.setdefault("zstd", {})[key] = decompressor
+        return decompressor
+
+    # ------------------------
+    # Encode / decode
+    # ------------------------
+    def encode(self, value, use_dictionary=True):
+        """Bytes to store for `value`, or `value` itself when it's stored uncompressed."""
+        if value is None or not self.enabled:
+            return value
+        raw = value.encode("utf-8")
+        if len(raw) < self.min_bytes:
+            self.stored_plain += 1
+            return value
+        dictionary_id = (self._current or 0) if use_dictionary else 0
+        if self.algorithm == "zlib":
+            if dictionary_id:
+                compressor = zlib.compressobj(self.level, zdict=self._dictionary(dictionary_id))
+            else:
+                compressor = zlib.compressobj(self.level)
+            payload = compressor.compress(raw) + compressor.flush()
+        else:
+            payload = self._zstd_compressor(dictionary_id).compress(raw)
+        if len(payload) + HEADER.size >= len(raw):
+            self.stored_plain += 1
+            return value
+        self.compressed += 1
+        return HEADER.pack(MAGIC, ALGORITHMS[self.algorithm], dictionary_id) + payload
+
+    def decode(self, value):
+        """Text for a stored value: compressed (any algorithm/dictionary) or plain."""
+        if value is None or isinstance(value, str):
+            return value
+        value = bytes(value)
+        if not value.startswith(MAGIC):
+            return value.decode("utf-8")
+        _, algorithm, dictionary_id = HEADER.unpack_from(value)
+        payload = value[HEADER.size:]
+        self.decompressed += 1
+        if algorithm == b"z":
+            if dictionary_id:
+                decompressor = zlib.decompressobj(zdict=self._dictionary(dictionary_id))
+                raw = decompressor.decompress(payload) + decompressor.flush()
+            else:
+                raw = zlib.decompress(payload)
+        elif algorithm == b"s":
+            raw = self._zstd_decompressor(dictionary_id).decompress(payload)
+        else:
+            raise ValueError(f"Unknown compression marker {algorithm!r}")
+        return raw.decode("utf-8")
+
+    def stats(self):
+        return {
+            "algorithm": self.algorithm,
+            "level": self.level,
+            "dictionary": self._current,
+            "compressed": self.compressed,
+            "stored_plain": self.stored_plain,
+            "decompressed": self.decompressed,
+        }
+
+
+note_codec = TextCodec()
+
+
+class CompressedText(TypeDecorator):
+    """
+    Text column stored compressed by `note_codec` on SQLite.
+
+    Server databases get plain text (Postgres already compresses large
+    values itself). Reads accept both forms, so rows written before
+    compression was turned on, or with another algorithm or dictionary,
+    keep working. Pass use_dictionary=False for columns compared with `==`
+    in queries: without a dictionary the stored bytes depend only on the
+    text, so equal strings still compare equal.
+    """
+
+    impl = Text
+    cache_ok = True
+
+    def __init__(self, use_dictionary=True, **kwargs):
+        super().__init__(**kwargs)
+        self.use_dictionary = use_dictionary
+
+    def process_bind_param(self, value, dialect):
+        if dialect.name != "sqlite":
+            return value
+        return note_codec.encode(value, self.use_dictionary)
+
+    def process_result_value(self, value, dialect):
+        return note_codec.decode(value)
+
+    def coerce_compared_value(self, op, value):
+        # Only equality compares stored forms; LIKE patterns etc. must stay plain text
+        if op in (operators.eq, operators.ne, operators.in_op, operators.not_in_op):
+            return self
+        return self.impl_instance
+
+
+# ------------------------
+# SQLite: decode inside SQL (FTS triggers, LIKE search)
+# ------------------------
+def _sql_note_text(value):
+    return note_codec.decode(value)
+
+
+def register_sql_functions(dbapi_connection):
+    """Add note_text(value) to one raw sqlite3 connection."""
+    dbapi_connection.create_function(SQL_FUNCTION, 1, _sql_note_text, deterministic=True)
+
+
+def install_sql_functions(engine):
+    """
+    note_text(value) on every connection of a SQLite `engine`: the stored value as text.
+
+    The FTS triggers index note_text(new.content), so any connection that
+    writes notes needs it.
+    """
+    if engine.dialect.name != "sqlite" or getattr(engine, "_note_text_installed", False):
+        return engine
+    event.listen(engine, "connect", lambda dbapi_connection, record: register_sql_functions(dbapi_connection))
+    engine._note_text_installed = True
+    # Connections opened before the listener existed don't have the function
+    engine.dispose()
+    return engine
+
+
+def as_text(column, engine):
+    """`column` as plain text in SQL: note_text(column) on SQLite, the column itself elsewhere."""
+    if engine.dialect.name == "sqlite":
+        return func.note_text(column, type_=Text)
+    return column
+
+
+# ------------------------
+# Dictionaries in the database
+# ------------------------
+def _load_dictionaries(engine):
+    with engine.connect() as conn:
+        return conn.execute(text(f"SELECT id, algorithm, data FROM {DICTIONARY_TABLE}")).all()
+
+
+def init_compression(engine, codec=note_codec):
+    """Register note_text() and load the stored dictionaries into `codec` (SQLite only; safe on every startup)."""
+    if engine.dialect.name != "sqlite":
+        return codec
+    install_sql_functions(engine)
+    with engine.begin() as conn:
+        conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {DICTIONARY_TABLE} ("
+            " id INTEGER PRIMARY KEY, algorithm TEXT NOT NULL, data BLOB NOT NULL, created_at REAL NOT NULL)"
+        ))
+    codec.set_dictionaries(_load_dictionaries(engine), loader=lambda: _load_dictionaries(engine))
+    return codec
+
+
+def train_dictionary(samples, size=DICTIONARY_SIZE, algorithm=NOTE_COMPRESSION):
+    """
+    Build a compression dictionary from sample texts.
+
+    zstd trains its own; for zlib (a preset dictionary is just text the
+    compressor can refer back to) the most frequent phrases are packed in,
+    most valuable last, where zlib's back-references are cheapest.
+    """
+    if algorithm == "zstd":
+        return _zstd().train_dictionary(size, [s.encode("utf-8") for s in samples if s]).as_bytes()
+    counts = Counter()
+    for sample in samples:
+        words = sample.split()
+        for n in (4, 3, 2):
+            for i in range(len(words) - n + 1):
+                counts[" ".join(words[i:i + n])] += 1
+    phrases, used = [], 0
+    for phrase, count in sorted(counts.items(), key=lambda item: item[1] * len(item[0]), reverse=True):
+        if count < 2:
+            break
+        if used + len(phrase) + 1 > size:
+            continue
+        phrases.append(phrase)
+        used += len(phrase) + 1
+    return " ".join(reversed(phrases)).encode("utf-8")
+
+
+def store_dictionary(engine, data, algorithm=NOTE_COMPRESSION, codec=note_codec):
+    """Save a trained dictionary; new values are compressed with it from now on. Returns its id."""
+    with engine.begin() as conn:
+        dictionary_id = conn.execute(
+            text(f"INSERT INTO {DICTIONARY_TABLE} (algorithm, data, created_at) VALUES (:algorithm, :data, :now)"),
+            {"algorithm": algorithm, "data": data, "now": time.time()},
+        ).lastrowid
+    codec.set_dictionaries(_load_dictionaries(engine))
+    return dictionary_id
+
+
+def recompress(conn, table, column, use_dictionary=True, batch_size=1000, codec=note_codec, plain=False,
+               commit=True, progress=None):
+    """
+    Rewrite `table.column` with the codec's current settings, `batch_size` rows at a time.
+
+    Rows already in the current form aren't rewritten, and the text never
+    changes (updated_at isn't touched). plain=True stores everything
+    uncompressed again. `conn` is a SQLAlchemy Connection, committed after
+    each batch unless commit=False (inside a migration's transaction).
+    Returns (rows seen, rows rewritten).
+    """
+    last_id, seen, rewritten = 0, 0, 0
+    while True:
+        rows = conn.execute(
+            text(f"SELECT id, {column} FROM {table} WHERE id > :last ORDER BY id LIMIT :limit"),
+            {"last": last_id, "limit": batch_size},
+        ).all()
+        if not rows:
+            return seen, rewritten
+        updates = []
+        for row_id, stored in rows:
+            value = codec.decode(stored)
+            encoded = value if plain else codec.encode(value, use_dictionary)
+            if encoded != stored:
+                updates.append({"id": row_id, "value": encoded})
+        if updates:
+            conn.execute(text(f"UPDATE {table} SET {column} = :value WHERE id = :id"), updates)
+        if commit:
+            conn.commit()
+        seen += len(rows)
+        rewritten += len(updates)
+        last_id = rows[-1][0]
+        if progress:
+            progress(seen, rewritten)
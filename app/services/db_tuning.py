@@ -0,0 +1,86 @@
+# Database engine tuning: SQLite pragmas on connect, pool sizing / pre-ping for server databases
+import os
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+# Default values from environment (fallback)
+DB_TUNING = os.getenv("DB_TUNING", "1") == "1"
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "20000"))
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+
+
+def sqlite_pragmas():
+    """PRAGMA statements run on every new SQLite connection."""
+    return [
+        f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}",  # readers no longer block the writer
+        f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}",  # safe with WAL, far fewer fsyncs
+        f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}",  # wait for the write lock instead of failing
+        f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}",
+        f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}",
+        "PRAGMA temp_store=MEMORY",
+    ]
+
+
+def engine_options(database_uri):
+    """
+    SQLALCHEMY_ENGINE_OPTIONS for the given URI.
+
+    Server databases (Postgres, MySQL) get a sized pool with pre-ping and
+    recycling, so connections dropped by the server or a proxy are replaced
+    instead of failing a request. SQLite keeps SQLAlchemy's default pool.
+    """
+    if not DB_TUNING or not database_uri:
+        return {}
+    url = make_url(database_uri)
+    if url.get_backend_name() == "sqlite":
+        return {"connect_args": {"timeout": SQLITE_BUSY_TIMEOUT_MS / 1000}}
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": True,
+    }
+
+
+def tune_engine(engine):
+    """Run the SQLite pragmas on each new connection of `engine` (no-op for other databases)."""
+    if not DB_TUNING or engine.dialect.name != "sqlite" or getattr(engine, "_pragmas_installed", False):
+        return engine
+    pragmas = sqlite_pragmas()
+
+    @event.listens_for(engine, "connect")
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+    engine._pragmas_installed = True
+    # Connections opened before the listener existed don't have the pragmas
+    engine.dispose()
+    return engine
+
+
+def init_database(app, db):
+    """
+    Bind Flask-SQLAlchemy to `app` with the tuned engine options and pragmas.
+
+    Options already set in SQLALCHEMY_ENGINE_OPTIONS take precedence.
+    """
+    options = engine_options(app.config.get("SQLALCHEMY_DATABASE_URI"))
+    options.update(app.config.get("SQLALCHEMY_ENGINE_OPTIONS") or {})
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = options
+    db.init_app(app)
+    with app.app_context():
+        tune_engine(db.engine)
@@ -1 +1,202 @@
-# Export notes as PDF/Word
+# Export notes as TXT/Markdown/PDF/Word, streaming notes from the DB in batches
+import os
+import tempfile
+import unicodedata
+from collections import namedtuple
+
+from sqlalchemy import func, select
+
+# Default values from environment (fallback)
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "500"))
+EXPORT_FONT_PATH = os.getenv("EXPORT_FONT_PATH", "")  # TTF with Unicode coverage, e.g. DejaVuSans.ttf
+EXPORT_SPOOL_SIZE = int(os.getenv("EXPORT_SPOOL_SIZE", str(8 * 1024 * 1024)))
+
+SEPARATOR = "\n\n---\n\n"
+
+# Bare mimetypes: werkzeug adds "; charset=utf-8" to text types itself
+FORMATS = {
+    "txt": "text/plain",
+    "md": "text/markdown",
+    "pdf": "application/pdf",
+    "docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+}
+
+# Common font locations tried when EXPORT_FONT_PATH isn't set
+_FONT_CANDIDATES = (
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+    "/usr/share/fonts/dejavu/DejaVuSans.ttf",
+    "/Library/Fonts/Arial Unicode.ttf",
+    "C:\\Windows\\Fonts\\arial.ttf",
+)
+
+
+ExportRow = namedtuple("ExportRow", "id content note_type topic subtopic")
+
+
+def export_row(note):
+    """ExportRow for a single ORM Note (single-note downloads)."""
+    return ExportRow(
+        note.id, note.content, note.note_type,
+        note.topic.name if note.topic else None,
+        note.subtopic.name if note.subtopic else None,
+    )
+
+
+def iter_notes(session, Note, Topic, Subtopic, notebook_id, batch_size=EXPORT_BATCH_SIZE):
+    """
+    Yield a notebook's notes as ExportRow tuples in id order, `batch_size` rows per query.
+
+    Plain rows are selected instead of ORM objects (nothing is added to the
+    session identity map), so memory stays flat however large the notebook is.
+    """
+    last_id = 0
+    while True:
+        batch = session.execute(
+            select(Note.id, Note.content, Note.note_type, Topic.name, Subtopic.name)
+            .outerjoin(Topic, Note.topic_id == Topic.id)
+            .outerjoin(Subtopic, Note.subtopic_id == Subtopic.id)
+            .where(Note.notebook_id == notebook_id, Note.id > last_id)
+            .order_by(Note.id)
+            .limit(batch_size)
+        ).all()
+        if not batch:
+            return
+        for row in batch:
+            yield ExportRow(*row)
+        last_id = batch[-1][0]
+
+
+def notebook_version(session, Note, notebook_id):
+    """
+    (note count, highest note id, latest edit) of a notebook, from one aggregate query.
+
+    Adding, deleting or editing a note changes at least one of them, so this
+    identifies the notebook's content for the artifact cache without reading
+    (and decompressing) every note.
+    """
+    count, max_id, last_edit = session.execute(
+        select(func.count(Note.id), func.max(Note.id), func.max(func.coalesce(Note.updated_at, Note.created_at)))
+        .where(Note.notebook_id == notebook_id)
+    ).one()
+    return count, max_id, str(last_edit)
+
+
+def _heading(note):
+    return " › ".join(part for part in (note.topic, note.subtopic) if part) or "Note"
+
+
+def stream_txt(notes):
+    """Plain text, notes separated by '---' (same layout as the old download)."""
+    first = True
+    for note in notes:
+        if not first:
+            yield SEPARATOR
+        first = False
+        yield note.content or ""
+
+
+def stream_markdown(notes):
+    for note in notes:
+        yield f"## {_heading(note)}\n\n"
+        if note.note_type:
+            yield f"*{note.note_type.title()}*\n\n"
+        yield (note.content or "") + "\n\n"
+
+
+def _unicode_font():
+    if EXPORT_FONT_PATH:
+        return EXPORT_FONT_PATH if os.path.exists(EXPORT_FONT_PATH) else None
+    return next((path for path in _FONT_CANDIDATES if os.path.exists(path)), None)
+
+
+def _ascii(text):
+    return unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode('ascii')
+
+
+def _latin1(text):
+    try:
+        text.encode("latin-1")
+    except UnicodeEncodeError:
+        return False
+    return True
+
+
+def write_pdf(notes, fileobj):
+    """
+    Render notes into a PDF written to `fileobj`.
+
+    Notes are added page by page as they are read, without building the
+    joined text first. Lines are set in the built-in Arial, which covers
+    Latin-1 and is as fast and compact as the old download. Only lines it
+    can't encode switch to a TTF font (EXPORT_FONT_PATH or a system
+    DejaVu/Arial Unicode), loaded on first use: FPDF measures and writes
+    TTF text several times slower, and as UTF-16. Without a TTF font those
+    lines are folded to ASCII as before.
+    """
+    from fpdf import FPDF
+
+    pdf = FPDF()
+    pdf.add_page()
+    pdf.set_font("Arial", size=12)
+    unicode_font = None  # None = not looked up yet, False = none available
+
+    def write(line):
+        nonlocal unicode_font
+        if _latin1(line):
+            pdf.set_font("Arial", size=12)
+        else:
+            if unicode_font is None:
+                unicode_font = _unicode_font() or False
+                if unicode_font:
+                    pdf.add_font("NoteFont", "", unicode_font, uni=True)
+            if unicode_font:
+                pdf.set_font("NoteFont", size=12)
+            else:
+                line = _ascii(line)
+        pdf.multi_cell(0, 10, line)
+
+    first = True
+    for note in notes:
+        if not first:
+            write("---")
+        first = False
+        for line in (note.content or "").split("\n"):
+            write(line)
+
+    data = pdf.output(dest="S")
+    if isinstance(data, str):  # fpdf 1.x returns a latin-1 str
+        data = data.encode("latin1")
+    fileobj.write(data)
+
+
+def write_docx(notes, fileobj):
+    """Word document with one heading + paragraphs per note."""
+    from docx import Document
+
+    document = Document()
+    for note in notes:
+        document.add_heading(_heading(note), level=2)
+        for paragraph in (note.content or "").split("\n\n"):
+            document.add_paragraph(paragraph)
+    document.save(fileobj)
+
+
+# Binary formats rendered into a file object
+WRITERS = {"pdf": write_pdf, "docx": write_docx}
+
+
+def render_to_file(filetype, notes):
+    """
+    Render a binary format into a spooled temp file (kept in memory up to
+    EXPORT_SPOOL_SIZE, then moved to disk) positioned at the start.
+    """
+    writer = WRITERS[filetype]
+    spool = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_SIZE)
+    writer(notes, spool)
+    spool.seek(0)
+    return spool
+
+
+def stream_text(filetype, notes):
+    """Generator of text chunks for the streamed formats (txt, md)."""
+    return {"txt": stream_txt, "md": stream_markdown}[filetype](notes)
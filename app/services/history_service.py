@@ -0,0 +1,116 @@
+# Server-side response history (SQLite ring buffer per browser session; the cookie keeps only an id + position)
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from .state_dir import APP_STATE_DIR, private_parent
+
+# Default values from environment (fallback)
+DEFAULT_HISTORY_PATH = os.getenv("RESPONSE_HISTORY_PATH", os.path.join(APP_STATE_DIR, "history.db"))
+DEFAULT_HISTORY_LIMIT = int(os.getenv("RESPONSE_HISTORY_LIMIT", "20"))
+DEFAULT_HISTORY_RETENTION = int(os.getenv("RESPONSE_HISTORY_RETENTION", str(7 * 86400)))
+
+# Purge expired entries every N appends
+_PURGE_EVERY = 500
+
+
+def new_history_id():
+    return uuid.uuid4().hex
+
+
+class HistoryStore:
+    """
+    Generated responses kept in a SQLite table keyed by (owner, seq).
+
+    Only the owner id and the current seq live in the session cookie, so the
+    cookie stays a few dozen bytes however long the answers are, and moving
+    through the history reads a single row. Each owner keeps at most `limit`
+    entries (oldest dropped first) and entries older than `retention`
+    seconds are purged. The file is shared by all workers on a host and lives
+    in a directory only the app user can read (see state_dir).
+    """
+
+    def __init__(self, path=DEFAULT_HISTORY_PATH, limit=DEFAULT_HISTORY_LIMIT, retention=DEFAULT_HISTORY_RETENTION):
+        self.path = private_parent(path)
+        self.limit = limit
+        self.retention = retention
+        self._local = threading.local()
+        self._writes = 0
+        with self._conn() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS response_history ("
+                " owner TEXT NOT NULL,"
+                " seq INTEGER NOT NULL,"
+                " prompt TEXT,"
+                " content TEXT NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " PRIMARY KEY (owner, seq)) WITHOUT ROWID"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_response_history_created ON response_history (created_at)")
+
+    def _conn(self):
+        # sqlite3 connections can't be shared across threads; keep one per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def append(self, owner, content, prompt=None):
+        """Store a response as the owner's newest entry and return its seq."""
+        conn = self._conn()
+        with conn:
+            # Take the write lock before reading MAX(seq): two workers appending for the same
+            # owner would otherwise pick the same seq and one insert would fail
+            conn.execute("BEGIN IMMEDIATE")
+            seq = conn.execute(
+                "SELECT COALESCE(MAX(seq), -1) + 1 FROM response_history WHERE owner = ?", (owner,)
+            ).fetchone()[0]
+            conn.execute(
+                "INSERT INTO response_history (owner, seq, prompt, content, created_at) VALUES (?, ?, ?, ?, ?)",
+                (owner, seq, prompt, content, time.time()),
+            )
+            conn.execute("DELETE FROM response_history WHERE owner = ? AND seq <= ?", (owner, seq - self.limit))
+        self._writes += 1
+        if self._writes % _PURGE_EVERY == 0:
+            self.purge()
+        return seq
+
+    def get(self, owner, seq):
+        """
+        The entry at `seq` as a dict (seq, content, prompt, has_previous, has_next),
+        or None when it no longer exists.
+        """
+        row = self._conn().execute(
+            "SELECT seq, content, prompt,"
+            " EXISTS (SELECT 1 FROM response_history WHERE owner = :owner AND seq < :seq),"
+            " EXISTS (SELECT 1 FROM response_history WHERE owner = :owner AND seq > :seq)"
+            " FROM response_history WHERE owner = :owner AND seq = :seq",
+            {"owner": owner, "seq": seq},
+        ).fetchone()
+        if row is None:
+            return None
+        return {
+            "seq": row[0],
+            "content": row[1],
+            "prompt": row[2],
+            "has_previous": bool(row[3]),
+            "has_next": bool(row[4]),
+        }
+
+    def step(self, owner, seq, offset):
+        """The entry `offset` places away from `seq`, or the one at `seq` when out of range."""
+        return self.get(owner, seq + offset) or self.get(owner, seq)
+
+    def clear(self, owner):
+        with self._conn() as conn:
+            conn.execute("DELETE FROM response_history WHERE owner = ?", (owner,))
+
+    def purge(self, older_than=None):
+        """Delete every entry older than `older_than` seconds (default: retention)."""
+        cutoff = time.time() - (self.retention if older_than is None else older_than)
+        with self._conn() as conn:
+            return conn.execute("DELETE FROM response_history WHERE created_at < ?", (cutoff,)).rowcount
@@ -0,0 +1,166 @@
+# Syllabus (Topic/Subtopic) import: streamed reading, vectorized dedupe, diff-based bulk upsert
+import os
+import time
+
+from sqlalchemy import delete, insert, select, update
+
+# Default values from environment (fallback)
+IMPORT_READ_CHUNK = int(os.getenv("IMPORT_READ_CHUNK", "10000"))
+IMPORT_WRITE_CHUNK = int(os.getenv("IMPORT_WRITE_CHUNK", "1000"))
+
+REQUIRED_COLUMNS = ("Topic", "Subtopic")
+SUPPORTED_EXTENSIONS = {"xlsx", "csv"}
+
+
+class SyllabusFormatError(ValueError):
+    """The uploaded file is missing the Topic/Subtopic columns or has no usable rows."""
+
+
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def read_syllabus(path, chunksize=IMPORT_READ_CHUNK):
+    """
+    Stream a CSV or XLSX syllabus as DataFrame chunks with Topic and Subtopic columns.
+
+    Large CSVs are read with pandas' chunked reader; XLSX files are read
+    row-by-row through openpyxl's read-only mode, so neither is loaded whole.
+    """
+    import pandas as pd
+
+    ext = path.rsplit(".", 1)[-1].lower()
+    if ext == "csv":
+        header = pd.read_csv(path, nrows=0).columns
+        if not set(REQUIRED_COLUMNS) <= set(header):
+            raise SyllabusFormatError("File must have columns: Topic and Subtopic")
+        yield from pd.read_csv(path, usecols=list(REQUIRED_COLUMNS), dtype=str, chunksize=chunksize)
+        return
+
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = [str(h).strip() if h is not None else "" for h in next(rows, ())]
+        if not set(REQUIRED_COLUMNS) <= set(header):
+            raise SyllabusFormatError("Excel must have columns: Topic and Subtopic")
+        topic_col, subtopic_col = header.index("Topic"), header.index("Subtopic")
+        buffer = []
+        for row in rows:
+            buffer.append((row[topic_col] if topic_col < len(row) else None,
+                           row[subtopic_col] if subtopic_col < len(row) else None))
+            if len(buffer) >= chunksize:
+                yield pd.DataFrame(buffer, columns=list(REQUIRED_COLUMNS))
+                buffer = []
+        if buffer:
+            yield pd.DataFrame(buffer, columns=list(REQUIRED_COLUMNS))
+    finally:
+        workbook.close()
+
+
+def normalize_syllabus(frames):
+    """Concatenate chunks, strip names, drop blanks and duplicate (topic, subtopic) pairs."""
+    import pandas as pd
+
+    rows_read = 0
+    parts = []
+    for frame in frames:
+        rows_read += len(frame)
+        frame = frame[list(REQUIRED_COLUMNS)].dropna()
+        frame = frame.astype(str).apply(lambda col: col.str.strip())
+        frame = frame[(frame["Topic"] != "") & (frame["Subtopic"] != "")]
+        parts.append(frame.drop_duplicates())
+    if not parts:
+        return pd.DataFrame(columns=list(REQUIRED_COLUMNS)), rows_read
+    pairs = pd.concat(parts, ignore_index=True).drop_duplicates(ignore_index=True)
+    return pairs, rows_read
+
+
+def sync_syllabus(session, frames, Topic, Subtopic, Note, chunk_size=IMPORT_WRITE_CHUNK):
+    """
+    Make the Topic/Subtopic tables match the uploaded syllabus.
+
+    Only the difference is written: unchanged rows keep their ids, so Notes
+    that point at them stay attached. Notes pointing at removed topics or
+    subtopics get a NULL reference instead of a dangling id. Everything is
+    committed in one transaction.
+
+    Args:
+        session: SQLAlchemy session (db.session)
+        frames: Iterable of DataFrames with Topic and Subtopic columns (see read_syllabus)
+        Topic, Subtopic, Note: Model classes
+
+    Returns:
+        dict: rows read, topics/subtopics added and removed, seconds and rows/sec
+    """
+    import pandas as pd
+
+    started = time.perf_counter()
+    pairs, rows_read = normalize_syllabus(frames)
+    if pairs.empty:
+        raise SyllabusFormatError("No Topic/Subtopic rows found in the file")
+
+    # --- Topics: insert the missing names in chunks ---
+    topic_ids = dict(session.execute(select(Topic.name, Topic.id)).all())
+    wanted_topics = set(pairs["Topic"].unique())
+    new_topics = sorted(wanted_topics - topic_ids.keys())
+    for chunk in _chunks(new_topics, chunk_size):
+        session.execute(insert(Topic), [{"name": name} for name in chunk])
+    if new_topics:
+        topic_ids = dict(session.execute(select(Topic.name, Topic.id)).all())
+
+    # --- Subtopics: anti-join desired vs. existing (topic_id, name) pairs ---
+    desired = pd.DataFrame({
+        "topic_id": pairs["Topic"].map(topic_ids).astype("int64"),
+        "name": pairs["Subtopic"],
+    })
+    existing = pd.DataFrame(
+        session.execute(select(Subtopic.id, Subtopic.topic_id, Subtopic.name)).all(),
+        columns=["id", "topic_id", "name"],
+    )
+
+    # Older imports could leave duplicate rows; keep the lowest id per pair and re-point notes to it
+    existing = existing.sort_values("id")
+    duplicated = existing.duplicated(["topic_id", "name"])
+    duplicates = existing[duplicated]
+    existing = existing[~duplicated]
+    if not duplicates.empty:
+        kept = duplicates.merge(existing, on=["topic_id", "name"], suffixes=("", "_kept"))
+        for kept_id, group in kept.groupby("id_kept"):
+            for chunk in _chunks(group["id"].tolist(), chunk_size):
+                session.execute(update(Note).where(Note.subtopic_id.in_(chunk)).values(subtopic_id=int(kept_id)))
+
+    merged = desired.merge(existing, on=["topic_id", "name"], how="outer", indicator=True)
+    to_add = merged[merged["_merge"] == "left_only"]
+    removed_ids = merged.loc[merged["_merge"] == "right_only", "id"].astype("int64").tolist()
+    removed_ids += duplicates["id"].astype("int64").tolist()
+
+    rows = [{"topic_id": int(t), "name": n} for t, n in zip(to_add["topic_id"], to_add["name"])]
+    for chunk in _chunks(rows, chunk_size):
+        session.execute(insert(Subtopic), chunk)
+
+    for chunk in _chunks(removed_ids, chunk_size):
+        session.execute(update(Note).where(Note.subtopic_id.in_(chunk)).values(subtopic_id=None))
+        session.execute(delete(Subtopic).where(Subtopic.id.in_(chunk)))
+
+    # --- Topics that no longer appear in the syllabus ---
+    removed_topics = [topic_ids[name] for name in topic_ids.keys() - wanted_topics]
+    for chunk in _chunks(removed_topics, chunk_size):
+        session.execute(update(Note).where(Note.topic_id.in_(chunk)).values(topic_id=None))
+        session.execute(delete(Subtopic).where(Subtopic.topic_id.in_(chunk)))
+        session.execute(delete(Topic).where(Topic.id.in_(chunk)))
+
+    session.commit()
+
+    seconds = time.perf_counter() - started
+    return {
+        "rows": rows_read,
+        "topics_added": len(new_topics),
+        "topics_removed": len(removed_topics),
+        "subtopics_added": len(rows),
+        "subtopics_removed": len(removed_ids),
+        "seconds": seconds,
+        "rows_per_sec": rows_read / seconds if seconds else float(rows_read),
+    }
@@ -0,0 +1,179 @@
+# Background job queue (bounded, thread worker pool, SQLite/in-memory job store)
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+
+# Default values from environment (fallback)
+DEFAULT_JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+DEFAULT_JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", "100"))
+DEFAULT_JOB_DB_PATH = os.getenv("JOB_DB_PATH", ":memory:")
+DEFAULT_JOB_RETENTION = int(os.getenv("JOB_RETENTION", "86400"))
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+# Finished jobs are purged at most this often (seconds), from submit()
+PURGE_INTERVAL = 300
+
+
+class QueueFull(Exception):
+    """Raised by JobQueue.submit when the pending queue is at capacity."""
+
+
+class JobStore:
+    """
+    Job status table kept in SQLite (":memory:" by default, so no Redis is needed).
+
+    A file path makes job status visible to every worker process on the host.
+    """
+
+    def __init__(self, path=DEFAULT_JOB_DB_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " id TEXT PRIMARY KEY,"
+                " kind TEXT NOT NULL,"
+                " owner TEXT,"
+                " status TEXT NOT NULL,"
+                " payload TEXT,"
+                " result TEXT,"
+                " error TEXT,"
+                " created_at REAL NOT NULL,"
+                " updated_at REAL NOT NULL)"
+            )
+            self._conn.commit()
+
+    def create(self, kind, payload, owner=None):
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, kind, owner, status, payload, created_at, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, kind, None if owner is None else str(owner), QUEUED, json.dumps(payload), now, now),
+            )
+            self._conn.commit()
+        return job_id
+
+    def update(self, job_id, status, result=None, error=None):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, updated_at = ? WHERE id = ?",
+                (status, None if result is None else json.dumps(result), error, time.time(), job_id),
+            )
+            self._conn.commit()
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"]) if job["payload"] else None
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def purge(self, older_than=DEFAULT_JOB_RETENTION):
+        """Delete finished jobs older than `older_than` seconds."""
+        with self._lock:
+            removed = self._conn.execute(
+                "DELETE FROM jobs WHERE status IN (?, ?) AND updated_at < ?",
+                (DONE, FAILED, time.time() - older_than),
+            ).rowcount
+            self._conn.commit()
+        return removed
+
+
+class JobQueue:
+    """
+    Bounded queue drained by a pool of worker threads.
+
+    `handler(payload)` runs in a worker thread and returns a JSON-serialisable
+    result. Payload keys listed in `redact` (e.g. API keys) are handed to the
+    handler but never written to the job store. Finished jobs older than
+    `retention` seconds are purged from the store as new jobs are submitted.
+    """
+
+    def __init__(self, handler, kind="job", workers=DEFAULT_JOB_WORKERS,
+                 max_pending=DEFAULT_JOB_QUEUE_SIZE, store=None, redact=(), retention=DEFAULT_JOB_RETENTION):
+        self.handler = handler
+        self.kind = kind
+        self.workers = workers
+        self.store = store if store is not None else JobStore()
+        self.redact = set(redact)
+        self.retention = retention
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._threads = []
+        self._start_lock = threading.Lock()
+        self._last_purge = -PURGE_INTERVAL
+
+    def start(self):
+        with self._start_lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                t = threading.Thread(target=self._work, name=f"{self.kind}-worker-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def submit(self, payload, owner=None):
+        """Enqueue a job and return its id; raises QueueFull when the queue is at capacity."""
+        self.start()
+        self._maybe_purge()
+        if self._queue.full():
+            raise QueueFull(f"{self.kind} queue is full ({self._queue.maxsize} pending jobs)")
+        stored = {k: v for k, v in payload.items() if k not in self.redact}
+        job_id = self.store.create(self.kind, stored, owner=owner)
+        try:
+            self._queue.put_nowait((job_id, payload))
+        except queue.Full:
+            self.store.update(job_id, FAILED, error="queue full")
+            raise QueueFull(f"{self.kind} queue is full ({self._queue.maxsize} pending jobs)")
+        return job_id
+
+    def get(self, job_id):
+        return self.store.get(job_id)
+
+    def _maybe_purge(self):
+        now = time.monotonic()
+        with self._start_lock:
+            if now - self._last_purge < PURGE_INTERVAL:
+                return
+            self._last_purge = now
+        self.store.purge(self.retention)
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                return
+            job_id, payload = item
+            self.store.update(job_id, RUNNING)
+            try:
+                result = self.handler(payload)
+            except Exception as e:
+                self.store.update(job_id, FAILED, error=str(e))
+            else:
+                self.store.update(job_id, DONE, result=result)
+            finally:
+                self._queue.task_done()
+
+    def shutdown(self, wait=True):
+        """Stop the workers after the jobs already queued have been processed."""
+        for _ in self._threads:
+            self._queue.put(None)
+        if wait:
+            for t in self._threads:
+                t.join()
+        self._threads = []
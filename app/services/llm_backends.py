@@ -0,0 +1,449 @@
+# LLM provider backends (OpenAI, Groq, offline fake) and multi-provider race / fallback strategies
+import asyncio
+import contextvars
+import hashlib
+import os
+import random
+import threading
+import time
+import types
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from .client_registry import build_http_client, client_registry
+from .rate_limit_service import PROVIDER_CONCURRENCY
+
+# Default values from environment (fallback)
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
+GROQ_BASE_URL = os.getenv("GROQ_BASE_URL") or None
+# Enough threads for every real provider to use all its concurrency slots, and no more (see fanout_executor)
+FANOUT_WORKERS = int(os.getenv("LLM_FANOUT_WORKERS", "0")) or 2 * (PROVIDER_CONCURRENCY or 8)
+FAKE_LLM_LATENCY = float(os.getenv("FAKE_LLM_LATENCY", "0.05"))
+FAKE_LLM_TOKENS_PER_SEC = float(os.getenv("FAKE_LLM_TOKENS_PER_SEC", "0"))  # 0 = whole answer at once
+FAKE_LLM_FAIL_RATE = float(os.getenv("FAKE_LLM_FAIL_RATE", "0"))
+FAKE_LLM_ANSWER_TOKENS = int(os.getenv("FAKE_LLM_ANSWER_TOKENS", "0"))  # 0 = one short sentence
+
+# One completed provider call
+Completion = namedtuple("Completion", "text usage provider model")
+
+
+class ProviderError(Exception):
+    """A provider call failed; `provider` names the backend, `status_code` the HTTP status if there was one."""
+
+    def __init__(self, provider, message, status_code=None):
+        super().__init__(f"{provider}: {message}")
+        self.provider = provider
+        self.status_code = status_code
+
+
+# ------------------------
+# Per-call deadline / cancellation
+# ------------------------
+class CallControl:
+    """
+    Deadline (time.monotonic(), or None) and cancel flag of one provider call run by race/fallback.
+
+    A thread can't be killed, so the strategies tell a call it has lost
+    through this object, and backends check it: SDK requests get the time
+    left as their timeout, streams stop between chunks, and the fake
+    backend wakes up from its sleep.
+    """
+
+    __slots__ = ("deadline", "cancelled")
+
+    def __init__(self, deadline=None):
+        self.deadline = deadline
+        self.cancelled = threading.Event()
+
+    def cancel(self):
+        self.cancelled.set()
+
+
+_call_control = contextvars.ContextVar("llm_call_control", default=None)
+
+
+def call_timeout():
+    """Seconds the current provider call may still take, or None without a deadline."""
+    control = _call_control.get()
+    if control is None or control.deadline is None:
+        return None
+    return max(0.0, control.deadline - time.monotonic())
+
+
+def call_cancelled():
+    """True once race/fallback has given up on the current provider call."""
+    control = _call_control.get()
+    return control is not None and control.cancelled.is_set()
+
+
+def _call_context(control):
+    """Copy of the current context in which the call sees `control`."""
+    context = contextvars.copy_context()
+    context.run(_call_control.set, control)
+    return context
+
+
+def _timeout_kwargs():
+    timeout = call_timeout()
+    return {} if timeout is None else {"timeout": timeout}
+
+
+# ------------------------
+# SDK clients
+# ------------------------
+def _build_openai_client(api_key):
+    from openai import OpenAI
+    return OpenAI(api_key=api_key, base_url=OPENAI_BASE_URL, http_client=build_http_client())
+
+def _build_groq_client(api_key):
+    from groq import Groq
+    return Groq(api_key=api_key, base_url=GROQ_BASE_URL, http_client=build_http_client())
+
+CLIENT_FACTORIES = {
+    "openai": _build_openai_client,
+    "groq": _build_groq_client,
+}
+
+def get_llm_client(provider, api_key):
+    """Return a warm, shared SDK client for this provider/key pair."""
+    return client_registry.get(provider, api_key, CLIENT_FACTORIES[provider])
+
+
+# ------------------------
+# Backends
+# ------------------------
+class LLMBackend:
+    """
+    Interface every provider implements.
+
+    `complete` and `stream` are synchronous (the SDK clients are shared and
+    keep their connection pools warm). `acomplete` runs `complete` on the
+    shared fan-out thread pool, so asyncio callers reuse the same pooled
+    clients; cancelling the awaiting task abandons the call and its result
+    is discarded.
+    """
+
+    name = None
+    default_model = None
+    requires_key = True
+
+    def default_key(self):
+        return ""
+
+    def complete(self, messages, model, temperature, max_tokens, api_key):
+        raise NotImplementedError
+
+    def stream(self, messages, model, temperature, max_tokens, api_key):
+        """Yield (delta, usage) pairs; usage is None except possibly on the last chunk."""
+        completion = self.complete(messages, model, temperature, max_tokens, api_key)
+        yield completion.text, completion.usage
+
+    async def acomplete(self, messages, model, temperature, max_tokens, api_key):
+        loop = asyncio.get_running_loop()
+        call = contextvars.copy_context().run
+        return await loop.run_in_executor(
+            fanout_executor, call, self.complete, messages, model, temperature, max_tokens, api_key
+        )
+
+
+class OpenAICompatibleBackend(LLMBackend):
+    """OpenAI-style chat.completions API (OpenAI itself, Groq)."""
+
+    def __init__(self, name, key_env, model_env, default_model):
+        self.name = name
+        self.key_env = key_env
+        self.default_model = os.getenv(model_env, default_model)
+
+    def default_key(self):
+        return os.getenv(self.key_env, "")
+
+    def complete(self, messages, model, temperature, max_tokens, api_key):
+        if call_cancelled():
+            raise ProviderError(self.name, "cancelled")
+        client = get_llm_client(self.name, api_key)
+        response = client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            **_timeout_kwargs(),  # a race/fallback loser gives its thread back by the deadline at the latest
+        )
+        return Completion(response.choices[0].message.content.strip(), getattr(response, "usage", None),
+                          self.name, model)
+
+    def stream(self, messages, model, temperature, max_tokens, api_key):
+        client = get_llm_client(self.name, api_key)
+        stream = client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            stream=True,
+            **_timeout_kwargs(),
+        )
+        for chunk in stream:
+            if call_cancelled():
+                close = getattr(stream, "close", None)
+                if callable(close):
+                    close()
+                return
+            usage = getattr(chunk, "usage", None)
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta or usage:
+                yield delta or "", usage
+
+
+class FakeBackend(LLMBackend):
+    """
+    Offline provider for tests, benchmarks and local development.
+
+    Answers are deterministic for a prompt. `latency` is the time to the
+    first token, `tokens_per_sec` (0 = instant) paces the rest, `jitter`
+    adds up to that many seconds at random and `fail_rate` makes that
+    fraction of calls raise ProviderError (a 503). `answer_tokens` pads answers to
+    that length; like a real model the answer stops at `max_tokens`.
+    """
+
+    requires_key = False
+
+    def __init__(self, name="fake", latency=FAKE_LLM_LATENCY, tokens_per_sec=FAKE_LLM_TOKENS_PER_SEC,
+                 fail_rate=FAKE_LLM_FAIL_RATE, jitter=0.0, default_model="fake-1",
+                 answer_tokens=FAKE_LLM_ANSWER_TOKENS):
+        self.name = name
+        self.latency = latency
+        self.tokens_per_sec = tokens_per_sec
+        self.fail_rate = fail_rate
+        self.jitter = jitter
+        self.default_model = default_model
+        self.answer_tokens = answer_tokens
+        self.calls = 0
+
+    def _answer(self, messages, max_tokens=None):
+        prompt = messages[-1]["content"]
+        digest = hashlib.sha1(prompt.encode("utf-8")).hexdigest()[:8]
+        words = prompt.split()
+        subject = " ".join(words[:12]) if words else "the question"
+        tokens = (f"[{self.name} {digest}] Offline answer about {subject}. "
+                  "This text is generated locally without calling a provider.").split(" ")
+        if self.answer_tokens:
+            filler = "More detail follows here to make the answer longer.".split(" ")
+            while len(tokens) < self.answer_tokens:
+                tokens += filler
+            tokens = tokens[:self.answer_tokens]
+        if max_tokens:
+            tokens = tokens[:max_tokens]
+        usage = types.SimpleNamespace(prompt_tokens=len(words), completion_tokens=len(tokens),
+                                      total_tokens=len(words) + len(tokens))
+        return tokens, usage
+
+    def _first_token_delay(self):
+        self.calls += 1
+        if self.fail_rate and random.random() < self.fail_rate:
+            raise ProviderError(self.name, "simulated failure", status_code=503)
+        return self.latency + (random.uniform(0, self.jitter) if self.jitter else 0.0)
+
+    def _sleep(self, delay):
+        """time.sleep that, like an SDK call, gives up when the call is cancelled or past its deadline."""
+        control = _call_control.get()
+        if control is None:
+            time.sleep(delay)
+            return
+        timeout = call_timeout()
+        if control.cancelled.wait(delay if timeout is None else min(delay, timeout)):
+            raise ProviderError(self.name, "cancelled")
+        if timeout is not None and timeout < delay:
+            raise TimeoutError(f"{self.name} timed out")
+
+    def complete(self, messages, model, temperature, max_tokens, api_key):
+        tokens, usage = self._answer(messages, max_tokens)
+        delay = self._first_token_delay()
+        if self.tokens_per_sec:
+            delay += len(tokens) / self.tokens_per_sec
+        self._sleep(delay)
+        return Completion(" ".join(tokens), usage, self.name, model)
+
+    def stream(self, messages, model, temperature, max_tokens, api_key):
+        tokens, usage = self._answer(messages, max_tokens)
+        self._sleep(self._first_token_delay())
+        for i, token in enumerate(tokens):
+            if self.tokens_per_sec and i:
+                self._sleep(1 / self.tokens_per_sec)
+            yield (token if i == 0 else " " + token), (usage if i == len(tokens) - 1 else None)
+
+    async def acomplete(self, messages, model, temperature, max_tokens, api_key):
+        # Natively async, so cancellation really stops it
+        tokens, usage = self._answer(messages, max_tokens)
+        delay = self._first_token_delay()
+        if self.tokens_per_sec:
+            delay += len(tokens) / self.tokens_per_sec
+        await asyncio.sleep(delay)
+        return Completion(" ".join(tokens), usage, self.name, model)
+
+
+BACKENDS = {}
+
+def register_backend(backend):
+    """Add (or replace) a backend; its `name` is what `provider=` selects."""
+    BACKENDS[backend.name] = backend
+    return backend
+
+def get_backend(name):
+    return BACKENDS.get(name)
+
+register_backend(OpenAICompatibleBackend("openai", "OPENAI_API_KEY", "OPENAI_MODEL", "gpt-4"))
+register_backend(OpenAICompatibleBackend("groq", "GROQ_API_KEY", "GROQ_MODEL", "llama-3.3-70b-versatile"))
+register_backend(FakeBackend())
+
+
+# ------------------------
+# Multi-provider strategies
+# ------------------------
+# Shared pool for fan-out; never shut down per call, so a losing request
+# doesn't hold up the winner. Losers are cancelled (CallControl) rather than
+# left running, and each call ends by the strategy's deadline, so a thread
+# is held at most `timeout` seconds. Sized to the provider concurrency
+# quota: more threads would only queue for a concurrency slot.
+fanout_executor = ThreadPoolExecutor(max_workers=FANOUT_WORKERS, thread_name_prefix="llm-fanout")
+
+
+def _submit(call, deadline=None):
+    """Start `call` on the fan-out pool; returns (future, control)."""
+    control = CallControl(deadline)
+    return fanout_executor.submit(_call_context(control).run, call), control
+
+
+def _abandon(future, control):
+    future.cancel()
+    control.cancel()
+
+
+def race(calls, timeout=None, hedge_delay=0.0):
+    """
+    Run the zero-argument `calls` concurrently and return (index, result) of the first to succeed.
+
+    With `hedge_delay` > 0 the calls are started one at a time, each only if
+    nothing has succeeded `hedge_delay` seconds after the previous one
+    started (a hedged request). Losers are cancelled: not started at all if
+    still queued, otherwise told to stop (see CallControl), and every call
+    gets the race's deadline. Raises the last error when every call fails,
+    or TimeoutError after `timeout` seconds.
+    """
+    deadline = None if timeout is None else time.monotonic() + timeout
+    pending = {}
+    errors = []
+    queue = list(enumerate(calls))
+
+    def remaining():
+        return None if deadline is None else max(0.0, deadline - time.monotonic())
+
+    def start():
+        index, call = queue.pop(0)
+        future, control = _submit(call, deadline)
+        pending[future] = (index, control)
+
+    try:
+        while queue or pending:
+            if queue and (not pending or hedge_delay <= 0):
+                start()
+                if hedge_delay <= 0:
+                    continue
+            wait_for = remaining()
+            if queue and hedge_delay > 0:
+                wait_for = hedge_delay if wait_for is None else min(wait_for, hedge_delay)
+            done, _ = wait(pending, timeout=wait_for, return_when=FIRST_COMPLETED)
+            for future in done:
+                index, _ = pending.pop(future)
+                try:
+                    return index, future.result()
+                except Exception as e:
+                    errors.append(e)
+            if not done and deadline is not None and time.monotonic() >= deadline:
+                raise TimeoutError(f"No provider answered within {timeout}s")
+            # Nothing answered within the hedge delay, or a call failed: start the next one now
+            if queue and pending:
+                start()
+        raise errors[-1] if errors else TimeoutError("No provider to call")
+    finally:
+        for future, (_, control) in pending.items():
+            _abandon(future, control)
+
+
+def fallback(calls, timeout=None):
+    """
+    Try the zero-argument `calls` in order and return (index, result) of the first that succeeds.
+
+    `timeout` is per call: a provider that doesn't answer in time is
+    cancelled (it also gets the deadline itself) and the next one is tried.
+    Raises the last error if all fail.
+    """
+    error = TimeoutError("No provider to call")
+    for index, call in enumerate(calls):
+        future, control = _submit(call, None if timeout is None else time.monotonic() + timeout)
+        try:
+            return index, future.result(timeout=timeout)
+        except Exception as e:
+            _abandon(future, control)
+            error = TimeoutError(f"Provider {index} timed out after {timeout}s") if isinstance(e, TimeoutError) else e
+    raise error
+
+
+def _start_task(factory, control):
+    # The task (and the fan-out thread acomplete hands the call to) runs with `control` set
+    return _call_context(control).run(asyncio.ensure_future, factory())
+
+
+async def race_async(factories, timeout=None, hedge_delay=0.0):
+    """asyncio version of `race`: `factories` return awaitables; losing tasks are cancelled."""
+    loop = asyncio.get_running_loop()
+    deadline = None if timeout is None else loop.time() + timeout
+    call_deadline = None if timeout is None else time.monotonic() + timeout
+    queue = list(enumerate(factories))
+    pending = {}
+    errors = []
+
+    def start():
+        index, factory = queue.pop(0)
+        control = CallControl(call_deadline)
+        pending[_start_task(factory, control)] = (index, control)
+
+    try:
+        while queue or pending:
+            if queue and (not pending or hedge_delay <= 0):
+                start()
+                if hedge_delay <= 0:
+                    continue
+            wait_for = None if deadline is None else max(0.0, deadline - loop.time())
+            if queue and hedge_delay > 0:
+                wait_for = hedge_delay if wait_for is None else min(wait_for, hedge_delay)
+            done, _ = await asyncio.wait(pending, timeout=wait_for, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                index, _ = pending.pop(task)
+                try:
+                    return index, task.result()
+                except Exception as e:
+                    errors.append(e)
+            if not done and deadline is not None and loop.time() >= deadline:
+                raise TimeoutError(f"No provider answered within {timeout}s")
+            if queue and pending:
+                start()
+        raise errors[-1] if errors else TimeoutError("No provider to call")
+    finally:
+        for task, (_, control) in pending.items():
+            task.cancel()
+            control.cancel()
+
+
+async def fallback_async(factories, timeout=None):
+    """asyncio version of `fallback` (per-call `timeout`)."""
+    error = TimeoutError("No provider to call")
+    for index, factory in enumerate(factories):
+        control = CallControl(None if timeout is None else time.monotonic() + timeout)
+        try:
+            return index, await asyncio.wait_for(_start_task(factory, control), timeout)
+        except asyncio.TimeoutError:
+            control.cancel()
+            error = TimeoutError(f"Provider {index} timed out after {timeout}s")
+        except Exception as e:
+            control.cancel()
+            error = e
+    raise error
@@ -1,62 +1,387 @@
+import asyncio
+import hashlib
+import json
 import os
-from dotenv import load_dotenv
+import time
+import types
+from collections import namedtuple
+from functools import partial
 
-load_dotenv()
+from .cache_service import get_response_cache, make_cache_key
+from .llm_backends import (  # noqa: F401  (CLIENT_FACTORIES/get_llm_client re-exported)
+    BACKENDS, CLIENT_FACTORIES, Completion, fallback, fallback_async, get_backend, get_llm_client, race, race_async
+)
+from .metrics_service import metrics, record_llm
+from .rate_limit_service import RateLimited, quotas
+from .singleflight import flights
+from .token_service import DEFAULT_MAX_TOKENS, PromptTooLong, budget_max_tokens, count_message_tokens
 
 # Default values from environment (fallback)
 DEFAULT_PROVIDER = os.getenv("LLM_PROVIDER", "openai").lower()
-DEFAULT_OPENAI_KEY = os.getenv("OPENAI_API_KEY", "")
-DEFAULT_GROQ_KEY = os.getenv("GROQ_API_KEY", "")
-DEFAULT_OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4")
-DEFAULT_GROQ_MODEL = os.getenv("GROQ_MODEL", "llama-3.3-70b-versatile")
+DEFAULT_STRATEGY = os.getenv("LLM_STRATEGY", "single").lower()  # single | race | fallback
+DEFAULT_PROVIDERS = [p.strip().lower() for p in os.getenv("LLM_PROVIDERS", "openai,groq").split(",") if p.strip()]
+DEFAULT_PROVIDER_TIMEOUT = float(os.getenv("LLM_PROVIDER_TIMEOUT", "60"))
+DEFAULT_HEDGE_DELAY = float(os.getenv("LLM_HEDGE_DELAY", "0"))
 
-def generate_llm_response(prompt, provider=None, api_key=None, model=None, temperature=0.7):
+ERROR_PREFIX = "❌"
+SYSTEM_MESSAGE = "You are an expert AI tutor. Explain clearly in simple terms."
+MAX_TOKENS = DEFAULT_MAX_TOKENS
+STRATEGIES = ("single", "race", "fallback")
+
+# A resolved provider call: backend, key and model
+Target = namedtuple("Target", "backend api_key model")
+
+class LLMError(Exception):
+    """Raised instead of returning an error message when raise_errors=True."""
+
+def is_error_response(text):
+    """True if `text` is one of the error messages returned instead of a completion."""
+    return text.startswith(ERROR_PREFIX)
+
+def _resolve_request(provider, api_key, model):
+    """
+    Validate provider/key and resolve the model.
+
+    :return: (provider, api_key, model, error) - error is a user-facing message or None
+    """
+    provider = (provider or DEFAULT_PROVIDER).lower()
+    backend = get_backend(provider)
+
+    # ✅ Validate provider again as a safety net
+    if backend is None:
+        return provider, None, None, f"❌ Invalid provider. Supported providers: {', '.join(sorted(BACKENDS))}."
+
+    # ✅ Pick correct key from user input or environment
+    api_key = api_key or backend.default_key()
+
+    if backend.requires_key and not api_key:
+        return provider, None, None, f"❌ Missing API key for {provider.capitalize()}. Please provide it in the form or .env file."
+
+    final_model = model or backend.default_model
+    return provider, api_key, final_model, None
+
+def _resolve_targets(provider, api_key, model, strategy, providers):
+    """
+    Providers to call for `strategy`, in order; returns (targets, error).
+
+    "single" calls `provider`. "race"/"fallback" call `providers` (default
+    LLM_PROVIDERS), with an explicitly requested provider (and its key/model)
+    first; providers without a configured key are skipped.
+    """
+    if strategy not in STRATEGIES:
+        return [], f"❌ Invalid strategy '{strategy}'. Use one of: {', '.join(STRATEGIES)}."
+    if strategy == "single":
+        names = [provider]
+    else:
+        names = ([provider.lower()] if provider else []) + [p for p in (providers or DEFAULT_PROVIDERS)
+                                                             if not provider or p != provider.lower()]
+    targets, first_error = [], None
+    for i, name in enumerate(names):
+        own = i == 0 and (strategy == "single" or provider)
+        name, key, final_model, error = _resolve_request(name, api_key if own else None, model if own else None)
+        if error:
+            first_error = first_error or error
+            continue
+        targets.append(Target(get_backend(name), key, final_model))
+    if not targets:
+        return [], first_error or "❌ No LLM provider configured."
+    return targets, None
+
+def _cache_identity(strategy, targets):
+    """(provider, model) used in the cache key; multi-provider answers are cached per provider set."""
+    if strategy == "single":
+        return targets[0].backend.name, targets[0].model
+    return f"{strategy}:" + ",".join(t.backend.name for t in targets), ",".join(t.model for t in targets)
+
+def _messages(prompt):
+    return [
+        {"role": "system", "content": SYSTEM_MESSAGE},
+        {"role": "user", "content": prompt}
+    ]
+
+def _budget(prompt, targets, max_tokens):
+    """
+    Count the prompt locally and fit max_tokens into every target's context window.
+
+    :return: (prompt_tokens, max_tokens); raises PromptTooLong if the prompt doesn't fit
+    """
+    messages = _messages(prompt)
+    prompt_tokens = count_message_tokens(messages, targets[0].model)
+    max_tokens = max_tokens or MAX_TOKENS
+    for target in targets:
+        max_tokens = budget_max_tokens(prompt_tokens, max_tokens, target.model)
+    return prompt_tokens, max_tokens
+
+def _used_tokens(usage, prompt_tokens):
+    """Tokens a call actually cost, for refunding the provider's tokens/minute reservation."""
+    if usage is None:
+        return None
+    return (getattr(usage, "prompt_tokens", None) or prompt_tokens) + (getattr(usage, "completion_tokens", None) or 0)
+
+def _complete(target, prompt, temperature, max_tokens, prompt_tokens):
+    """One provider call within the key's rate limits and concurrency slots, timed and recorded in the metrics."""
+    name = target.backend.name
+    with quotas.provider_call(name, target.api_key, prompt_tokens + max_tokens) as reservation:
+        started = time.perf_counter()
+        try:
+            completion = target.backend.complete(_messages(prompt), target.model, temperature, max_tokens,
+                                                 target.api_key)
+        except Exception:
+            record_llm(name, target.model, time.perf_counter() - started, status="error")
+            raise
+        record_llm(name, target.model, time.perf_counter() - started, completion.usage)
+        reservation.settle(_used_tokens(completion.usage, prompt_tokens))
+    return completion
+
+async def _acomplete(target, prompt, temperature, max_tokens, prompt_tokens):
+    name = target.backend.name
+    async with quotas.aprovider_call(name, target.api_key, prompt_tokens + max_tokens) as reservation:
+        started = time.perf_counter()
+        try:
+            completion = await target.backend.acomplete(_messages(prompt), target.model, temperature, max_tokens,
+                                                        target.api_key)
+        except Exception:
+            record_llm(name, target.model, time.perf_counter() - started, status="error")
+            raise
+        record_llm(name, target.model, time.perf_counter() - started, completion.usage)
+        reservation.settle(_used_tokens(completion.usage, prompt_tokens))
+    return completion
+
+def _record_winner(strategy, completion):
+    if strategy != "single" and metrics.enabled:
+        metrics.inc("llm_strategy_wins_total", help="Provider that answered a race/fallback request",
+                    strategy=strategy, provider=completion.provider)
+
+def _record_coalesced(completion):
+    if metrics.enabled:
+        metrics.inc("llm_coalesced_total", help="Requests answered by an identical in-flight provider call",
+                    provider=completion.provider)
+
+def _encode_completion(completion):
+    usage = completion.usage
+    return json.dumps({
+        "text": completion.text,
+        "provider": completion.provider,
+        "model": completion.model,
+        "usage": None if usage is None else {
+            name: getattr(usage, name, None) for name in ("prompt_tokens", "completion_tokens", "total_tokens")
+        },
+    })
+
+def _decode_completion(raw):
+    data = json.loads(raw)
+    usage = types.SimpleNamespace(**data["usage"]) if data["usage"] else None
+    return Completion(data["text"], usage, data["provider"], data["model"])
+
+def _cache_lookup(prompt, temperature, strategy, targets, use_cache, max_tokens):
+    cache = get_response_cache()
+    provider, model = _cache_identity(strategy, targets)
+    cache_key = make_cache_key(provider, model, temperature, SYSTEM_MESSAGE, prompt, max_tokens=max_tokens)
+    if not use_cache:
+        cache.record_bypass()
+        return cache, cache_key, None
+    return cache, cache_key, cache.get(cache_key)
+
+def _flight_key(cache_key, targets):
+    """
+    Single-flight key: the cache key plus a hash of who is asking.
+
+    The cache key deliberately leaves out the API key (any key may reuse a
+    cached answer), but an in-flight call is made with one key: a caller
+    with another key must not wait on it or be handed its failure
+    (invalid key, that key's rate limit).
+    """
+    who = hashlib.sha256()
+    for target in targets:
+        who.update(f"{target.backend.name}\x1f{target.api_key or ''}\x1f{target.model}\x1e".encode("utf-8"))
+    return f"{cache_key}:{who.hexdigest()[:16]}"
+
+def _error_message(e):
+    if isinstance(e, RateLimited):
+        return f"❌ {e}"
+    return f"❌ LLM Error: Unable to generate response. Details: {str(e)}"
+
+def _too_long_message(e):
+    return f"❌ Prompt too long: {e}"
+
+def _prepare(prompt, provider, api_key, model, strategy, providers, max_tokens):
+    """
+    Resolve targets and the token budget shared by the generate/stream entry points.
+
+    :return: (strategy, targets, prompt_tokens, max_tokens, error)
+    """
+    strategy = (strategy or (DEFAULT_STRATEGY if provider is None else "single")).lower()
+    targets, error = _resolve_targets(provider, api_key, model, strategy, providers)
+    if error:
+        return strategy, targets, None, None, error
+    try:
+        prompt_tokens, max_tokens = _budget(prompt, targets, max_tokens)
+    except PromptTooLong as e:
+        return strategy, targets, None, None, _too_long_message(e)
+    return strategy, targets, prompt_tokens, max_tokens, None
+
+def generate_llm_response(prompt, provider=None, api_key=None, model=None, temperature=0.7, use_cache=True,
+                          raise_errors=False, strategy=None, providers=None, max_tokens=None, usage=None):
     """
     Generate response from LLM dynamically based on provider and API key.
 
     :param prompt: User prompt text
-    :param provider: 'openai' or 'groq' (default from env)
+    :param provider: Backend name - 'openai', 'groq' or 'fake' (default from env)
     :param api_key: API key provided by user (or fallback from env)
     :param model: Specific model (optional)
     :param temperature: Response randomness
+    :param use_cache: Set False to bypass the response cache (e.g. "regenerate")
+    :param raise_errors: Raise LLMError instead of returning an error message (batch jobs/retries)
+    :param strategy: 'single', 'race' (all providers at once, first answer wins) or 'fallback'
+                     (next provider on error/timeout); LLM_STRATEGY applies when no provider is given
+    :param providers: Provider names for race/fallback (default LLM_PROVIDERS)
+    :param max_tokens: Response length cap (default LLM_MAX_TOKENS), clamped to the model's context window
+    :param usage: Optional TokenUsage filled with the prompt/completion token counts
     :return: LLM response text or error message
+
+    Concurrent identical requests (same provider, API key, model, parameters
+    and prompt) are coalesced into one provider call, across threads and,
+    when SINGLEFLIGHT_PATH is set, across worker processes on the host.
     """
-    provider = (provider or DEFAULT_PROVIDER).lower()
+    strategy, targets, prompt_tokens, max_tokens, error = _prepare(
+        prompt, provider, api_key, model, strategy, providers, max_tokens)
+    if error:
+        if raise_errors:
+            raise LLMError(error)
+        return error
 
-    # ✅ Validate provider again as a safety net
-    if provider not in ["openai", "groq"]:
-        return "❌ Invalid provider. Only 'openai' or 'groq' are supported."
+    # ✅ Serve identical requests from the cache instead of paying for another round-trip
+    cache, cache_key, cached = _cache_lookup(prompt, temperature, strategy, targets, use_cache, max_tokens)
+    if cached is not None:
+        if usage is not None:
+            usage.update(None, prompt_tokens, cached, targets[0].model)
+        return cached
 
-    # ✅ Pick correct key from user input or environment
-    api_key = api_key or (DEFAULT_OPENAI_KEY if provider == "openai" else DEFAULT_GROQ_KEY)
+    calls = [partial(_complete, target, prompt, temperature, max_tokens, prompt_tokens) for target in targets]
 
-    if not api_key:
-        return f"❌ Missing API key for {provider.capitalize()}. Please provide it in the form or .env file."
+    def call():
+        if strategy == "race":
+            return race(calls, timeout=DEFAULT_PROVIDER_TIMEOUT, hedge_delay=DEFAULT_HEDGE_DELAY)[1]
+        if strategy == "fallback":
+            return fallback(calls, timeout=DEFAULT_PROVIDER_TIMEOUT)[1]
+        return calls[0]()
 
+    # ✅ Identical requests already in flight (other threads or workers) share that one provider call
     try:
-        if provider == "openai":
-            from openai import OpenAI
-            client = OpenAI(api_key=api_key)
-            final_model = model or DEFAULT_OPENAI_MODEL
-
-        elif provider == "groq":
-            from groq import Groq
-            client = Groq(api_key=api_key)
-            final_model = model or DEFAULT_GROQ_MODEL
-
-        # ✅ Make the request
-        response = client.chat.completions.create(
-            model=final_model,
-            messages=[
-                {"role": "system", "content": "You are an expert AI tutor. Explain clearly in simple terms."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=temperature,
-            max_tokens=1200,
-        )
-
-        # ✅ Extract response text safely
-        return response.choices[0].message.content.strip()
+        completion, shared = flights.do(_flight_key(cache_key, targets), call, _encode_completion, _decode_completion)
+    except Exception as e:
+        if raise_errors:
+            raise LLMError(str(e)) from e
+        return _error_message(e)
+
+    if shared:
+        _record_coalesced(completion)
+    else:
+        _record_winner(strategy, completion)
+    if usage is not None:
+        usage.update(completion.usage, prompt_tokens, completion.text, completion.model)
+    if not shared:
+        cache.set(cache_key, completion.text)
+    return completion.text
 
+async def agenerate_llm_response(prompt, provider=None, api_key=None, model=None, temperature=0.7, use_cache=True,
+                                 raise_errors=False, strategy=None, providers=None, max_tokens=None, usage=None):
+    """
+    asyncio version of generate_llm_response (same parameters and return value).
+
+    In race mode the losing provider calls are cancelled as soon as one answers.
+    """
+    strategy, targets, prompt_tokens, max_tokens, error = _prepare(
+        prompt, provider, api_key, model, strategy, providers, max_tokens)
+    if error:
+        if raise_errors:
+            raise LLMError(error)
+        return error
+
+    cache, cache_key, cached = _cache_lookup(prompt, temperature, strategy, targets, use_cache, max_tokens)
+    if cached is not None:
+        if usage is not None:
+            usage.update(None, prompt_tokens, cached, targets[0].model)
+        return cached
+
+    factories = [partial(_acomplete, target, prompt, temperature, max_tokens, prompt_tokens) for target in targets]
+
+    async def call():
+        if strategy == "race":
+            return (await race_async(factories, timeout=DEFAULT_PROVIDER_TIMEOUT, hedge_delay=DEFAULT_HEDGE_DELAY))[1]
+        if strategy == "fallback":
+            return (await fallback_async(factories, timeout=DEFAULT_PROVIDER_TIMEOUT))[1]
+        try:
+            return await asyncio.wait_for(factories[0](), DEFAULT_PROVIDER_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"{targets[0].backend.name} timed out after {DEFAULT_PROVIDER_TIMEOUT}s")
+
+    try:
+        completion, shared = await flights.do_async(_flight_key(cache_key, targets), call)
     except Exception as e:
-        return f"❌ LLM Error: Unable to generate response. Details: {str(e)}"
+        if raise_errors:
+            raise LLMError(str(e)) from e
+        return _error_message(e)
+
+    if shared:
+        _record_coalesced(completion)
+    else:
+        _record_winner(strategy, completion)
+    if usage is not None:
+        usage.update(completion.usage, prompt_tokens, completion.text, completion.model)
+    if not shared:
+        cache.set(cache_key, completion.text)
+    return completion.text
+
+def stream_llm_response(prompt, provider=None, api_key=None, model=None, temperature=0.7, use_cache=True,
+                        strategy=None, providers=None, max_tokens=None, usage=None):
+    """
+    Stream the response as it is generated.
+
+    Same parameters as generate_llm_response. Yields text deltas only; a
+    failure (also after some deltas were sent) raises LLMError carrying the
+    error message generate_llm_response would return. A cache hit is yielded in one piece, and a completed stream is cached.
+    With several providers (race/fallback) the next one is tried when a
+    provider fails before sending its first token. `usage` is filled once
+    the stream is exhausted.
+    """
+    strategy, targets, prompt_tokens, max_tokens, error = _prepare(
+        prompt, provider, api_key, model, strategy, providers, max_tokens)
+    if error:
+        raise LLMError(error)
+
+    cache, cache_key, cached = _cache_lookup(prompt, temperature, strategy, targets, use_cache, max_tokens)
+    if cached is not None:
+        if usage is not None:
+            usage.update(None, prompt_tokens, cached, targets[0].model)
+        yield cached
+        return
+
+    for attempt, target in enumerate(targets):
+        name = target.backend.name
+        parts = []
+        provider_usage = None
+        started = time.perf_counter()
+        try:
+            # The concurrency slot is held until the stream ends (or the client goes away)
+            with quotas.provider_call(name, target.api_key, prompt_tokens + max_tokens) as reservation:
+                for delta, chunk_usage in target.backend.stream(_messages(prompt), target.model, temperature,
+                                                                max_tokens, target.api_key):
+                    provider_usage = chunk_usage or provider_usage
+                    if delta:
+                        parts.append(delta)
+                        yield delta
+                reservation.settle(_used_tokens(provider_usage, prompt_tokens))
+        except Exception as e:
+            record_llm(name, target.model, time.perf_counter() - started, status="error")
+            if parts or attempt == len(targets) - 1:
+                raise LLMError(_error_message(e)) from e
+            continue
+
+        record_llm(name, target.model, time.perf_counter() - started, provider_usage)
+        text = "".join(parts).strip()
+        if usage is not None:
+            usage.update(provider_usage, prompt_tokens, text, target.model)
+        if text:
+            cache.set(cache_key, text)
+        return
@@ -0,0 +1,429 @@
+# Request instrumentation: per-phase timings (DB, LLM, templates), Server-Timing, Prometheus /metrics, slow-request profiles
+import contextvars
+import hmac
+import os
+import random
+import re
+import threading
+import time
+
+from .state_dir import APP_STATE_DIR, private_dir
+
+# Default values from environment (fallback)
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "0") == "1"
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")  # empty = /metrics answers loopback clients only
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_SLOW_MS = float(os.getenv("PROFILE_SLOW_MS", "1000"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(APP_STATE_DIR, "profiles"))
+PROFILE_ENGINE = os.getenv("PROFILE_ENGINE", "cprofile").lower()  # cprofile | pyinstrument
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "200"))
+
+METRIC_PREFIX = "notes_app_"
+LOOPBACK_ADDRESSES = ("127.0.0.1", "::1")
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Server-Timing descriptions for each phase
+PHASES = {"db": "DB queries", "llm": "LLM provider", "tpl": "Template render"}
+
+
+class RequestTimings:
+    """Per-request accumulator: (count, seconds) per phase and LLM token usage."""
+
+    __slots__ = ("started", "phases", "tokens", "template_started")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = {}
+        self.tokens = {"prompt": 0, "completion": 0}
+        self.template_started = []
+
+    def add(self, phase, seconds, count=1):
+        current = self.phases.get(phase, (0, 0.0))
+        self.phases[phase] = (current[0] + count, current[1] + seconds)
+
+    def server_timing(self, total):
+        parts = []
+        for phase, (count, seconds) in self.phases.items():
+            desc = PHASES.get(phase, phase)
+            if phase == "db":
+                desc = f"{count} queries"
+            elif phase == "llm" and any(self.tokens.values()):
+                desc = f"{self.tokens['prompt']}+{self.tokens['completion']} tokens"
+            parts.append(f'{phase};dur={seconds * 1000:.1f};desc="{desc}"')
+        parts.append(f"total;dur={total * 1000:.1f}")
+        return ", ".join(parts)
+
+
+_current = contextvars.ContextVar("request_timings", default=None)
+
+
+def current_timings():
+    """The RequestTimings of the request being handled by this thread, or None."""
+    return _current.get()
+
+
+def _labels_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(key):
+    if not key:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in key) + "}"
+
+
+def _metric_name(*parts):
+    return re.sub(r"[^a-zA-Z0-9_]", "_", "_".join(str(p) for p in parts if p))
+
+
+class MetricsRegistry:
+    """
+    In-process counters and histograms rendered in the Prometheus text format.
+
+    No prometheus_client dependency; each worker process exposes its own
+    numbers (scrape every worker, or aggregate in Prometheus). Collectors are
+    callables returning a (possibly nested) dict of numbers, exported as
+    gauges at scrape time (cache stats, rate limiter buckets, ...).
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._counters = {}  # name -> {labels_key: value}
+        self._histograms = {}  # name -> {labels_key: [bucket counts..., sum, count]}
+        self._help = {}
+        self._collectors = {}
+
+    def inc(self, name, value=1, help=None, **labels):
+        key = _labels_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+            if help:
+                self._help.setdefault(name, help)
+
+    def observe(self, name, value, help=None, **labels):
+        key = _labels_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            row = series.get(key)
+            if row is None:
+                row = series[key] = [0] * len(DURATION_BUCKETS) + [0.0, 0]
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if value <= bound:
+                    row[i] += 1
+            row[-2] += value
+            row[-1] += 1
+            if help:
+                self._help.setdefault(name, help)
+
+    def register_collector(self, name, collect):
+        self._collectors[name] = collect
+
+    def counter_value(self, name, **labels):
+        return self._counters.get(name, {}).get(_labels_key(labels), 0)
+
+    def _flatten(self, prefix, values, out):
+        for key, value in (values or {}).items():
+            if isinstance(value, dict):
+                self._flatten(f"{prefix}_{key}", value, out)
+            elif isinstance(value, bool):
+                out[_metric_name(prefix, key)] = int(value)
+            elif isinstance(value, (int, float)):
+                out[_metric_name(prefix, key)] = value
+
+    def render(self):
+        lines = []
+        with self._lock:
+            counters = {name: dict(series) for name, series in self._counters.items()}
+            histograms = {name: {k: list(v) for k, v in series.items()} for name, series in self._histograms.items()}
+
+        for name, series in sorted(counters.items()):
+            full = METRIC_PREFIX + name
+            if name in self._help:
+                lines.append(f"# HELP {full} {self._help[name]}")
+            lines.append(f"# TYPE {full} counter")
+            for key, value in sorted(series.items()):
+                lines.append(f"{full}{_format_labels(key)} {value}")
+
+        for name, series in sorted(histograms.items()):
+            full = METRIC_PREFIX + name
+            if name in self._help:
+                lines.append(f"# HELP {full} {self._help[name]}")
+            lines.append(f"# TYPE {full} histogram")
+            for key, row in sorted(series.items()):
+                for bound, count in zip(DURATION_BUCKETS, row):
+                    lines.append(f"{full}_bucket{_format_labels(key + (('le', str(bound)),))} {count}")
+                lines.append(f"{full}_bucket{_format_labels(key + (('le', '+Inf'),))} {row[-1]}")
+                lines.append(f"{full}_sum{_format_labels(key)} {row[-2]:.6f}")
+                lines.append(f"{full}_count{_format_labels(key)} {row[-1]}")
+
+        for collector_name, collect in sorted(self._collectors.items()):
+            gauges = {}
+            try:
+                self._flatten(collector_name, collect(), gauges)
+            except Exception:
+                continue
+            for name, value in sorted(gauges.items()):
+                lines.append(f"# TYPE {METRIC_PREFIX}{name} gauge")
+                lines.append(f"{METRIC_PREFIX}{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+
+def record_phase(phase, seconds, count=1):
+    """Add time spent in `phase` to the current request (no-op outside a request)."""
+    timings = _current.get()
+    if timings is not None:
+        timings.add(phase, seconds, count)
+
+
+def record_llm(provider, model, seconds, usage=None, status="ok"):
+    """
+    Record one provider call: latency, status and token usage from the SDK
+    response's `usage` object (prompt_tokens / completion_tokens) when present.
+    Called by llm_service; counted outside requests too (background jobs).
+    """
+    if not metrics.enabled:
+        return
+    record_phase("llm", seconds)
+    metrics.inc("llm_requests_total", help="LLM provider calls", provider=provider, model=model, status=status)
+    metrics.observe("llm_request_duration_seconds", seconds, help="LLM provider call latency", provider=provider)
+    if usage is None:
+        return
+    timings = _current.get()
+    for kind in ("prompt", "completion"):
+        tokens = getattr(usage, f"{kind}_tokens", None) or 0
+        if tokens:
+            metrics.inc("llm_tokens_total", tokens, help="Tokens used", provider=provider, kind=kind)
+            if timings is not None:
+                timings.tokens[kind] += tokens
+
+
+class _Profiler:
+    """cProfile or pyinstrument (when installed and PROFILE_ENGINE=pyinstrument) around one request."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        if engine == "pyinstrument":
+            from pyinstrument import Profiler
+            self._profiler = Profiler()
+        else:
+            import cProfile
+            self._profiler = cProfile.Profile()
+
+    def start(self):
+        if self.engine == "pyinstrument":
+            self._profiler.start()
+        else:
+            self._profiler.enable()
+
+    def stop(self):
+        if self.engine == "pyinstrument":
+            self._profiler.stop()
+        else:
+            self._profiler.disable()
+
+    def dump(self, path):
+        if self.engine == "pyinstrument":
+            path += ".html"
+            with open(path, "w", encoding="utf-8") as file:
+                file.write(self._profiler.output_html())
+        else:
+            path += ".prof"
+            self._profiler.dump_stats(path)
+        return path
+
+
+class Instrumentation:
+    """
+    Flask request hooks + SQLAlchemy engine events + template signals.
+
+    Every response gets a Server-Timing header (db / llm / tpl / total);
+    request, query, LLM and template numbers are aggregated into the
+    MetricsRegistry served at /metrics. A `sample_rate` fraction of requests
+    runs under a profiler, and the profile is written to `profile_dir` (a
+    private directory, see state_dir) when the request took at least `slow_ms`.
+
+    /metrics requires `Authorization: Bearer <token>`; without a token it is
+    only served to clients connecting from the same host (e.g. a local
+    Prometheus agent). Behind a proxy on the same host that means the proxy
+    must not forward /metrics.
+    """
+
+    def __init__(self, registry=metrics, sample_rate=PROFILE_SAMPLE_RATE, slow_ms=PROFILE_SLOW_MS,
+                 profile_dir=PROFILE_DIR, profile_engine=PROFILE_ENGINE, token=METRICS_TOKEN):
+        self.registry = registry
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+        self.profile_dir = profile_dir
+        self.profile_engine = profile_engine
+        self.token = token
+        self.profiles_written = 0
+
+    def init_app(self, app, engine):
+        from flask import before_render_template, template_rendered
+
+        self.registry.enabled = True
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+        before_render_template.connect(self._template_started, app)
+        template_rendered.connect(self._template_done, app)
+        self.instrument_engine(engine)
+        app.add_url_rule("/metrics", "metrics", self._metrics_view)
+        app.extensions["metrics"] = self
+        return self
+
+    def instrument_engine(self, engine):
+        from sqlalchemy import event
+
+        registry = self.registry
+
+        @event.listens_for(engine, "before_cursor_execute")
+        def _query_started(conn, cursor, statement, parameters, context, executemany):
+            conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+        @event.listens_for(engine, "after_cursor_execute")
+        def _query_done(conn, cursor, statement, parameters, context, executemany):
+            started = conn.info.get("query_started")
+            if not started:
+                return
+            seconds = time.perf_counter() - started.pop()
+            record_phase("db", seconds)
+            registry.inc("db_queries_total", help="SQL statements executed")
+            registry.inc("db_query_seconds_total", seconds, help="Time spent in SQL statements")
+
+    # --- template signals ---
+    def _template_started(self, sender, template, context, **extra):
+        timings = _current.get()
+        if timings is not None:
+            timings.template_started.append(time.perf_counter())
+
+    def _template_done(self, sender, template, context, **extra):
+        timings = _current.get()
+        if timings is None or not timings.template_started:
+            return
+        seconds = time.perf_counter() - timings.template_started.pop()
+        timings.add("tpl", seconds)
+        self.registry.inc("template_render_seconds_total", seconds, help="Time spent rendering templates",
+                          template=template.name or "?")
+
+    # --- request hooks ---
+    def _before_request(self):
+        from flask import g
+
+        g._metrics_token = _current.set(RequestTimings())
+        g._metrics_profiler = None
+        if self.sample_rate and random.random() < self.sample_rate:
+            try:
+                profiler = _Profiler(self.profile_engine)
+                profiler.start()
+                g._metrics_profiler = profiler
+            except Exception:
+                # pyinstrument missing, or another profiler is already active in this process
+                g._metrics_profiler = None
+
+    def _after_request(self, response):
+        from flask import g, request
+
+        timings = _current.get()
+        if timings is None:
+            return response
+        total = time.perf_counter() - timings.started
+        endpoint = request.endpoint or "unmatched"
+        response.headers["Server-Timing"] = timings.server_timing(total)
+        self.registry.inc("requests_total", help="HTTP requests", endpoint=endpoint,
+                          method=request.method, status=response.status_code)
+        self.registry.observe("request_duration_seconds", total, help="Request latency (until the response "
+                              "is returned; streamed bodies excluded)", endpoint=endpoint)
+
+        profiler = getattr(g, "_metrics_profiler", None)
+        if profiler is not None:
+            g._metrics_profiler = None
+            profiler.stop()
+            if total * 1000 >= self.slow_ms:
+                self._write_profile(profiler, endpoint, total)
+        return response
+
+    def _teardown_request(self, exc):
+        from flask import g
+
+        profiler = getattr(g, "_metrics_profiler", None)
+        if profiler is not None:
+            profiler.stop()
+        token = g.pop("_metrics_token", None)
+        if token is not None:
+            _current.reset(token)
+
+    def _write_profile(self, profiler, endpoint, total):
+        private_dir(self.profile_dir)
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{_metric_name(endpoint)}-{total * 1000:.0f}ms-{os.getpid()}"
+        try:
+            profiler.dump(os.path.join(self.profile_dir, name))
+            self.profiles_written += 1
+            self.registry.inc("profiles_written_total", help="Slow-request profiles written", endpoint=endpoint)
+        except OSError:
+            return
+        # Keep the directory bounded: drop the oldest profiles
+        files = sorted(os.scandir(self.profile_dir), key=lambda e: e.stat().st_mtime)
+        for entry in files[:max(0, len(files) - PROFILE_MAX_FILES)]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+    def _metrics_view(self):
+        from flask import Response, abort, request
+
+        if self.token:
+            supplied = request.headers.get("Authorization", "").removeprefix("Bearer ").strip()
+            if not hmac.compare_digest(supplied, self.token):
+                abort(401)
+        elif request.remote_addr not in LOOPBACK_ADDRESSES:
+            abort(403)
+        return Response(self.registry.render(), mimetype="text/plain; version=0.0.4; charset=utf-8")
+
+
+def _default_collectors(registry):
+    from .auth_service import password_hasher, user_cache
+    from .cache_service import get_response_cache
+    from .client_registry import client_registry
+    from .compression_service import note_codec
+    from .rate_limit_service import quotas
+    from .reference_service import saved_prompts
+    from .semantic_cache import semantic_cache
+    from .singleflight import flights
+    from .template_service import fragment_cache
+
+    registry.register_collector("llm_cache", lambda: get_response_cache().stats())
+    registry.register_collector("llm_clients", client_registry.stats)
+    registry.register_collector("semantic_cache", semantic_cache.stats)
+    registry.register_collector("singleflight", flights.stats)
+    registry.register_collector("rate_limits", quotas.stats)
+    registry.register_collector("password_hashing", password_hasher.stats)
+    registry.register_collector("user_cache", user_cache.stats)
+    registry.register_collector("saved_prompts", saved_prompts.stats)
+    registry.register_collector("template_fragments", fragment_cache.stats)
+    registry.register_collector("note_compression", note_codec.stats)
+
+
+def init_metrics(app, db, enabled=None):
+    """
+    Turn on instrumentation for `app` when METRICS_ENABLED=1 (or enabled=True).
+
+    Returns the Instrumentation, or None when disabled (no hooks are installed,
+    so there is no per-request overhead).
+    """
+    if not (METRICS_ENABLED if enabled is None else enabled):
+        return None
+    _default_collectors(metrics)
+    with app.app_context():
+        engine = db.engine
+    return Instrumentation().init_app(app, engine)
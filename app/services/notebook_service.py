@@ -0,0 +1,54 @@
+# Notebook listing: keyset pagination with eager-loaded topic/subtopic
+from sqlalchemy import and_, or_, select
+from sqlalchemy.orm import selectinload
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+def list_notes(session, Note, notebook_id, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """
+    One page of a notebook's notes, newest first, ordered by (created_at, id).
+
+    The cursor is the id of the last note on the previous page. It is resolved
+    to that note's created_at inside the query, so the comparison always uses
+    the stored value and the page costs one indexed range scan plus two
+    selectin loads (topics, subtopics), however deep the user has paged.
+
+    Returns:
+        tuple: (notes, next_cursor) - next_cursor is None on the last page
+    """
+    limit = max(1, min(int(limit or DEFAULT_PAGE_SIZE), MAX_PAGE_SIZE))
+    query = (
+        select(Note)
+        .where(Note.notebook_id == notebook_id)
+        .options(selectinload(Note.topic), selectinload(Note.subtopic))
+        .order_by(Note.created_at.desc(), Note.id.desc())
+        .limit(limit + 1)
+    )
+    if cursor:
+        cursor_id = int(cursor)
+        cursor_created = select(Note.created_at).where(Note.id == cursor_id).scalar_subquery()
+        query = query.where(or_(
+            Note.created_at < cursor_created,
+            and_(Note.created_at == cursor_created, Note.id < cursor_id),
+            # The cursor note was deleted meanwhile: fall back to id order
+            and_(cursor_created.is_(None), Note.id < cursor_id),
+        ))
+
+    notes = session.execute(query).scalars().all()
+    next_cursor = str(notes[limit - 1].id) if len(notes) > limit else None
+    return notes[:limit], next_cursor
+
+
+def note_to_dict(note):
+    return {
+        "id": note.id,
+        "content": note.content,
+        "note_type": note.note_type,
+        "topic": note.topic.name if note.topic else None,
+        "subtopic": note.subtopic.name if note.subtopic else None,
+        "created_at": note.created_at.isoformat() if note.created_at else None,
+        "prompt_tokens": note.prompt_tokens,
+        "completion_tokens": note.completion_tokens,
+    }
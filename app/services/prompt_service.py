@@ -1,10 +1,141 @@
+import glob
 import os
+import re
+import threading
+import time
+
+from .token_service import DEFAULT_MAX_TOKENS
 
 # Dynamically resolve the path to `prompts/templates/`
 TEMPLATE_DIR = os.path.abspath(
     os.path.join(os.path.dirname(__file__), "..", "prompts", "templates")
 )
 
+# How often (seconds) the registry stats the template directory for changes
+RELOAD_INTERVAL = float(os.getenv("PROMPT_RELOAD_INTERVAL", "2"))
+
+# Response length per prompt type when its template doesn't set max_tokens
+PROMPT_MAX_TOKENS = {
+    "word_explanation": int(os.getenv("WORD_EXPLANATION_MAX_TOKENS", "150")),
+    "custom": int(os.getenv("CUSTOM_PROMPT_RESPONSE_MAX_TOKENS", str(DEFAULT_MAX_TOKENS))),
+}
+
+PLACEHOLDER_RE = re.compile(r"\{\{(\w+)\}\}")
+
+# Optional metadata block at the top of a template:
+#   ---
+#   max_tokens: 150
+#   ---
+FRONT_MATTER_RE = re.compile(r"\A---[ \t]*\r?\n(.*?)^---[ \t]*(?:\r?\n|\Z)", re.S | re.M)
+
+
+class PromptTemplate:
+    """
+    A template compiled into (is_placeholder, text) segments.
+
+    Rendering is a single join over the segments instead of one full-string
+    str.replace pass per placeholder. Unknown placeholders are left as-is.
+    A leading `---` block of `key: value` lines is kept as `metadata`
+    (e.g. max_tokens) and is not part of the prompt.
+    """
+
+    __slots__ = ("name", "segments", "mtime", "metadata")
+
+    def __init__(self, name, source, mtime=None):
+        self.name = name
+        self.mtime = mtime
+        self.metadata = {}
+        match = FRONT_MATTER_RE.match(source)
+        if match:
+            for line in match.group(1).splitlines():
+                key, sep, value = line.partition(":")
+                if sep and key.strip():
+                    self.metadata[key.strip().lower()] = value.strip()
+            source = source[match.end():]
+        segments = []
+        pos = 0
+        for match in PLACEHOLDER_RE.finditer(source):
+            if match.start() > pos:
+                segments.append((False, source[pos:match.start()]))
+            segments.append((True, match.group(1)))
+            pos = match.end()
+        if pos < len(source):
+            segments.append((False, source[pos:]))
+        self.segments = tuple(segments)
+
+    @property
+    def max_tokens(self):
+        """Response length cap from the metadata block, or None."""
+        try:
+            return int(self.metadata["max_tokens"])
+        except (KeyError, ValueError):
+            return None
+
+    def render(self, **values):
+        return "".join(
+            values.get(text, "{{%s}}" % text) if is_placeholder else text
+            for is_placeholder, text in self.segments
+        )
+
+
+class TemplateRegistry:
+    """
+    All prompt templates, loaded and compiled once and kept in memory.
+
+    The directory is re-scanned at most every `reload_interval` seconds, and a
+    template is only re-read when its mtime changes (polling, no inotify).
+    """
+
+    def __init__(self, template_dir=TEMPLATE_DIR, reload_interval=RELOAD_INTERVAL):
+        self.template_dir = template_dir
+        self.reload_interval = reload_interval
+        self._templates = {}
+        self._prompt_types = ()
+        self._checked_at = None
+        self._lock = threading.Lock()
+
+    def _refresh(self, force=False):
+        now = time.monotonic()
+        if not force and self._checked_at is not None and now - self._checked_at < self.reload_interval:
+            return
+        with self._lock:
+            if not force and self._checked_at is not None and now - self._checked_at < self.reload_interval:
+                return
+            templates = {}
+            for path in glob.glob(os.path.join(self.template_dir, "*.txt")):
+                name = os.path.splitext(os.path.basename(path))[0]
+                try:
+                    mtime = os.stat(path).st_mtime_ns
+                except OSError:
+                    continue
+                current = self._templates.get(name)
+                if current is not None and current.mtime == mtime:
+                    templates[name] = current
+                    continue
+                with open(path, "r", encoding="utf-8") as file:
+                    templates[name] = PromptTemplate(name, file.read(), mtime)
+            self._templates = templates
+            self._prompt_types = tuple(sorted(templates))
+            self._checked_at = time.monotonic()
+
+    def load(self):
+        """Load and compile every template now (called at startup)."""
+        self._refresh(force=True)
+        return self
+
+    def get(self, prompt_type):
+        self._refresh()
+        return self._templates.get(prompt_type)
+
+    def prompt_types(self):
+        """Sorted list of available prompt types, served from memory."""
+        self._refresh()
+        return list(self._prompt_types)
+
+
+prompt_registry = TemplateRegistry().load()
+
+
 def load_prompt_template(prompt_type, topic, subtopic, user_feedback=""):
     """
     Load the prompt template for a given type and fill in placeholders.
@@ -18,17 +149,27 @@ def load_prompt_template(prompt_type, topic, subtopic, user_feedback=""):
     Returns:
         str: Rendered prompt or error message
     """
-    file_path = os.path.join(TEMPLATE_DIR, f"{prompt_type}.txt")
+    template = prompt_registry.get(prompt_type)
 
-    if not os.path.exists(file_path):
+    if template is None:
+        file_path = os.path.join(TEMPLATE_DIR, f"{prompt_type}.txt")
         return f"❌ Prompt template for '{prompt_type}' not found at {file_path}"
 
-    with open(file_path, "r", encoding="utf-8") as file:
-        template = file.read()
+    return template.render(topic=topic, subtopic=subtopic, user_feedback=user_feedback)
+
+
+def max_tokens_for(prompt_type):
+    """
+    Response token limit for a prompt type.
+
+    Args:
+        prompt_type (str): Template name, or a built-in type such as "custom" or "word_explanation"
 
-    # Replace placeholders safely
-    return (
-        template.replace("{{topic}}", topic)
-                .replace("{{subtopic}}", subtopic)
-                .replace("{{user_feedback}}", user_feedback)
-    )
+    Returns:
+        int: `max_tokens` from the template's metadata block, else the
+        PROMPT_MAX_TOKENS default for the type, else LLM_MAX_TOKENS
+    """
+    template = prompt_registry.get(prompt_type) if prompt_type else None
+    if template is not None and template.max_tokens:
+        return template.max_tokens
+    return PROMPT_MAX_TOKENS.get(prompt_type, DEFAULT_MAX_TOKENS)
@@ -0,0 +1,417 @@
+# Rate limits and concurrency quotas: token buckets per user and per provider key, provider semaphores
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import asynccontextmanager, contextmanager
+from functools import partial
+
+# Default values from environment (fallback)
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "1") not in ("0", "false", "no")
+RATE_LIMIT_PATH = os.getenv("RATE_LIMIT_PATH", "")  # empty = per-process buckets; a file = shared by all workers
+USER_REQUESTS_PER_MINUTE = float(os.getenv("USER_REQUESTS_PER_MINUTE", "20"))
+USER_TOKENS_PER_MINUTE = float(os.getenv("USER_TOKENS_PER_MINUTE", "40000"))
+PROVIDER_REQUESTS_PER_MINUTE = float(os.getenv("PROVIDER_REQUESTS_PER_MINUTE", "500"))
+PROVIDER_TOKENS_PER_MINUTE = float(os.getenv("PROVIDER_TOKENS_PER_MINUTE", "200000"))
+PROVIDER_CONCURRENCY = int(os.getenv("PROVIDER_CONCURRENCY", "8"))
+USER_LIMIT_MODE = os.getenv("USER_LIMIT_MODE", "reject").lower()  # reject (429) | wait
+PROVIDER_LIMIT_MODE = os.getenv("PROVIDER_LIMIT_MODE", "wait").lower()  # wait (queue) | reject
+RATE_LIMIT_WAIT_TIMEOUT = float(os.getenv("RATE_LIMIT_WAIT_TIMEOUT", "30"))
+
+# A concurrency slot whose holder died is reclaimed after this many seconds at the latest
+SLOT_LEASE_SECONDS = 600
+# Buckets hold one minute's worth, so one left alone this long is full again: same as no bucket
+BUCKET_REFILL_SECONDS = 60
+# Full buckets are dropped at most this often (seconds), from take()
+BUCKET_SWEEP_INTERVAL = 60
+
+
+class RateLimited(Exception):
+    """A quota is exhausted; `retry_after` is how long until it has room again (seconds)."""
+
+    def __init__(self, scope, retry_after):
+        super().__init__(f"Rate limit reached ({scope}). Try again in {max(1, round(retry_after))}s.")
+        self.scope = scope
+        self.retry_after = retry_after
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+
+# ------------------------
+# Bucket stores
+# ------------------------
+class MemoryBucketStore:
+    """
+    Token buckets in this process: `take` refills by elapsed time, then takes `amount` if it's there.
+
+    Bucket names come from user ids and submitted API keys, so buckets that
+    have refilled are dropped periodically rather than kept forever.
+    """
+
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._swept_at = time.monotonic()
+
+    def _sweep(self, now):
+        """Drop buckets idle long enough to be full (lock held)."""
+        if now - self._swept_at < BUCKET_SWEEP_INTERVAL:
+            return
+        self._swept_at = now
+        for key in [key for key, (_, updated) in self._buckets.items() if now - updated >= BUCKET_REFILL_SECONDS]:
+            del self._buckets[key]
+
+    def take(self, key, amount, per_minute):
+        """0.0 if `amount` was taken, else the seconds until it will be available (nothing is taken)."""
+        rate, capacity = per_minute / 60.0, per_minute
+        amount = min(amount, capacity)
+        now = time.monotonic()
+        with self._lock:
+            self._sweep(now)
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            if tokens >= amount:
+                self._buckets[key] = (tokens - amount, now)
+                return 0.0
+            self._buckets[key] = (tokens, now)
+            return (amount - tokens) / rate
+
+    def give(self, key, amount, per_minute):
+        with self._lock:
+            if key in self._buckets:
+                tokens, updated = self._buckets[key]
+                self._buckets[key] = (min(per_minute, tokens + amount), updated)
+
+    def snapshot(self):
+        with self._lock:
+            return {key: tokens for key, (tokens, _) in self._buckets.items()}
+
+
+class SQLiteBucketStore:
+    """The same buckets in a SQLite file, so every worker process on the host shares them."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._swept_at = time.monotonic()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS rate_buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL,"
+            " updated_at REAL NOT NULL) WITHOUT ROWID"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS rate_slots (name TEXT NOT NULL, holder TEXT PRIMARY KEY,"
+            " pid INTEGER NOT NULL, acquired_at REAL NOT NULL)"
+        )
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def take(self, key, amount, per_minute):
+        rate, capacity = per_minute / 60.0, per_minute
+        amount = min(amount, capacity)
+        now = time.time()
+        with self._transaction() as conn:
+            if time.monotonic() - self._swept_at >= BUCKET_SWEEP_INTERVAL:
+                self._swept_at = time.monotonic()
+                conn.execute("DELETE FROM rate_buckets WHERE updated_at <= ?", (now - BUCKET_REFILL_SECONDS,))
+            row = conn.execute("SELECT tokens, updated_at FROM rate_buckets WHERE key = ?", (key,)).fetchone()
+            tokens = capacity if row is None else min(capacity, row[0] + max(0.0, now - row[1]) * rate)
+            wait = 0.0 if tokens >= amount else (amount - tokens) / rate
+            conn.execute("INSERT OR REPLACE INTO rate_buckets (key, tokens, updated_at) VALUES (?, ?, ?)",
+                         (key, tokens - amount if not wait else tokens, now))
+        return wait
+
+    def give(self, key, amount, per_minute):
+        self._conn().execute("UPDATE rate_buckets SET tokens = MIN(?, tokens + ?) WHERE key = ?",
+                             (per_minute, amount, key))
+
+    def snapshot(self):
+        return dict(self._conn().execute("SELECT key, tokens FROM rate_buckets").fetchall())
+
+    # Concurrency slots (rows) shared by the workers
+    def try_acquire_slot(self, name, limit):
+        holder = uuid.uuid4().hex
+        now = time.time()
+        with self._transaction() as conn:
+            for other, pid, acquired_at in conn.execute(
+                "SELECT holder, pid, acquired_at FROM rate_slots WHERE name = ?", (name,)
+            ).fetchall():
+                if now - acquired_at > SLOT_LEASE_SECONDS or not _pid_alive(pid):
+                    conn.execute("DELETE FROM rate_slots WHERE holder = ?", (other,))
+            in_use = conn.execute("SELECT COUNT(*) FROM rate_slots WHERE name = ?", (name,)).fetchone()[0]
+            if in_use >= limit:
+                return None
+            conn.execute("INSERT INTO rate_slots (name, holder, pid, acquired_at) VALUES (?, ?, ?, ?)",
+                         (name, holder, os.getpid(), now))
+        return holder
+
+    def release_slot(self, holder):
+        self._conn().execute("DELETE FROM rate_slots WHERE holder = ?", (holder,))
+
+    def slots_in_use(self):
+        return dict(self._conn().execute("SELECT name, COUNT(*) FROM rate_slots GROUP BY name").fetchall())
+
+
+class MemorySlots:
+    """Per-provider concurrency slots in this process (one BoundedSemaphore each)."""
+
+    def __init__(self):
+        self._semaphores = {}
+        self._in_use = {}
+        self._lock = threading.Lock()
+
+    def _semaphore(self, name, limit):
+        with self._lock:
+            if name not in self._semaphores:
+                self._semaphores[name] = threading.BoundedSemaphore(limit)
+                self._in_use[name] = 0
+            return self._semaphores[name]
+
+    def try_acquire_slot(self, name, limit):
+        if not self._semaphore(name, limit).acquire(blocking=False):
+            return None
+        with self._lock:
+            self._in_use[name] += 1
+        return name
+
+    def release_slot(self, holder):
+        with self._lock:
+            self._in_use[holder] -= 1
+        self._semaphores[holder].release()
+
+    def slots_in_use(self):
+        with self._lock:
+            return dict(self._in_use)
+
+
+# ------------------------
+# Quotas
+# ------------------------
+class Reservation:
+    """Tokens held against a tokens/minute bucket until the real usage is known; `settle` refunds the rest."""
+
+    def __init__(self, quotas, key, reserved, per_minute):
+        self.quotas = quotas
+        self.key = key
+        self.reserved = reserved
+        self.per_minute = per_minute
+        self.settled = False
+
+    def settle(self, used):
+        """Refund the reserved tokens beyond `used`; with used=None (unknown) the whole reservation is kept."""
+        if self.settled or self.key is None or used is None:
+            self.settled = True
+            return
+        self.settled = True
+        unused = self.reserved - used
+        if unused > 0:
+            self.quotas.store.give(self.key, unused, self.per_minute)
+
+
+class Quotas:
+    """
+    Request and token budgets for users and for the shared provider keys.
+
+    Users get USER_REQUESTS_PER_MINUTE / USER_TOKENS_PER_MINUTE; each
+    provider key gets PROVIDER_REQUESTS_PER_MINUTE / PROVIDER_TOKENS_PER_MINUTE
+    and at most PROVIDER_CONCURRENCY calls in flight per provider. Token
+    buckets are charged the estimated tokens (prompt + max_tokens) up front
+    and refunded what the answer didn't use. In "reject" mode an empty
+    bucket raises RateLimited at once; in "wait" mode the caller queues for
+    up to `wait_timeout` seconds first.
+    """
+
+    def __init__(self, path=RATE_LIMIT_PATH, enabled=RATE_LIMIT_ENABLED,
+                 user_rpm=USER_REQUESTS_PER_MINUTE, user_tpm=USER_TOKENS_PER_MINUTE,
+                 provider_rpm=PROVIDER_REQUESTS_PER_MINUTE, provider_tpm=PROVIDER_TOKENS_PER_MINUTE,
+                 provider_concurrency=PROVIDER_CONCURRENCY, user_mode=USER_LIMIT_MODE,
+                 provider_mode=PROVIDER_LIMIT_MODE, wait_timeout=RATE_LIMIT_WAIT_TIMEOUT):
+        self.enabled = enabled
+        if path:
+            self.store = self.slots = SQLiteBucketStore(path)
+        else:
+            self.store, self.slots = MemoryBucketStore(), MemorySlots()
+        self.user_rpm, self.user_tpm = user_rpm, user_tpm
+        self.provider_rpm, self.provider_tpm = provider_rpm, provider_tpm
+        self.provider_concurrency = provider_concurrency
+        self.user_mode, self.provider_mode = user_mode, provider_mode
+        self.wait_timeout = wait_timeout
+        self.rejected = 0
+        self.waited = 0
+        self.wait_seconds = 0.0
+        self._lock = threading.Lock()
+
+    # ------------------------
+    # Non-blocking attempts: (result, 0) or (None, seconds to wait)
+    # ------------------------
+    def _try_buckets(self, prefix, rpm, tpm, tokens):
+        if rpm > 0:
+            wait = self.store.take(f"{prefix}:requests", 1, rpm)
+            if wait:
+                return None, wait
+        tokens = min(tokens, tpm) if tpm > 0 else 0
+        if tokens:
+            wait = self.store.take(f"{prefix}:tokens", tokens, tpm)
+            if wait:
+                if rpm > 0:
+                    self.store.give(f"{prefix}:requests", 1, rpm)
+                return None, wait
+        return Reservation(self, f"{prefix}:tokens" if tokens else None, tokens, tpm), 0.0
+
+    def _try_provider(self, provider, api_key, tokens):
+        reservation, wait = self._try_buckets(self.provider_key(provider, api_key), self.provider_rpm,
+                                              self.provider_tpm, tokens)
+        if reservation is None:
+            return None, wait
+        holder = self.slots.try_acquire_slot(provider, self.provider_concurrency)
+        if holder is None:
+            # Everything goes back while we wait for a free slot
+            reservation.settle(0)
+            if self.provider_rpm > 0:
+                self.store.give(f"{self.provider_key(provider, api_key)}:requests", 1, self.provider_rpm)
+            return None, 0.02
+        return (reservation, holder), 0.0
+
+    def _give_up(self, mode, wait, deadline):
+        """True (and counted) if the caller must be refused instead of waiting `wait` seconds."""
+        if mode == "wait" and time.monotonic() + wait <= deadline:
+            return False
+        with self._lock:
+            self.rejected += 1
+        return True
+
+    def _count_wait(self, seconds):
+        with self._lock:
+            self.waited += 1
+            self.wait_seconds += seconds
+
+    def _acquire(self, attempt, scope, mode):
+        deadline = time.monotonic() + self.wait_timeout
+        started = time.monotonic()
+        while True:
+            result, wait = attempt()
+            if result is not None:
+                if time.monotonic() - started > 0.001:
+                    self._count_wait(time.monotonic() - started)
+                return result
+            if self._give_up(mode, wait, deadline):
+                raise RateLimited(scope, wait)
+            time.sleep(wait)
+
+    async def _aacquire(self, attempt, scope, mode):
+        deadline = time.monotonic() + self.wait_timeout
+        started = time.monotonic()
+        while True:
+            result, wait = attempt()
+            if result is not None:
+                if time.monotonic() - started > 0.001:
+                    self._count_wait(time.monotonic() - started)
+                return result
+            if self._give_up(mode, wait, deadline):
+                raise RateLimited(scope, wait)
+            await asyncio.sleep(wait)
+
+    # ------------------------
+    # Public API
+    # ------------------------
+    def reserve_user(self, user_id, tokens):
+        """Charge one request and `tokens` estimated tokens to a user; raises RateLimited."""
+        if not self.enabled:
+            return Reservation(self, None, 0, 0)
+        attempt = partial(self._try_buckets, f"user:{user_id}", self.user_rpm, self.user_tpm, tokens)
+        return self._acquire(attempt, "per-user", self.user_mode)
+
+    @staticmethod
+    def provider_key(provider, api_key):
+        """Bucket name for a provider key; the key itself is never stored."""
+        digest = hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()[:12]
+        return f"provider:{provider}:{digest}"
+
+    @contextmanager
+    def provider_call(self, provider, api_key, tokens):
+        """
+        Hold the provider key's request/token budget and a concurrency slot for one call.
+
+        Yields the token Reservation; settle it with the real usage.
+        """
+        if not self.enabled:
+            yield Reservation(self, None, 0, 0)
+            return
+        attempt = partial(self._try_provider, provider, api_key, tokens)
+        reservation, holder = self._acquire(attempt, f"provider {provider}", self.provider_mode)
+        try:
+            yield reservation
+        finally:
+            self.slots.release_slot(holder)
+
+    @asynccontextmanager
+    async def aprovider_call(self, provider, api_key, tokens):
+        """asyncio version of `provider_call`; waits with asyncio.sleep instead of blocking the loop."""
+        if not self.enabled:
+            yield Reservation(self, None, 0, 0)
+            return
+        attempt = partial(self._try_provider, provider, api_key, tokens)
+        reservation, holder = await self._aacquire(attempt, f"provider {provider}", self.provider_mode)
+        try:
+            yield reservation
+        finally:
+            self.slots.release_slot(holder)
+
+    def bucket_summary(self):
+        """
+        Bucket counts per scope and limit, e.g. {"user_tokens": {"active": 12, "exhausted": 1}}.
+
+        Only aggregates: bucket names carry user ids and key digests, which
+        would make one metric per user/key.
+        """
+        summary = {}
+        for key, tokens in self.store.snapshot().items():
+            scope, kind = key.split(":", 1)[0], key.rsplit(":", 1)[-1]
+            counts = summary.setdefault(f"{scope}_{kind}", {"active": 0, "exhausted": 0})
+            counts["active"] += 1
+            if tokens < 1:
+                counts["exhausted"] += 1
+        return summary
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "rejected": self.rejected,
+            "waited": self.waited,
+            "wait_seconds": round(self.wait_seconds, 3),
+            "buckets": self.bucket_summary(),
+            "concurrency": self.slots.slots_in_use(),  # keyed by provider name (a fixed set)
+        }
+
+
+quotas = Quotas()
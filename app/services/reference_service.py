@@ -0,0 +1,213 @@
+# In-process caches of lookup data: the Topic -> Subtopic tree (changes on syllabus import) and users' saved prompts
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from sqlalchemy import event, select
+
+from .state_dir import APP_STATE_DIR, private_parent
+
+# Default values from environment (fallback)
+TOPIC_CACHE_VERSION_FILE = os.getenv("TOPIC_CACHE_VERSION_FILE", os.path.join(APP_STATE_DIR, "topics.version"))
+TOPIC_CACHE_CHECK_INTERVAL = float(os.getenv("TOPIC_CACHE_CHECK_INTERVAL", "2"))
+SAVED_PROMPTS_TTL = float(os.getenv("SAVED_PROMPTS_TTL", "60"))  # seconds; 0 disables the cache
+SAVED_PROMPTS_CACHE_SIZE = int(os.getenv("SAVED_PROMPTS_CACHE_SIZE", "2048"))
+
+TopicRef = namedtuple("TopicRef", "id name")
+SubtopicRef = namedtuple("SubtopicRef", "id name topic_id")
+SavedPrompt = namedtuple("SavedPrompt", "prompt_name prompt_text")
+
+
+class TopicTree:
+    """
+    Immutable snapshot of all topics and subtopics with id and name indexes.
+
+    `etag` is a digest of the content, so every process holding the same
+    data hands out the same ETag.
+    """
+
+    def __init__(self, topics, subtopics, version):
+        self.version = version
+        self.topics = tuple(sorted(topics, key=lambda t: (t.name, t.id)))
+        self._topics_by_id = {t.id: t for t in self.topics}
+        self._topics_by_name = {t.name: t for t in self.topics}
+        self._subtopics_by_id = {}
+        self._subtopics_by_topic = {}
+        self._subtopics_by_name = {}
+        for sub in sorted(subtopics, key=lambda s: (s.name, s.id)):
+            self._subtopics_by_id[sub.id] = sub
+            self._subtopics_by_topic.setdefault(sub.topic_id, []).append(sub)
+            self._subtopics_by_name.setdefault(sub.name, []).append(sub)
+
+        digest = hashlib.sha1()
+        for t in self.topics:
+            digest.update(f"t{t.id}\x1f{t.name}\x1e".encode("utf-8"))
+        for sub in sorted(self._subtopics_by_id.values()):
+            digest.update(f"s{sub.id}\x1f{sub.topic_id}\x1f{sub.name}\x1e".encode("utf-8"))
+        self.etag = digest.hexdigest()[:16]
+
+    def topic(self, topic_id):
+        try:
+            return self._topics_by_id.get(int(topic_id))
+        except (TypeError, ValueError):
+            return None
+
+    def subtopic(self, subtopic_id):
+        try:
+            return self._subtopics_by_id.get(int(subtopic_id))
+        except (TypeError, ValueError):
+            return None
+
+    def subtopics(self, topic_id):
+        return tuple(self._subtopics_by_topic.get(topic_id, ()))
+
+    def topic_named(self, name):
+        return self._topics_by_name.get(name)
+
+    def subtopic_named(self, name, topic_id=None):
+        """Subtopic by name, preferring the one under `topic_id` (names repeat across topics)."""
+        matches = self._subtopics_by_name.get(name, ())
+        for sub in matches:
+            if topic_id is None or sub.topic_id == topic_id:
+                return sub
+        return matches[0] if matches else None
+
+
+def load_topic_tree(session, Topic, Subtopic, version=0):
+    """Read both tables with two plain-row queries (no ORM objects)."""
+    topics = [TopicRef(*row) for row in session.execute(select(Topic.id, Topic.name))]
+    subtopics = [SubtopicRef(*row) for row in session.execute(select(Subtopic.id, Subtopic.name, Subtopic.topic_id))]
+    return TopicTree(topics, subtopics, version)
+
+
+class TopicCache:
+    """
+    Versioned, in-process TopicTree.
+
+    The tree is loaded on first use and served from memory until
+    `invalidate()` is called (after a syllabus import). Invalidation bumps
+    the local version and touches `version_file`; other workers stat that
+    file at most every `check_interval` seconds and reload when its mtime
+    changes. Pass version_file=None for a single-process cache.
+    """
+
+    def __init__(self, version_file=TOPIC_CACHE_VERSION_FILE, check_interval=TOPIC_CACHE_CHECK_INTERVAL):
+        self.version_file = version_file
+        self.check_interval = check_interval
+        self._tree = None
+        self._version = 0
+        self._file_mtime = None
+        self._checked_at = None
+        self._lock = threading.Lock()
+        self.loads = 0
+
+    def _stat_version_file(self):
+        if not self.version_file:
+            return None
+        try:
+            return os.stat(self.version_file).st_mtime_ns
+        except OSError:
+            return None
+
+    def _stale(self):
+        if self._tree is None:
+            return True
+        now = time.monotonic()
+        if self.version_file is None or now - self._checked_at < self.check_interval:
+            return False
+        self._checked_at = now
+        return self._stat_version_file() != self._file_mtime
+
+    def get(self, session, Topic, Subtopic):
+        """The current TopicTree, loading it from the DB only when missing or invalidated."""
+        tree = self._tree
+        if not self._stale():
+            return tree
+        with self._lock:
+            if self._tree is not tree and self._tree is not None:
+                return self._tree  # another thread reloaded meanwhile
+            self._file_mtime = self._stat_version_file()
+            self._checked_at = time.monotonic()
+            self._version += 1
+            self._tree = load_topic_tree(session, Topic, Subtopic, self._version)
+            self.loads += 1
+            return self._tree
+
+    def invalidate(self):
+        """Drop the cached tree here and signal other processes to drop theirs."""
+        with self._lock:
+            self._tree = None
+            if self.version_file:
+                try:
+                    with open(private_parent(self.version_file), "a"):
+                        pass
+                    os.utime(self.version_file)
+                except OSError:
+                    pass
+
+
+class SavedPromptCache:
+    """
+    Each user's saved custom prompts (name and text, in id order), per process.
+
+    The select page lists them on every load. `watch` drops a user's entry
+    when the ORM inserts, updates or deletes one of their prompts; prompts
+    saved by other processes show up after at most `ttl` seconds.
+    """
+
+    def __init__(self, ttl=SAVED_PROMPTS_TTL, max_entries=SAVED_PROMPTS_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # user id -> (prompts, expires_at)
+        self._lock = threading.Lock()
+        self._watched = set()
+        self.hits = self.misses = 0
+
+    def get(self, session, CustomPrompt, user_id):
+        """Tuple of SavedPrompt for `user_id`."""
+        now = time.monotonic()
+        if self.ttl > 0:
+            with self._lock:
+                entry = self._entries.get(user_id)
+                if entry is not None and entry[1] > now:
+                    self._entries.move_to_end(user_id)
+                    self.hits += 1
+                    return entry[0]
+        self.misses += 1
+        prompts = tuple(SavedPrompt(*row) for row in session.execute(
+            select(CustomPrompt.prompt_name, CustomPrompt.prompt_text)
+            .where(CustomPrompt.user_id == user_id)
+            .order_by(CustomPrompt.id)
+        ))
+        if self.ttl > 0:
+            with self._lock:
+                self._entries[user_id] = (prompts, now + self.ttl)
+                self._entries.move_to_end(user_id)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return prompts
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def watch(self, model):
+        """Drop the owner's entry whenever the ORM flushes an insert, update or delete of a prompt."""
+        if model in self._watched:
+            return
+        self._watched.add(model)
+
+        def _drop(mapper, connection, target):
+            self.invalidate(target.user_id)
+
+        for name in ("after_insert", "after_update", "after_delete"):
+            event.listen(model, name, _drop)
+
+    def stats(self):
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+topic_cache = TopicCache()
+saved_prompts = SavedPromptCache()
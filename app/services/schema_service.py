@@ -0,0 +1,54 @@
+# Additive schema sync for databases created with db.create_all() (no migration history)
+from sqlalchemy import inspect
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.schema import CreateColumn
+
+
+def _missing_columns(engine, metadata):
+    inspector = inspect(engine)
+    tables = set(inspector.get_table_names())
+    missing = []
+    for table in metadata.sorted_tables:
+        if table.name not in tables:
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        missing.extend(
+            (table, column) for column in table.columns
+            if column.name not in existing and (column.nullable or column.server_default is not None)
+        )
+    return missing
+
+
+def _has_column(engine, table, column):
+    return any(c["name"] == column.name for c in inspect(engine).get_columns(table.name))
+
+
+def add_missing_columns(engine, metadata):
+    """
+    ALTER TABLE ... ADD COLUMN for model columns missing from existing tables.
+
+    The standalone app creates its tables with create_all(), which never
+    alters a table that already exists. Only nullable columns (or ones with
+    a server default) are added; anything else needs a real migration
+    (see migrations/). Missing tables are left to create_all().
+
+    Every worker runs this at startup, so several may find the same column
+    missing. Each ALTER runs in its own transaction (the database serialises
+    them); a worker whose ALTER fails because another one added the column
+    first treats it as done.
+
+    :return: list of "table.column" names that were added by this call
+    """
+    added = []
+    for table, column in _missing_columns(engine, metadata):
+        ddl = CreateColumn(column).compile(dialect=engine.dialect)
+        try:
+            with engine.begin() as conn:
+                conn.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {ddl}")
+        except DBAPIError:
+            # "duplicate column name" (SQLite) / "already exists" (PostgreSQL): another worker won
+            if _has_column(engine, table, column):
+                continue
+            raise
+        added.append(f"{table.name}.{column.name}")
+    return added
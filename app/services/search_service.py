@@ -0,0 +1,235 @@
+# Full-text search over notes (SQLite FTS5 index, LIKE fallback for other databases)
+import math
+import re
+
+from markupsafe import escape
+from sqlalchemy import inspect, or_, text
+
+from .compression_service import SQL_FUNCTION, as_text, install_sql_functions
+
+FTS_TABLE = "notes_fts"
+DEFAULT_PER_PAGE = 20
+MAX_PER_PAGE = 100
+SNIPPET_WORDS = 16
+
+# Snippet markers; swapped for <mark> after HTML-escaping the snippet
+_OPEN, _CLOSE = "\x02", "\x03"
+
+FTS_SOURCE = "notes_fts_source"
+
+# Topic and subtopic name of the notes row aliased `r`
+_NAMES = ("(SELECT name FROM topics WHERE id = {r}.topic_id)", "(SELECT name FROM subtopics WHERE id = {r}.subtopic_id)")
+
+
+def _index_row(r):
+    return f"{r}.id, note_text({r}.content), {_NAMES[0].format(r=r)}, {_NAMES[1].format(r=r)}"
+
+
+# External-content index: FTS5 keeps only the inverted index and reads the text back through the view
+# (for snippet() and the topic/subtopic columns), so notes aren't stored a second time, uncompressed.
+# Content may be stored compressed (see compression_service); note_text() indexes the text.
+_FTS_SCHEMA = [
+    f"""CREATE VIEW IF NOT EXISTS {FTS_SOURCE} AS
+        SELECT n.id AS id, note_text(n.content) AS content, t.name AS topic, s.name AS subtopic
+        FROM notes n LEFT JOIN topics t ON t.id = n.topic_id LEFT JOIN subtopics s ON s.id = n.subtopic_id""",
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    f" content, topic, subtopic, content = '{FTS_SOURCE}', content_rowid = 'id', tokenize = 'porter unicode61')",
+    # Keep the index in sync with the notes table, whatever writes to it (ORM, bulk inserts, imports).
+    # An external-content index is told what it indexed: 'delete' takes the old values.
+    f"""CREATE TRIGGER IF NOT EXISTS notes_fts_ai AFTER INSERT ON notes BEGIN
+        INSERT INTO {FTS_TABLE} (rowid, content, topic, subtopic) VALUES ({_index_row("new")});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS notes_fts_au AFTER UPDATE OF content, topic_id, subtopic_id ON notes BEGIN
+        INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, content, topic, subtopic) VALUES ('delete', {_index_row("old")});
+        INSERT INTO {FTS_TABLE} (rowid, content, topic, subtopic) VALUES ({_index_row("new")});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS notes_fts_ad AFTER DELETE ON notes BEGIN
+        INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, content, topic, subtopic) VALUES ('delete', {_index_row("old")});
+    END""",
+    # Renaming a topic/subtopic re-indexes its notes (the old name must be deleted from the index)
+    f"""CREATE TRIGGER IF NOT EXISTS notes_fts_topic_au AFTER UPDATE OF name ON topics BEGIN
+        INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, content, topic, subtopic)
+            SELECT 'delete', n.id, note_text(n.content), old.name, {_NAMES[1].format(r="n")}
+            FROM notes n WHERE n.topic_id = old.id;
+        INSERT INTO {FTS_TABLE} (rowid, content, topic, subtopic)
+            SELECT {_index_row("n")} FROM notes n WHERE n.topic_id = new.id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS notes_fts_subtopic_au AFTER UPDATE OF name ON subtopics BEGIN
+        INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, content, topic, subtopic)
+            SELECT 'delete', n.id, note_text(n.content), {_NAMES[0].format(r="n")}, old.name
+            FROM notes n WHERE n.subtopic_id = old.id;
+        INSERT INTO {FTS_TABLE} (rowid, content, topic, subtopic)
+            SELECT {_index_row("n")} FROM notes n WHERE n.subtopic_id = new.id;
+    END""",
+]
+FTS_TRIGGERS = ("notes_fts_ai", "notes_fts_au", "notes_fts_ad", "notes_fts_topic_au", "notes_fts_subtopic_au")
+
+# Engines (by URL) that have a working FTS index
+_fts_engines = set()
+
+
+def _fts5_supported(conn):
+    try:
+        conn.execute(text("CREATE VIRTUAL TABLE IF NOT EXISTS temp._fts5_probe USING fts5(x)"))
+        conn.execute(text("DROP TABLE temp._fts5_probe"))
+        return True
+    except Exception:
+        return False
+
+
+def drop_index(conn):
+    """Drop the FTS table, its source view and the sync triggers."""
+    for name in FTS_TRIGGERS:
+        conn.execute(text(f"DROP TRIGGER IF EXISTS {name}"))
+    conn.execute(text(f"DROP TABLE IF EXISTS {FTS_TABLE}"))
+    conn.execute(text(f"DROP VIEW IF EXISTS {FTS_SOURCE}"))
+
+
+def install_triggers(conn):
+    """
+    Create the FTS table, its source view and the sync triggers.
+
+    An index from an earlier layout (a table holding its own copy of the text,
+    or triggers indexing the raw column) is dropped first. Returns True when
+    that happened, in which case the index should be rebuilt.
+    """
+    row = conn.execute(text(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"), {"name": FTS_TABLE}).first()
+    outdated = row is not None and "content_rowid" not in row[0]
+    if outdated:
+        drop_index(conn)
+    for statement in _FTS_SCHEMA:
+        conn.execute(text(statement))
+    return outdated
+
+
+def init_search(engine):
+    """
+    Create the FTS5 index and its sync triggers, backfilling existing notes.
+
+    Safe to call on every startup. Returns True when FTS is in use, False when
+    searches will use the LIKE fallback (non-SQLite DB, no FTS5, no tables yet).
+    """
+    if engine.dialect.name != "sqlite":
+        return False
+    # note_text() is used by the triggers, the index's source view and the LIKE fallback alike
+    install_sql_functions(engine)
+    if not inspect(engine).has_table("notes"):
+        return False
+    with engine.begin() as conn:
+        if not _fts5_supported(conn):
+            return False
+        outdated = install_triggers(conn)
+        # COUNT(*) on the FTS table would read the view; the docsize table has one row per indexed note
+        indexed = conn.execute(text(f"SELECT COUNT(*) FROM {FTS_TABLE}_docsize")).scalar()
+        total = conn.execute(text("SELECT COUNT(*) FROM notes")).scalar()
+        if outdated or indexed != total:
+            rebuild_index(conn)
+    _fts_engines.add(str(engine.url))
+    return True
+
+
+def rebuild_index(conn):
+    """Re-populate the FTS index from the notes table (through the source view)."""
+    conn.execute(text(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('rebuild')"))
+
+
+def search_enabled(engine):
+    return str(engine.url) in _fts_engines
+
+
+def _terms(query):
+    return [t for t in re.findall(r"\w+", query or "", re.UNICODE) if t]
+
+
+def _fts_query(terms):
+    # Quote every term so user input can't inject FTS syntax; prefix-match the last one
+    quoted = ['"%s"' % t.replace('"', '""') for t in terms]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+
+def _highlight(snippet):
+    return str(escape(snippet)).replace(_OPEN, "<mark>").replace(_CLOSE, "</mark>")
+
+
+def _like_snippet(content, terms, width=80):
+    lowered = content.lower()
+    positions = [lowered.find(t.lower()) for t in terms]
+    positions = [p for p in positions if p >= 0]
+    start = max(0, min(positions) - width) if positions else 0
+    excerpt = content[start:start + 2 * width]
+    prefix = "…" if start > 0 else ""
+    suffix = "…" if start + 2 * width < len(content) else ""
+    html = str(escape(excerpt))
+    for term in terms:
+        html = re.sub("(%s)" % re.escape(str(escape(term))), r"<mark>\1</mark>", html, flags=re.IGNORECASE)
+    return prefix + html + suffix
+
+
+def search_notes(session, notebook_id, query, Note, Topic, Subtopic, page=1, per_page=DEFAULT_PER_PAGE):
+    """
+    Ranked, paginated search over one notebook's notes (content, topic and subtopic names).
+
+    Returns:
+        dict: {"results": [...], "total": int, "page": int, "pages": int, "query": str}
+              Each result has note_id, note_type, topic, subtopic and an HTML-safe snippet.
+    """
+    page = max(1, int(page or 1))
+    per_page = max(1, min(int(per_page or DEFAULT_PER_PAGE), MAX_PER_PAGE))
+    terms = _terms(query)
+    empty = {"results": [], "total": 0, "page": page, "pages": 0, "query": query or ""}
+    if not terms or notebook_id is None:
+        return empty
+
+    offset = (page - 1) * per_page
+    if search_enabled(session.get_bind()):
+        params = {"q": _fts_query(terms), "nb": notebook_id}
+        # The MATCH must run once, FTS first: a plain JOIN lets the planner walk the notebook's
+        # notes through ix_notes_notebook_created and re-run the MATCH for every one of them
+        total = session.execute(text(
+            f"SELECT COUNT(*) FROM notes n WHERE n.notebook_id = :nb"
+            f" AND n.id IN (SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :q)"
+        ), params).scalar()
+        rows = session.execute(text(
+            f"SELECT n.id, n.note_type, {FTS_TABLE}.topic, {FTS_TABLE}.subtopic,"
+            f" snippet({FTS_TABLE}, 0, :open, :close, '…', :words) AS snippet,"
+            f" bm25({FTS_TABLE}, 1.0, 0.5, 0.5) AS score"
+            f" FROM {FTS_TABLE} CROSS JOIN notes n ON n.id = {FTS_TABLE}.rowid"
+            f" WHERE {FTS_TABLE} MATCH :q AND n.notebook_id = :nb"
+            " ORDER BY score LIMIT :limit OFFSET :offset"
+        ), dict(params, open=_OPEN, close=_CLOSE, words=SNIPPET_WORDS, limit=per_page, offset=offset)).all()
+        results = [
+            {"note_id": r.id, "note_type": r.note_type, "topic": r.topic, "subtopic": r.subtopic,
+             "snippet": _highlight(r.snippet), "score": -r.score}
+            for r in rows
+        ]
+    else:
+        content = as_text(Note.content, session.get_bind())
+        q = (
+            session.query(Note, Topic.name, Subtopic.name)
+            .outerjoin(Topic, Note.topic_id == Topic.id)
+            .outerjoin(Subtopic, Note.subtopic_id == Subtopic.id)
+            .filter(Note.notebook_id == notebook_id)
+        )
+        for term in terms:
+            q = q.filter(or_(
+                content.icontains(term, autoescape=True),
+                Topic.name.icontains(term, autoescape=True),
+                Subtopic.name.icontains(term, autoescape=True),
+            ))
+        total = q.count()
+        rows = q.order_by(Note.created_at.desc(), Note.id.desc()).limit(per_page).offset(offset).all()
+        results = [
+            {"note_id": note.id, "note_type": note.note_type, "topic": topic, "subtopic": subtopic,
+             "snippet": _like_snippet(note.content, terms), "score": None}
+            for note, topic, subtopic in rows
+        ]
+
+    return {
+        "results": results,
+        "total": total,
+        "page": page,
+        "pages": math.ceil(total / per_page),
+        "query": query,
+    }
@@ -0,0 +1,409 @@
+# Semantic near-duplicate cache: hashed n-gram embeddings + NumPy (optionally memory-mapped) vector index
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from array import array
+from collections import namedtuple
+
+# Default values from environment (fallback)
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "1") not in ("0", "false", "no")
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.8"))
+SEMANTIC_CACHE_THRESHOLDS = os.getenv("SEMANTIC_CACHE_THRESHOLDS", "")  # "3=0.9,3/17=0.95" (topic[/subtopic] ids)
+SEMANTIC_CACHE_DIM = int(os.getenv("SEMANTIC_CACHE_DIM", "256"))
+SEMANTIC_CACHE_PATH = os.getenv("SEMANTIC_CACHE_PATH", "")  # empty = in memory only
+# Oldest entries are overwritten beyond this; default 10k in memory (per worker), 1M with SEMANTIC_CACHE_PATH
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "0"))
+SEMANTIC_CACHE_REFRESH_INTERVAL = float(os.getenv("SEMANTIC_CACHE_REFRESH_INTERVAL", "2"))
+
+# A lookup whose best score is this close below the threshold counts as a near miss (threshold tuning)
+NEAR_MISS_MARGIN = 0.05
+
+SemanticHit = namedtuple("SemanticHit", "answer score prompt note_id")
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and are as be by can could do for from how i in is it me my of on or please the this "
+    "to what with would you your".split()
+)
+# How a request is phrased rather than what it's about; ignored when comparing subjects (see key_terms)
+INSTRUCTION_WORDS = frozenset(
+    "explain explanation explained describe give tell write show help simple simply term terms detail detailed "
+    "example examples question questions practice quiz summary summarize summarise summarized short brief briefly "
+    "sentence sentences paragraph point points step steps some few one two three four five six seven eight "
+    "nine ten 1 2 3 4 5 6 7 8 9 10 about using like way ways me us more less also again".split()
+)
+
+
+def _stem(word):
+    """Crude suffix folding: "examples"/"example", "simply"/"simple", "studies"/"study" end up equal."""
+    if len(word) <= 4:
+        return word
+    if word.endswith("ies"):
+        word = word[:-3] + "y"
+    elif word.endswith("es") or (word.endswith("s") and not word.endswith("ss")):
+        word = word[:-2] if word.endswith("es") else word[:-1]
+    for suffix in ("ing", "ed"):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 4:
+            word = word[:-len(suffix)]
+            break
+    return word.rstrip("ey") or word
+
+
+_INSTRUCTION_STEMS = frozenset(_stem(w) for w in INSTRUCTION_WORDS)
+
+
+# ------------------------
+# Embedding
+# ------------------------
+class HashingEmbedder:
+    """
+    Prompt -> unit vector without a model: word unigrams, word bigrams and
+    character trigrams hashed (crc32) into `dim` signed buckets.
+
+    Words are lightly stemmed and trigrams make the remaining variants
+    overlap; stopwords are dropped so "explain X in simple terms" and
+    "explain X simply" share most of their weight. Deterministic across
+    processes.
+    """
+
+    WEIGHTS = {"w": 1.0, "b": 0.7, "c": 0.35}
+
+    def __init__(self, dim=SEMANTIC_CACHE_DIM):
+        self.dim = dim
+
+    def features(self, text):
+        words = [_stem(w) for w in _WORD_RE.findall(text.lower()) if w not in STOPWORDS]
+        for word in words:
+            yield "w", word
+            padded = f"<{word}>"
+            for i in range(len(padded) - 2):
+                yield "c", padded[i:i + 3]
+        for first, second in zip(words, words[1:]):
+            yield "b", f"{first} {second}"
+
+    def key_terms(self, text):
+        """What a prompt is about: stemmed words minus stopwords and instruction words ("lists", "tuples")."""
+        return frozenset(
+            stem for stem in (_stem(w) for w in _WORD_RE.findall(text.lower()) if w not in STOPWORDS)
+            if stem not in _INSTRUCTION_STEMS
+        )
+
+    def embed(self, text):
+        import numpy as np
+
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for kind, feature in self.features(text):
+            h = zlib.crc32(f"{kind}:{feature}".encode("utf-8"))
+            vector[h % self.dim] += self.WEIGHTS[kind] if (h >> 31) & 1 else -self.WEIGHTS[kind]
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm else vector
+
+
+# ------------------------
+# Vector index
+# ------------------------
+class VectorIndex:
+    """
+    Float32 matrix of unit vectors, searched by dot product.
+
+    Rows are kept in a NumPy array, or a memory-mapped file when `path` is
+    given (the OS pages it in, and restarts don't re-embed anything). The
+    array is only allocated (and NumPy imported) when the first row is
+    written, so an empty cache costs nothing at startup.
+    Each row belongs to a group; a group's rows are listed separately so a
+    search only scores the candidates of that group. Tracking a row again
+    (a recycled row) moves it to its new group.
+    """
+
+    def __init__(self, dim, path=None, capacity=1024):
+        self.dim = dim
+        self.path = path
+        self._count = 0
+        self._groups = {}
+        self._row_groups = []  # row -> group key (shared tuples), None for untracked rows
+        self._group_keys = {}
+        self._vectors = None
+        self._initial_capacity = capacity
+
+    def _open(self, capacity):
+        import numpy as np
+
+        if self.path is None:
+            grown = np.zeros((capacity, self.dim), dtype=np.float32)
+            if self._vectors is not None:
+                grown[:self._count] = self._vectors[:self._count]
+            self._vectors = grown
+            return
+        row_bytes = self.dim * 4
+        size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        if size < capacity * row_bytes:
+            with open(self.path, "ab") as file:
+                file.truncate(capacity * row_bytes)
+            size = capacity * row_bytes
+        self._vectors = np.memmap(self.path, dtype=np.float32, mode="r+", shape=(size // row_bytes, self.dim))
+
+    @property
+    def capacity(self):
+        return 0 if self._vectors is None else self._vectors.shape[0]
+
+    def __len__(self):
+        return self._count
+
+    def reserve(self, rows):
+        if rows > self.capacity:
+            self.flush()
+            self._open(max(rows, self.capacity * 2, self._initial_capacity))
+
+    def write(self, row, vector):
+        """Store a vector at `row` (rows are assigned by the caller); call `track` to make it searchable."""
+        self.reserve(row + 1)
+        self._vectors[row] = vector
+
+    def track(self, row, group):
+        group = self._group_keys.setdefault(group, group)
+        if row >= len(self._row_groups):
+            self._row_groups.extend([None] * (row + 1 - len(self._row_groups)))
+        old = self._row_groups[row]
+        if old is not None:
+            rows = self._groups[old]
+            rows.remove(row)
+            if not rows:
+                del self._groups[old]
+                del self._group_keys[old]
+        self._row_groups[row] = group
+        self._groups.setdefault(group, array("q")).append(row)
+        self._count = max(self._count, row + 1)
+
+    def add(self, vector, group=None):
+        row = self._count
+        self.write(row, vector)
+        self.track(row, group)
+        return row
+
+    def flush(self):
+        if self.path is not None and self._vectors is not None:
+            self._vectors.flush()
+
+    def search(self, vector, group=None):
+        """Best (row, score) in `group` (all rows when None); (None, 0.0) if it's empty."""
+        import numpy as np
+
+        if group is None:
+            if not self._count:
+                return None, 0.0
+            scores = self._vectors[:self._count] @ vector
+            best = int(np.argmax(scores))
+            return best, float(scores[best])
+        rows = self._groups.get(group)
+        if not rows:
+            return None, 0.0
+        rows = np.frombuffer(rows, dtype=np.int64)
+        if len(rows) * 4 > self._count:
+            # Big group: one sequential pass beats gathering scattered rows
+            scores = (self._vectors[:self._count] @ vector)[rows]
+        else:
+            scores = self._vectors[rows] @ vector
+        best = int(np.argmax(scores))
+        return int(rows[best]), float(scores[best])
+
+
+# ------------------------
+# Cache
+# ------------------------
+def parse_thresholds(spec):
+    """"3=0.9,3/17=0.95" -> {(3, None): 0.9, (3, 17): 0.95}"""
+    thresholds = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        key, _, value = item.partition("=")
+        topic, _, subtopic = key.strip().partition("/")
+        thresholds[(int(topic), int(subtopic) if subtopic else None)] = float(value)
+    return thresholds
+
+
+class SemanticCache:
+    """
+    Answers to earlier prompts, found again by meaning instead of exact text.
+
+    `lookup` embeds the prompt and returns the most similar stored answer
+    for the same topic/subtopic/answer type when its cosine similarity
+    reaches the threshold (SEMANTIC_CACHE_THRESHOLD, overridable per topic
+    or subtopic) and both prompts are about the same thing (same key
+    terms once phrasing words are dropped). With `path` the vectors are memory-mapped from
+    `<path>/vectors.f32` and answers kept in `<path>/entries.db`, shared by
+    all workers on the host; rows other workers add are picked up every
+    SEMANTIC_CACHE_REFRESH_INTERVAL seconds.
+
+    At most `max_entries` answers are kept: the index is a ring, and once it
+    is full each new answer overwrites the oldest one (whose row is deleted
+    from entries.db in file mode).
+    """
+
+    def __init__(self, path=SEMANTIC_CACHE_PATH, dim=SEMANTIC_CACHE_DIM, threshold=SEMANTIC_CACHE_THRESHOLD,
+                 thresholds=SEMANTIC_CACHE_THRESHOLDS, max_entries=SEMANTIC_CACHE_MAX_ENTRIES,
+                 enabled=SEMANTIC_CACHE_ENABLED, refresh_interval=SEMANTIC_CACHE_REFRESH_INTERVAL):
+        self.embedder = HashingEmbedder(dim)
+        self.threshold = threshold
+        self.thresholds = parse_thresholds(thresholds) if isinstance(thresholds, str) else dict(thresholds)
+        self.max_entries = max_entries or (1000000 if path else 10000)
+        self.enabled = enabled
+        self.refresh_interval = refresh_interval
+        self.path = path or None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._entries = []  # in-memory mode: (prompt, answer, note_id) per row
+        self._next_row = 0  # in-memory mode: row the next answer overwrites once full
+        self._rowids = array("q")  # file mode: entries.db rowid held by each index row
+        self._loaded_rowid = 0
+        self._refreshed_at = time.monotonic()
+        self.lookups = self.hits = self.near_misses = self.subject_mismatches = self.stores = self.evicted = 0
+        if self.path:
+            os.makedirs(self.path, exist_ok=True)
+            self._conn().execute(
+                "CREATE TABLE IF NOT EXISTS semantic_cache ("
+                " topic_id INTEGER, subtopic_id INTEGER, answer_type TEXT,"
+                " prompt TEXT NOT NULL, answer TEXT NOT NULL, note_id INTEGER, created_at REAL NOT NULL)"
+            )
+            self.index = VectorIndex(dim, os.path.join(self.path, "vectors.f32"))
+            self._load_new_rows()
+        else:
+            self.index = VectorIndex(dim)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(os.path.join(self.path, "entries.db"), timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _slot(self, rowid):
+        """Index row of an entries.db rowid: rowids wrap around the ring of max_entries rows."""
+        return (rowid - 1) % self.max_entries
+
+    def _load_new_rows(self):
+        """Make rows committed by any process since the last load searchable."""
+        rows = self._conn().execute(
+            "SELECT rowid, topic_id, subtopic_id, answer_type FROM semantic_cache WHERE rowid > ? ORDER BY rowid",
+            (self._loaded_rowid,),
+        ).fetchall()
+        if rows:
+            self.index.reserve(min(rows[-1][0], self.max_entries))
+            for rowid, topic_id, subtopic_id, answer_type in rows:
+                slot = self._slot(rowid)
+                if slot >= len(self._rowids):
+                    self._rowids.extend([0] * (slot + 1 - len(self._rowids)))
+                self._rowids[slot] = rowid
+                self.index.track(slot, (topic_id, subtopic_id, answer_type))
+            self._loaded_rowid = rows[-1][0]
+
+    def _maybe_refresh(self):
+        if not self.path or time.monotonic() - self._refreshed_at < self.refresh_interval:
+            return
+        with self._lock:
+            self._load_new_rows()
+            self._refreshed_at = time.monotonic()
+
+    def threshold_for(self, topic_id, subtopic_id):
+        return self.thresholds.get((topic_id, subtopic_id), self.thresholds.get((topic_id, None), self.threshold))
+
+    def lookup(self, prompt, topic_id, subtopic_id, answer_type="custom"):
+        """SemanticHit for the closest earlier prompt of this group, or None below the threshold."""
+        if not self.enabled or not prompt:
+            return None
+        self._maybe_refresh()
+        vector = self.embedder.embed(prompt)
+        with self._lock:
+            row, score = self.index.search(vector, (topic_id, subtopic_id, answer_type))
+        threshold = self.threshold_for(topic_id, subtopic_id)
+        self.lookups += 1
+        if row is None or score < threshold:
+            if row is not None and score >= threshold - NEAR_MISS_MARGIN:
+                self.near_misses += 1
+            return None
+        if self.path:
+            entry = self._conn().execute(
+                "SELECT prompt, answer, note_id FROM semantic_cache WHERE rowid = ?", (self._rowids[row],)
+            ).fetchone()
+            if entry is None:  # overwritten by another worker since our last refresh
+                return None
+            cached_prompt, answer, note_id = entry
+        else:
+            cached_prompt, answer, note_id = self._entries[row]
+        # Similar wording isn't enough: "lists and sets" scores 0.82 against "lists and tuples"
+        if self.embedder.key_terms(prompt) != self.embedder.key_terms(cached_prompt):
+            self.subject_mismatches += 1
+            return None
+        self.hits += 1
+        return SemanticHit(answer, score, cached_prompt, note_id)
+
+    def store(self, prompt, answer, topic_id, subtopic_id, answer_type="custom", note_id=None):
+        """Remember an answer (overwriting the oldest one when full); returns False when disabled."""
+        if not self.enabled or not prompt or not answer:
+            return False
+        vector = self.embedder.embed(prompt)
+        group = (topic_id, subtopic_id, answer_type)
+        with self._lock:
+            if self.path:
+                conn = self._conn()
+                # The write lock hands out row numbers; the vector is in the file before the row is visible
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    rowid = conn.execute(
+                        "INSERT INTO semantic_cache (topic_id, subtopic_id, answer_type, prompt, answer, note_id,"
+                        " created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        (topic_id, subtopic_id, answer_type, prompt, answer, note_id, time.time()),
+                    ).lastrowid
+                    self.evicted += conn.execute(
+                        "DELETE FROM semantic_cache WHERE rowid <= ?", (rowid - self.max_entries,)
+                    ).rowcount
+                    self.index.write(self._slot(rowid), vector)
+                    self.index.flush()
+                    conn.execute("COMMIT")
+                except Exception:
+                    conn.execute("ROLLBACK")
+                    raise
+                self._load_new_rows()
+            elif len(self._entries) < self.max_entries:
+                self.index.add(vector, group)
+                self._entries.append((prompt, answer, note_id))
+            else:
+                row, self._next_row = self._next_row, (self._next_row + 1) % self.max_entries
+                self.index.write(row, vector)
+                self.index.track(row, group)
+                self._entries[row] = (prompt, answer, note_id)
+                self.evicted += 1
+            self.stores += 1
+        return True
+
+    def clear(self):
+        with self._lock:
+            if self.path:
+                self._conn().execute("DELETE FROM semantic_cache")
+                self.index = VectorIndex(self.index.dim, self.index.path)
+                self._rowids = array("q")
+                self._loaded_rowid = 0
+            else:
+                self.index = VectorIndex(self.index.dim)
+                self._entries = []
+                self._next_row = 0
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "entries": len(self.index),
+            "max_entries": self.max_entries,
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "near_misses": self.near_misses,
+            "subject_mismatches": self.subject_mismatches,
+            "hit_rate": round(self.hits / self.lookups, 4) if self.lookups else 0.0,
+            "stores": self.stores,
+            "evicted": self.evicted,
+            "threshold": self.threshold,
+        }
+
+
+semantic_cache = SemanticCache()
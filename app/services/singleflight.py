@@ -0,0 +1,237 @@
+# Request coalescing: concurrent identical calls share one in-flight execution (threads, asyncio, processes)
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from .state_dir import private_parent
+
+# Default values from environment (fallback)
+SINGLEFLIGHT_ENABLED = os.getenv("SINGLEFLIGHT_ENABLED", "1") not in ("0", "false", "no")
+# SQLite file shared by the workers on the host, e.g. $APP_STATE_DIR/singleflight.db;
+# empty (default) = coalesce within this process only. Its directory is made private (see state_dir).
+SINGLEFLIGHT_PATH = os.getenv("SINGLEFLIGHT_PATH", "")
+SINGLEFLIGHT_TIMEOUT = float(os.getenv("SINGLEFLIGHT_TIMEOUT", "120"))
+SINGLEFLIGHT_POLL_INTERVAL = float(os.getenv("SINGLEFLIGHT_POLL_INTERVAL", "0.05"))
+
+# Finished rows are kept this long (seconds) before being purged
+FINISHED_RETENTION = 60
+
+
+class FlightError(Exception):
+    """The shared call failed in another worker process; the message is its error."""
+
+
+class _Call:
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+
+class SingleFlight:
+    """
+    Run a function once per key while identical calls are in flight.
+
+    Callers that arrive while a call for the same key is running wait for
+    it and receive its result (or its exception) instead of running their
+    own. Only in-flight calls are shared: a call that finished before a
+    caller arrived is never reused (that's the response cache's job).
+
+    Threads coalesce on an Event. With `path`, the first thread of each
+    process also claims the key in a SQLite table shared by the workers on
+    the host: the claimant runs the call and stores the encoded result,
+    the others poll the row. A claim whose process died, or that is older
+    than `timeout`, is taken over.
+    """
+
+    def __init__(self, path=SINGLEFLIGHT_PATH, timeout=SINGLEFLIGHT_TIMEOUT,
+                 poll_interval=SINGLEFLIGHT_POLL_INTERVAL, enabled=SINGLEFLIGHT_ENABLED):
+        self.path = path or None
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.enabled = enabled
+        self._calls = {}
+        self._async_calls = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._finished = 0
+        self.led = self.shared = self.shared_remote = 0
+        if self.path:
+            private_parent(self.path)
+            self._conn().execute(
+                "CREATE TABLE IF NOT EXISTS flights ("
+                " key TEXT PRIMARY KEY, owner TEXT NOT NULL, pid INTEGER NOT NULL, started_at REAL NOT NULL,"
+                " finished_at REAL, result TEXT, error TEXT) WITHOUT ROWID"
+            )
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)  # not world-readable if we create it
+            os.close(fd)
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # ------------------------
+    # Threads
+    # ------------------------
+    def do(self, key, fn, encode=None, decode=None):
+        """
+        fn() once for all concurrent callers with this key; returns (result, shared).
+
+        `encode`/`decode` turn the result into text and back; without them the
+        call is only coalesced within this process.
+        """
+        if not self.enabled:
+            return fn(), False
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            if not call.event.wait(self.timeout):
+                raise TimeoutError(f"Shared call did not finish within {self.timeout}s")
+            self.shared += 1
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            if self.path and encode is not None:
+                call.result, shared = self._do_across_processes(key, fn, encode, decode)
+            else:
+                call.result, shared = fn(), False
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+        if not shared:
+            self.led += 1
+        return call.result, shared
+
+    # ------------------------
+    # Processes
+    # ------------------------
+    def _claim(self, key, token, arrived):
+        """'lead' if this caller now owns the key, (result, error) of a call that finished after it arrived, or None."""
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT pid, started_at, finished_at, result, error FROM flights WHERE key = ?", (key,)
+            ).fetchone()
+            take_over = (
+                row is None
+                or (row[2] is not None and row[2] < arrived)
+                or (row[2] is None and (now - row[1] > self.timeout or not _pid_alive(row[0])))
+            )
+            if take_over:
+                conn.execute(
+                    "INSERT OR REPLACE INTO flights (key, owner, pid, started_at, finished_at, result, error)"
+                    " VALUES (?, ?, ?, ?, NULL, NULL, NULL)",
+                    (key, token, os.getpid(), now),
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        if take_over:
+            return "lead"
+        if row[2] is not None:
+            return row[3], row[4]
+        return None
+
+    def _finish(self, key, token, result, error):
+        conn = self._conn()
+        now = time.time()
+        conn.execute(
+            "UPDATE flights SET finished_at = ?, result = ?, error = ? WHERE key = ? AND owner = ?",
+            (now, result, error, key, token),
+        )
+        self._finished += 1
+        if self._finished % 100 == 0:
+            conn.execute("DELETE FROM flights WHERE finished_at < ?", (now - FINISHED_RETENTION,))
+
+    def _do_across_processes(self, key, fn, encode, decode):
+        token = uuid.uuid4().hex
+        arrived = time.time()
+        deadline = time.monotonic() + self.timeout
+        while True:
+            state = self._claim(key, token, arrived)
+            if state == "lead":
+                break
+            if state is not None:
+                result, error = state
+                self.shared_remote += 1
+                if error is not None:
+                    raise FlightError(error)
+                return decode(result), True
+            if time.monotonic() >= deadline:
+                raise TimeoutError(f"Shared call did not finish within {self.timeout}s")
+            time.sleep(self.poll_interval)
+
+        try:
+            result = fn()
+        except Exception as e:
+            self._finish(key, token, None, str(e) or type(e).__name__)
+            raise
+        self._finish(key, token, encode(result), None)
+        return result, False
+
+    # ------------------------
+    # asyncio
+    # ------------------------
+    async def do_async(self, key, factory):
+        """
+        asyncio version of `do` (within this process): awaits factory() once per key; returns (result, shared).
+
+        The shared task is shielded, so a waiter being cancelled (e.g. a
+        losing race) doesn't cancel it for the others.
+        """
+        if not self.enabled:
+            return await factory(), False
+        loop_key = (id(asyncio.get_running_loop()), key)
+        task = self._async_calls.get(loop_key)
+        if task is not None:
+            self.shared += 1
+            return await asyncio.shield(task), True
+        task = self._async_calls[loop_key] = asyncio.ensure_future(factory())
+        task.add_done_callback(lambda _: self._async_calls.pop(loop_key, None))
+        self.led += 1
+        return await asyncio.shield(task), False
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "cross_process": bool(self.path),
+            "in_flight": len(self._calls) + len(self._async_calls),
+            "led": self.led,
+            "shared": self.shared,
+            "shared_remote": self.shared_remote,
+        }
+
+
+flights = SingleFlight()
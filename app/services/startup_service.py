@@ -0,0 +1,89 @@
+# Worker startup: setup phase timings, import-time breakdown and cache warm-up hooks
+import os
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+# Default values from environment (fallback)
+WARM_UP_ON_START = os.getenv("WARM_UP_ON_START", "0") in ("1", "true", "yes")
+
+
+class StartupReport:
+    """
+    What a worker did before it could serve: named setup phases and warm-up steps.
+
+    Phases are timed with `phase(...)` around the app's setup code; warm-up
+    steps are registered with `warmup(name)` and run by `run_warmups()` (the
+    `flask warm-up` command, or at import with WARM_UP_ON_START=1).
+    """
+
+    def __init__(self):
+        self.phases = []  # (name, seconds)
+        self._warmups = []  # (name, fn)
+        self.warmed = []  # (name, seconds, error or None)
+
+    @contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, time.perf_counter() - started))
+
+    def warmup(self, name):
+        """Decorator: run `fn()` when the worker warms up."""
+        def register(fn):
+            self._warmups.append((name, fn))
+            return fn
+        return register
+
+    def run_warmups(self):
+        """Run every warm-up step; a failing step is recorded and the rest still run."""
+        self.warmed = []
+        for name, fn in self._warmups:
+            started = time.perf_counter()
+            try:
+                fn()
+                error = None
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+            self.warmed.append((name, time.perf_counter() - started, error))
+        return self.warmed
+
+
+def import_times(statement, cwd=None, env=None):
+    """
+    Import cost of `statement` ("import app_debug") in a fresh interpreter, via `python -X importtime`.
+
+    :return: list of (module, self_seconds, cumulative_seconds, depth), in import order
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        cwd=cwd, env=env, capture_output=True, text=True,
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or line.endswith("| imported package"):
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        depth = (len(name) - len(name.lstrip(" ")) - 1) // 2
+        rows.append((name.strip(), int(self_us) / 1e6, int(cumulative_us) / 1e6, depth))
+    if result.returncode != 0 and not rows:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "import failed")
+    return rows
+
+
+def import_breakdown(rows, top=15):
+    """Self time summed per top-level package, most expensive first: [(package, seconds, modules)]."""
+    totals = defaultdict(lambda: [0.0, 0])
+    for name, self_seconds, _, _ in rows:
+        package = name.split(".", 1)[0]
+        totals[package][0] += self_seconds
+        totals[package][1] += 1
+    ranked = sorted(totals.items(), key=lambda item: item[1][0], reverse=True)
+    return [(package, seconds, count) for package, (seconds, count) in ranked[:top]]
+
+
+startup = StartupReport()
@@ -0,0 +1,37 @@
+# Private per-user directory for host-local files shared by the workers (history, export artifacts, profiles, ...)
+import getpass
+import os
+import stat
+import tempfile
+
+# Default values from environment (fallback)
+APP_STATE_DIR = os.getenv("APP_STATE_DIR", os.path.join(tempfile.gettempdir(), f"notes_app-{getpass.getuser()}"))
+
+
+def private_dir(path=APP_STATE_DIR):
+    """
+    Create `path` (mode 0700) if needed and return it.
+
+    Generated answers and exports must not be readable by other local users,
+    so an existing directory of ours with looser permissions is tightened,
+    and one owned by another user (e.g. created in advance in a shared /tmp)
+    is refused rather than written into.
+
+    :param path: Directory to create/check
+    :return: `path`
+    :raises PermissionError: The directory belongs to another user
+    """
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    if hasattr(os, "getuid"):  # POSIX only
+        info = os.stat(path)
+        if info.st_uid != os.getuid():
+            raise PermissionError(f"{path} is owned by another user; set APP_STATE_DIR to a directory of your own")
+        if stat.S_IMODE(info.st_mode) & 0o077:
+            os.chmod(path, 0o700)
+    return path
+
+
+def private_parent(path):
+    """private_dir() for the directory holding the file `path`; returns `path`."""
+    private_dir(os.path.dirname(os.path.abspath(path)))
+    return path
@@ -0,0 +1,132 @@
+# Template rendering: on-disk bytecode cache for compiled templates and a {% cache %} fragment cache tag
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+from jinja2 import FileSystemBytecodeCache, nodes
+from jinja2.ext import Extension
+
+# Default values from environment (fallback)
+TEMPLATE_BYTECODE_CACHE = os.getenv("TEMPLATE_BYTECODE_CACHE", "1") not in ("0", "false", "no")
+TEMPLATE_BYTECODE_CACHE_DIR = os.getenv("TEMPLATE_BYTECODE_CACHE_DIR", "")  # empty = Jinja's private per-user temp dir
+FRAGMENT_CACHE_ENABLED = os.getenv("FRAGMENT_CACHE_ENABLED", "1") not in ("0", "false", "no")
+FRAGMENT_CACHE_MAX_BYTES = int(float(os.getenv("FRAGMENT_CACHE_MAX_MB", "64")) * 1024 * 1024)
+
+
+class FragmentCache:
+    """
+    Rendered template fragments by key, per process, least recently used out first.
+
+    Keys are tuples built in the template from whatever the fragment depends
+    on (e.g. a note's id and updated_at), so a changed row simply stops
+    being asked for and ages out; nothing has to be invalidated. Size is
+    bounded by the total length of the cached text (`max_bytes`, roughly).
+    """
+
+    def __init__(self, max_bytes=FRAGMENT_CACHE_MAX_BYTES, enabled=FRAGMENT_CACHE_ENABLED):
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self._fragments = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            value = self._fragments.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._fragments.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        size = sys.getsizeof(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._fragments.pop(key, None)
+            if old is not None:
+                self._size -= sys.getsizeof(old)
+            self._fragments[key] = value
+            self._size += size
+            while self._size > self.max_bytes:
+                _, evicted = self._fragments.popitem(last=False)
+                self._size -= sys.getsizeof(evicted)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._fragments.clear()
+            self._size = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "fragments": len(self._fragments),
+            "bytes": self._size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+        }
+
+
+class FragmentCacheExtension(Extension):
+    """
+    `{% cache "note-card", note.id, note.updated_at %}...{% endcache %}`
+
+    The body is rendered once per distinct key and then served from the
+    environment's `fragment_cache`. Put everything the body depends on in
+    the key; with the cache disabled the body is rendered every time.
+    """
+
+    tags = {"cache"}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(fragment_cache=FragmentCache(enabled=False))
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        parts = [parser.parse_expression()]
+        while parser.stream.skip_if("comma"):
+            parts.append(parser.parse_expression())
+        body = parser.parse_statements(("name:endcache",), drop_needle=True)
+        return nodes.CallBlock(self.call_method("_render", [nodes.Tuple(parts, "load")]), [], [], body).set_lineno(lineno)
+
+    def _render(self, key, caller):
+        cache = self.environment.fragment_cache
+        if not cache.enabled:
+            return caller()
+        value = cache.get(key)
+        if value is None:
+            value = caller()
+            cache.set(key, value)
+        return value
+
+
+fragment_cache = FragmentCache()
+
+
+def init_templates(app, bytecode_cache=TEMPLATE_BYTECODE_CACHE, bytecode_cache_dir=TEMPLATE_BYTECODE_CACHE_DIR,
+                   fragments=None):
+    """
+    Install the bytecode cache and the {% cache %} tag on `app`'s Jinja environment.
+
+    Compiled templates are written to disk once and loaded by every later
+    worker instead of being parsed and compiled again. Without a directory,
+    Jinja uses a private per-user one under the temp dir (a shared,
+    writable directory would let another user plant bytecode).
+    """
+    env = app.jinja_env
+    if bytecode_cache:
+        if bytecode_cache_dir:
+            os.makedirs(bytecode_cache_dir, mode=0o700, exist_ok=True)
+        env.bytecode_cache = FileSystemBytecodeCache(bytecode_cache_dir or None)
+    env.add_extension(FragmentCacheExtension)
+    env.fragment_cache = fragment_cache if fragments is None else fragments
+    return env
@@ -0,0 +1,181 @@
+# Local token counting (tiktoken when installed, heuristic otherwise) and prompt/response budgets
+import math
+import os
+import re
+import threading
+
+# Default values from environment (fallback)
+TOKEN_COUNTER = os.getenv("TOKEN_COUNTER", "auto").lower()  # auto | tiktoken | heuristic
+DEFAULT_MAX_TOKENS = int(os.getenv("LLM_MAX_TOKENS", "1200"))
+DEFAULT_CONTEXT_WINDOW = int(os.getenv("LLM_CONTEXT_WINDOW", "8192"))
+CUSTOM_PROMPT_MAX_TOKENS = int(os.getenv("CUSTOM_PROMPT_MAX_TOKENS", "400"))
+CUSTOM_PROMPT_OVERFLOW = os.getenv("CUSTOM_PROMPT_OVERFLOW", "truncate").lower()  # truncate | reject
+
+# Context window per model family (prefix match); anything else uses LLM_CONTEXT_WINDOW
+CONTEXT_WINDOWS = {
+    "gpt-4o": 128000,
+    "gpt-4-turbo": 128000,
+    "gpt-4.1": 1000000,
+    "gpt-4-32k": 32768,
+    "gpt-4": 8192,
+    "gpt-3.5-turbo": 16385,
+    "llama-3.3-70b": 131072,
+    "llama-3.1-8b": 131072,
+    "mixtral-8x7b": 32768,
+}
+
+# Per-message framing the chat APIs add on top of the content
+MESSAGE_OVERHEAD = 4
+REPLY_PRIMER = 3
+
+_WORD_RE = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+
+
+class PromptTooLong(ValueError):
+    """A prompt exceeds its token limit and CUSTOM_PROMPT_OVERFLOW=reject (or can't fit the context window)."""
+
+
+class TokenUsage:
+    """
+    Prompt/completion token counts for one answer.
+
+    Filled from the provider's `usage` object when it reports one, otherwise
+    estimated locally (`estimated` is then True), e.g. for cache hits.
+    """
+
+    __slots__ = ("prompt_tokens", "completion_tokens", "estimated")
+
+    def __init__(self):
+        self.prompt_tokens = None
+        self.completion_tokens = None
+        self.estimated = False
+
+    def update(self, usage=None, prompt_tokens=None, completion_text=None, model=None):
+        provider_prompt = getattr(usage, "prompt_tokens", None) if usage is not None else None
+        provider_completion = getattr(usage, "completion_tokens", None) if usage is not None else None
+        self.estimated = provider_prompt is None or provider_completion is None
+        self.prompt_tokens = provider_prompt if provider_prompt is not None else prompt_tokens
+        if provider_completion is not None:
+            self.completion_tokens = provider_completion
+        elif completion_text is not None:
+            self.completion_tokens = count_tokens(completion_text, model)
+        return self
+
+    def as_dict(self):
+        return {"prompt_tokens": self.prompt_tokens, "completion_tokens": self.completion_tokens}
+
+
+# ------------------------
+# Counting
+# ------------------------
+_encoders = {}
+_encoders_lock = threading.Lock()
+
+
+def _encoder(model):
+    """tiktoken encoding for `model` (cached), or None when tiktoken isn't available/selected."""
+    if TOKEN_COUNTER == "heuristic":
+        return None
+    key = model or ""
+    if key in _encoders:
+        return _encoders[key]
+    with _encoders_lock:
+        if key not in _encoders:
+            try:
+                import tiktoken
+                try:
+                    encoder = tiktoken.encoding_for_model(model) if model else tiktoken.get_encoding("cl100k_base")
+                except KeyError:
+                    # Non-OpenAI models (Llama, Mixtral): cl100k is a close enough approximation
+                    encoder = tiktoken.get_encoding("cl100k_base")
+            except ImportError:
+                if TOKEN_COUNTER == "tiktoken":
+                    raise
+                encoder = None
+            _encoders[key] = encoder
+    return _encoders[key]
+
+
+def estimate_tokens(text):
+    """
+    Heuristic count used without tiktoken: about one token per word or
+    punctuation mark, and at least one per four characters (long words,
+    numbers and non-Latin scripts split into several tokens).
+    """
+    if not text:
+        return 0
+    return max(len(_WORD_RE.findall(text)), math.ceil(len(text) / 4))
+
+
+def count_tokens(text, model=None):
+    if not text:
+        return 0
+    encoder = _encoder(model)
+    if encoder is None:
+        return estimate_tokens(text)
+    return len(encoder.encode(text, disallowed_special=()))
+
+
+def count_message_tokens(messages, model=None):
+    """Tokens a chat request's messages take up, including per-message framing."""
+    return sum(MESSAGE_OVERHEAD + count_tokens(m["content"], model) for m in messages) + REPLY_PRIMER
+
+
+def truncate_tokens(text, limit, model=None):
+    """The longest prefix of `text` within `limit` tokens (cut on a word boundary without tiktoken)."""
+    if count_tokens(text, model) <= limit:
+        return text
+    encoder = _encoder(model)
+    if encoder is not None:
+        return encoder.decode(encoder.encode(text, disallowed_special=())[:limit]).rstrip()
+    # Binary search on the character length, then back off to the last space
+    low, high = 0, len(text)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if estimate_tokens(text[:mid]) <= limit:
+            low = mid
+        else:
+            high = mid - 1
+    cut = text[:low]
+    space = cut.rfind(" ")
+    return (cut[:space] if space > low // 2 else cut).rstrip()
+
+
+# ------------------------
+# Budgets
+# ------------------------
+def context_window(model):
+    model = (model or "").lower()
+    for prefix in sorted(CONTEXT_WINDOWS, key=len, reverse=True):
+        if model.startswith(prefix):
+            return CONTEXT_WINDOWS[prefix]
+    return DEFAULT_CONTEXT_WINDOW
+
+
+def budget_max_tokens(prompt_tokens, max_tokens, model):
+    """
+    max_tokens clamped to what is left of the model's context window.
+
+    Raises PromptTooLong when the prompt leaves no room for an answer.
+    """
+    available = context_window(model) - prompt_tokens
+    if available <= 0:
+        raise PromptTooLong(
+            f"Prompt is {prompt_tokens} tokens; the {model} context window is {context_window(model)}."
+        )
+    return min(max_tokens, available)
+
+
+def fit_custom_prompt(text, limit=CUSTOM_PROMPT_MAX_TOKENS, overflow=CUSTOM_PROMPT_OVERFLOW, model=None):
+    """
+    Enforce the custom-prompt limit.
+
+    Returns (text, truncated). With overflow="reject" an oversized prompt
+    raises PromptTooLong instead of being cut to `limit` tokens.
+    """
+    tokens = count_tokens(text, model)
+    if tokens <= limit:
+        return text, False
+    if overflow == "reject":
+        raise PromptTooLong(f"Custom prompt is {tokens} tokens; the limit is {limit}.")
+    return truncate_tokens(text, limit, model), True
@@ -0,0 +1,33 @@
+# Shared helpers for the benchmark scripts
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app")
+if APP_DIR not in sys.path:
+    sys.path.insert(0, APP_DIR)
+
+
+def make_app(db_path):
+    """Minimal Flask app bound to the app's models and a SQLite file at `db_path`."""
+    from flask import Flask
+    from models import db
+
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{db_path}"
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+@contextmanager
+def timer(label, results=None):
+    started = time.perf_counter()
+    yield
+    elapsed = time.perf_counter() - started
+    if results is not None:
+        results[label] = elapsed
+    print(f"{label:<40} {elapsed * 1000:10.1f} ms")
@@ -0,0 +1,412 @@
+# Benchmark / load test: the whole student flow through the real app (test client and a threaded WSGI server), fake LLM
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import re
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from http.cookiejar import CookieJar
+from urllib.error import HTTPError
+from urllib.parse import urlencode
+from urllib.request import HTTPCookieProcessor, HTTPRedirectHandler, Request, build_opener
+
+from _support import APP_DIR
+
+ROOT = os.path.dirname(os.path.abspath(APP_DIR))
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+STEPS = ("register", "login", "select", "subtopics", "generate", "save", "notebook", "download_txt", "download_pdf")
+PASSWORD = "correct horse battery"
+# Used when the checkout has no prompts/templates (they're not part of the repo)
+BENCH_TEMPLATES = {
+    "explanation": "Explain {{subtopic}} ({{topic}}) step by step with one worked example.",
+    "summary": "Summarise the key points of {{subtopic}} in {{topic}} for revision.",
+    "interview": "Write five interview questions with answers about {{subtopic}} ({{topic}}).",
+}
+# Server-Timing from services/metrics_service.py: db;dur=1.2;desc="3 queries"
+_QUERIES = re.compile(r'db;dur=[\d.]+;desc="(\d+) queries"')
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))] if values else 0.0
+
+
+def configure(args, tmp):
+    """Environment for app_debug; set before it's imported, since services read their defaults at import."""
+    os.environ.update({
+        "APP_DEBUG_DATABASE_URL": f"sqlite:///{os.path.join(tmp, 'flow.db')}",
+        "METRICS_ENABLED": "1",  # Server-Timing carries each request's query count
+        "RESPONSE_HISTORY_PATH": os.path.join(tmp, "history.db"),
+        "EXPORT_ARTIFACT_DIR": os.path.join(tmp, "exports"),
+        "WARM_UP_ON_START": "0",
+        # Per-user limits would turn a load test into a test of the limiter (429s)
+        "RATE_LIMIT_ENABLED": "1" if args.rate_limits else "0",
+        # Without caches every generate reaches the provider
+        "LLM_CACHE_ENABLED": "1" if args.caches else "0",
+        "SEMANTIC_CACHE_ENABLED": "1" if args.caches else "0",
+    })
+
+
+def build_app(args, tmp):
+    """The standalone app on a fresh database, seeded with a syllabus; returns (app, catalog of (topic, subtopic) ids)."""
+    import app_debug
+    from app_debug import app, db
+    from models import Subtopic, Topic
+    from services.llm_backends import FakeBackend, register_backend
+    from services.prompt_service import prompt_registry
+
+    # The form only offers openai/groq: the fake takes the openai slot, so generate_llm_response calls it.
+    # No jitter or failures, so a run is deterministic apart from scheduling.
+    register_backend(FakeBackend(name="openai", latency=args.llm_latency, tokens_per_sec=args.llm_tokens_per_sec,
+                                 answer_tokens=args.answer_tokens, fail_rate=0.0, jitter=0.0))
+    with app.app_context():
+        db.create_all()
+        app_debug.init_search(db.engine)
+        for t in range(args.topics):
+            topic = Topic(name=f"Topic {t}")
+            db.session.add(topic)
+            db.session.flush()
+            db.session.add_all(Subtopic(name=f"Subtopic {t}.{s}", topic_id=topic.id) for s in range(args.subtopics))
+        db.session.commit()
+        catalog = [(s.topic_id, s.id) for s in Subtopic.query.order_by(Subtopic.id)]
+    if not prompt_registry.prompt_types():
+        template_dir = os.path.join(tmp, "prompts")
+        os.makedirs(template_dir)
+        for name, template in BENCH_TEMPLATES.items():
+            with open(os.path.join(template_dir, f"{name}.txt"), "w", encoding="utf-8") as f:
+                f.write(template)
+        prompt_registry.template_dir = template_dir
+        prompt_registry.load()
+    return app, catalog, prompt_registry.prompt_types()
+
+
+# ------------------------
+# Clients
+# ------------------------
+class TestClientSession:
+    """One user's requests through Flask's test client, in the calling thread."""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, data=None):
+        response = self.client.open(path, method=method, data=data)
+        size = len(response.get_data())  # drains streamed bodies
+        return response.status_code, response.headers.get("Server-Timing", ""), size
+
+
+class _NoRedirect(HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class HTTPSession:
+    """One user's requests over HTTP, with its own cookie jar; redirects are reported, not followed."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.opener = build_opener(HTTPCookieProcessor(CookieJar()), _NoRedirect)
+
+    def request(self, method, path, data=None):
+        body = urlencode(data).encode("utf-8") if data is not None else None
+        try:
+            with self.opener.open(Request(self.base_url + path, data=body, method=method), timeout=120) as response:
+                return response.status, response.headers.get("Server-Timing", ""), len(response.read())
+        except HTTPError as e:  # 3xx (not followed), 4xx, 5xx
+            return e.code, e.headers.get("Server-Timing", ""), len(e.read())
+
+
+# ------------------------
+# Load
+# ------------------------
+class Recorder:
+    """Samples per step: (seconds, ok, queries, bytes)."""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.failures = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def step(self, name, session, method, path, data=None, expect=200):
+        started = time.perf_counter()
+        status, timing, size = session.request(method, path, data)
+        seconds = time.perf_counter() - started
+        match = _QUERIES.search(timing)
+        with self._lock:
+            self.samples[name].append((seconds, status == expect, int(match.group(1)) if match else 0, size))
+            if status != expect:
+                self.failures[f"{name}: HTTP {status}"] += 1
+        return status
+
+
+def student(recorder, session, user, args, catalog, prompt_types):
+    """register -> login -> N x (select, subtopics, generate, save, notebook) -> txt and PDF downloads."""
+    rng = random.Random(user)
+    email = f"{user}@bench.test"
+    recorder.step("register", session, "POST", "/register", {"email": email, "password": PASSWORD}, expect=302)
+    if recorder.step("login", session, "POST", "/login", {"email": email, "password": PASSWORD}, expect=302) != 302:
+        return
+    for i in range(args.iterations):
+        topic_id, subtopic_id = rng.choice(catalog)
+        recorder.step("select", session, "GET", "/select")
+        recorder.step("subtopics", session, "GET", f"/api/subtopics/{topic_id}")
+        recorder.step("generate", session, "POST", "/generate", {
+            "topic_id": topic_id, "subtopic_id": subtopic_id, "prompt_type": rng.choice(prompt_types),
+            "llm_provider": "openai", "llm_api_key": "",
+        })
+        note = f"Note {i} by {user} on subtopic {subtopic_id}. " + "Key idea, worked example and summary. " * 20
+        recorder.step("save", session, "POST", "/save", {"note": note}, expect=302)
+        recorder.step("notebook", session, "GET", "/notebook")
+    recorder.step("download_txt", session, "GET", "/download/txt")
+    recorder.step("download_pdf", session, "GET", "/download/pdf")
+
+
+def _rss_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024  # Linux reports KiB
+
+
+class RSSSampler(threading.Thread):
+    """Peak resident memory of this process (app + load generator) while a run is in progress."""
+
+    def __init__(self, interval=0.05):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.peak = _rss_bytes()
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.wait(self.interval):
+            self.peak = max(self.peak, _rss_bytes())
+
+    def stop(self):
+        self._done.set()
+        self.join()
+        return max(self.peak, _rss_bytes())
+
+
+def run_mode(mode, app, args, catalog, prompt_types):
+    recorder = Recorder()
+    server = None
+    if mode == "server":
+        from werkzeug.serving import make_server
+
+        logging.getLogger("werkzeug").setLevel(logging.ERROR)  # no access log line per request
+        server = make_server("127.0.0.1", 0, app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = f"http://127.0.0.1:{server.server_port}"
+        new_session = lambda: HTTPSession(base_url)  # noqa: E731
+    else:
+        new_session = lambda: TestClientSession(app)  # noqa: E731
+
+    start = threading.Barrier(args.users)
+    errors = []
+
+    def user(index):
+        session = new_session()
+        start.wait()
+        try:
+            student(recorder, session, f"{mode}{index}", args, catalog, prompt_types)
+        except Exception as e:
+            errors.append(f"{type(e).__name__}: {e}")
+
+    sampler = RSSSampler()
+    sampler.start()
+    threads = [threading.Thread(target=user, args=(i,)) for i in range(args.users)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    peak_rss = sampler.stop()
+    if server is not None:
+        server.shutdown()
+    return summarize(recorder, elapsed, peak_rss, errors)
+
+
+def summarize(recorder, elapsed, peak_rss, errors):
+    steps = {}
+    for name in STEPS:
+        samples = recorder.samples.get(name)
+        if not samples:
+            continue
+        latencies = [s[0] * 1000 for s in samples]
+        queries = [s[2] for s in samples]
+        steps[name] = {
+            "count": len(samples),
+            "errors": sum(1 for s in samples if not s[1]),
+            "p50_ms": round(percentile(latencies, 50), 2),
+            "p95_ms": round(percentile(latencies, 95), 2),
+            "p99_ms": round(percentile(latencies, 99), 2),
+            "queries_mean": round(sum(queries) / len(queries), 2),
+            "queries_max": max(queries),
+            "bytes_mean": round(sum(s[3] for s in samples) / len(samples)),
+        }
+    requests = sum(step["count"] for step in steps.values())
+    return {
+        "seconds": round(elapsed, 3),
+        "requests": requests,
+        "throughput_rps": round(requests / elapsed, 2) if elapsed else 0.0,
+        "errors": sum(step["errors"] for step in steps.values()),
+        "failures": dict(recorder.failures),
+        "exceptions": errors,
+        "peak_rss_mb": round(peak_rss / 2 ** 20, 1),
+        "steps": steps,
+    }
+
+
+# ------------------------
+# Results
+# ------------------------
+def git_commit():
+    def git(*cmd):
+        return subprocess.run(["git", *cmd], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    return git("rev-parse", "--short", "HEAD") or "unknown", bool(git("status", "--porcelain", "--untracked-files=no"))
+
+
+def print_results(results):
+    config = results["config"]
+    print(f"commit {results['commit']}{' (dirty)' if results['dirty'] else ''}: {config['users']} users x "
+          f"{config['iterations']} iterations, fake LLM {config['llm_latency'] * 1000:.0f} ms + "
+          f"{config['llm_tokens_per_sec'] or 'instant'} tokens/s")
+    for mode, run in results["modes"].items():
+        print(f"\n[{mode}] {run['requests']} requests in {run['seconds']:.1f}s = {run['throughput_rps']:.1f} req/s, "
+              f"{run['errors']} errors, peak RSS {run['peak_rss_mb']:.0f} MB")
+        print(f"{'step':<14} {'count':>6} {'errors':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'queries':>8} {'bytes':>8}")
+        for name, step in run["steps"].items():
+            print(f"{name:<14} {step['count']:6d} {step['errors']:7d} {step['p50_ms']:8.1f} {step['p95_ms']:8.1f} "
+                  f"{step['p99_ms']:8.1f} {step['queries_mean']:8.1f} {step['bytes_mean']:8d}")
+        for failure, count in run["failures"].items():
+            print(f"  {count} x {failure}")
+        for error in run["exceptions"]:
+            print(f"  {error}")
+    print(f"\npeak RSS over the whole run: {results['peak_rss_mb']:.0f} MB")
+
+
+def compare(current, baseline, threshold, min_delta_ms):
+    """
+    Print per-step changes against `baseline`; returns the list of regressions.
+
+    A step regresses when its p50 or p95 grows by more than `threshold` percent
+    and `min_delta_ms` (a millisecond step is noisy in relative terms), or when
+    it runs at least half a query more per request on average.
+    """
+    regressions = []
+    print(f"\ncompared with {baseline['commit']} ({baseline['created_at']}), regression threshold {threshold:.0f}%")
+    changed = {key: (value, current["config"].get(key)) for key, value in baseline["config"].items()
+               if current["config"].get(key) != value}
+    if changed:
+        print("  warning: runs used different settings: "
+              + ", ".join(f"{key} {old} -> {new}" for key, (old, new) in changed.items()))
+    print(f"{'mode/step':<22} {'p50 ms':>16} {'p95 ms':>16} {'p99 ms':>16} {'queries':>12}")
+    for mode, run in current["modes"].items():
+        old_run = baseline["modes"].get(mode)
+        if not old_run:
+            continue
+        rows = [("throughput", run, old_run)] + [
+            (name, step, old_run["steps"][name]) for name, step in run["steps"].items() if name in old_run["steps"]
+        ]
+        for name, new, old in rows:
+            if name == "throughput":
+                change = (new["throughput_rps"] - old["throughput_rps"]) / old["throughput_rps"] * 100
+                print(f"{mode + '/' + name:<22} {old['throughput_rps']:7.1f} -> {new['throughput_rps']:.1f} req/s ({change:+.0f}%)")
+                if change < -threshold:
+                    regressions.append(f"{mode} throughput {change:+.0f}%")
+                continue
+            cells = []
+            for key in ("p50_ms", "p95_ms", "p99_ms"):
+                change = (new[key] - old[key]) / old[key] * 100 if old[key] else 0.0
+                cells.append(f"{old[key]:6.1f}>{new[key]:<6.1f}{change:+4.0f}%")
+                # p99 of a short run is a handful of samples: only p50/p95 count as regressions
+                if key != "p99_ms" and change > threshold and new[key] - old[key] > min_delta_ms:
+                    regressions.append(f"{mode}/{name} {key} {old[key]:.1f} -> {new[key]:.1f} ms ({change:+.0f}%)")
+            cells.append(f"{old['queries_mean']:5.1f}>{new['queries_mean']:<5.1f}")
+            if new["queries_mean"] >= old["queries_mean"] + 0.5:
+                regressions.append(f"{mode}/{name} queries {old['queries_mean']} -> {new['queries_mean']}")
+            print(f"{mode + '/' + name:<22} " + " ".join(f"{c:>16}" for c in cells))
+    for regression in regressions:
+        print(f"  regression: {regression}")
+    return regressions
+
+
+def run(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        configure(args, tmp)
+        app, catalog, prompt_types = build_app(args, tmp)
+        modes = {}
+        for mode in ("client", "server") if args.mode == "both" else (args.mode,):
+            modes[mode] = run_mode(mode, app, args, catalog, prompt_types)
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KiB on Linux
+    commit, dirty = git_commit()
+    return {
+        "benchmark": "app_flow",
+        "commit": commit,
+        "dirty": dirty,
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "config": {key: getattr(args, key) for key in ("users", "iterations", "topics", "subtopics", "llm_latency",
+                                                        "llm_tokens_per_sec", "answer_tokens", "caches", "rate_limits")},
+        "peak_rss_mb": round(peak_rss, 1),
+        "modes": modes,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test of the full flow (register to PDF download) with a fake "
+                                                 "LLM; results are saved as JSON and can be compared across commits")
+    parser.add_argument("--mode", choices=("client", "server", "both"), default="both",
+                        help="Flask test client in-process, a threaded WSGI server over HTTP, or both")
+    parser.add_argument("--users", type=int, default=8, help="Concurrent simulated students.")
+    parser.add_argument("--iterations", type=int, default=5, help="select -> generate -> save rounds per student.")
+    parser.add_argument("--topics", type=int, default=10)
+    parser.add_argument("--subtopics", type=int, default=20, help="Subtopics per topic.")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="Fake provider time to first token (s).")
+    parser.add_argument("--llm-tokens-per-sec", type=float, default=400, help="Fake provider token rate (0 = instant).")
+    parser.add_argument("--answer-tokens", type=int, default=300, help="Fake answer length in tokens.")
+    parser.add_argument("--caches", action="store_true", help="Keep the LLM response and semantic caches on.")
+    parser.add_argument("--rate-limits", action="store_true", help="Keep per-user/provider rate limits on.")
+    parser.add_argument("--output", help="Results file (default: benchmarks/results/app_flow-<commit>.json).")
+    parser.add_argument("--results", help="Don't run: load these results instead (to compare two saved runs).")
+    parser.add_argument("--compare", metavar="BASELINE", help="Results file to compare against.")
+    parser.add_argument("--threshold", type=float, default=20.0, help="%% slower p50/p95 (or fewer req/s) that counts as a regression.")
+    parser.add_argument("--min-delta-ms", type=float, default=2.0, help="Smallest p50/p95 increase that counts.")
+    parser.add_argument("--fail-on-regression", action="store_true", help="Exit with status 1 on any regression.")
+    args = parser.parse_args()
+
+    if args.results:
+        with open(args.results) as f:
+            results = json.load(f)
+    else:
+        results = run(args)
+        output = args.output or os.path.join(RESULTS_DIR, f"app_flow-{results['commit']}.json")
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, "w") as f:
+            json.dump(results, f, indent=2)
+    print_results(results)
+    if not args.results:
+        print(f"results written to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.threshold, args.min_delta_ms)
+        if regressions and args.fail_on_regression:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+# Benchmark: worker cold start (fresh interpreter -> app ready -> first response), checked against a time budget
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from _support import APP_DIR
+
+ROOT = os.path.dirname(os.path.abspath(APP_DIR))
+
+# Each entry point runs in a fresh interpreter and prints JSON timings (seconds from its first import)
+ENTRY_POINTS = {
+    "app_debug": (APP_DIR, """
+import time
+t0 = time.perf_counter()
+import app_debug
+ready = time.perf_counter()
+app_debug.app.test_client().get('/login')
+first = time.perf_counter()
+"""),
+    "create_app": (ROOT, """
+import time
+t0 = time.perf_counter()
+from app import create_app
+app = create_app()
+ready = time.perf_counter()
+app.test_client().get('/')
+first = time.perf_counter()
+"""),
+}
+REPORT = """
+import json, sys
+print(json.dumps({"ready": ready - t0, "first": first - t0, "modules": len(sys.modules),
+                  "heavy": sorted(m for m in %r if m in sys.modules)}))
+"""
+HEAVY = ("numpy", "pandas", "fpdf", "docx", "openpyxl", "openai", "groq", "httpx", "alembic", "flask_migrate",
+         "multiprocessing", "tiktoken", "zstandard")
+
+
+def cold_start(entry, env):
+    cwd, code = ENTRY_POINTS[entry]
+    out = subprocess.run([sys.executable, "-c", code + REPORT % (HEAVY,)], cwd=cwd, env=env,
+                         capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def run(args, env):
+    over = []
+    print(f"{'entry point':<12} {'import+setup':>13} {'first response':>15} {'max':>8} {'modules':>8}  heavy modules loaded")
+    for entry in args.entry or sorted(ENTRY_POINTS):
+        cold_start(entry, env)  # compile bytecode once, like a deployed image
+        runs = [cold_start(entry, env) for _ in range(args.runs)]
+        ready = statistics.median(r["ready"] for r in runs) * 1000
+        first = statistics.median(r["first"] for r in runs) * 1000
+        print(f"{entry:<12} {ready:11.0f}ms {first:13.0f}ms {max(r['first'] for r in runs) * 1000:6.0f}ms "
+              f"{runs[-1]['modules']:8d}  {', '.join(runs[-1]['heavy']) or '-'}")
+        if first > args.budget_ms:
+            over.append(f"{entry}: {first:.0f}ms > {args.budget_ms:.0f}ms")
+    return over
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold start time of a worker, failing when over budget")
+    parser.add_argument("--runs", type=int, default=7)
+    parser.add_argument("--budget-ms", type=float, default=float(os.getenv("COLD_START_BUDGET_MS", "800")),
+                        help="Median time to the first response allowed per entry point")
+    parser.add_argument("--entry", choices=sorted(ENTRY_POINTS), action="append")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, PYTHONDONTWRITEBYTECODE="0", WARM_UP_ON_START="0")
+        env.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tmp, 'cold.db')}")
+        over = run(args, env)
+    if over:
+        sys.exit("Cold start over budget: " + "; ".join(over))
+    print(f"within the {args.budget_ms:.0f}ms budget")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+# Benchmark: note storage size and read/write latency with plain, zlib and zlib+dictionary compression
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from _support import make_app
+
+SUBJECTS = ("photosynthesis", "the chain rule", "binary search", "supply and demand", "the French Revolution",
+            "enzyme kinetics", "Newton's second law", "recursion", "plate tectonics", "the Krebs cycle",
+            "matrix multiplication", "natural selection", "Ohm's law", "dynamic programming", "inflation")
+SENTENCES = (
+    "{s} is one of the most important ideas in this topic, and it appears in many exam questions.",
+    "To understand {s}, start with the definition and then work through a simple example step by step.",
+    "A common mistake is to confuse {s} with {o}; the key difference is how each one is applied.",
+    "In summary, {s} explains how a system changes over time and why the result matters in practice.",
+    "For example, consider a problem where {s} is used together with {o} to reach the final answer.",
+    "Remember that {s} depends on the assumptions you make, so always state them clearly first.",
+    "The following steps show how to apply {s}: identify the inputs, apply the rule, check the result.",
+    "Practice question: explain {s} in your own words and give one real-world application of it.",
+)
+HEADINGS = ("## Key points", "## Explanation", "## Example", "## Summary", "## Common mistakes")
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def make_note(rng):
+    subject = rng.choice(SUBJECTS)
+    parts = []
+    for heading in rng.sample(HEADINGS, rng.randint(2, 4)):
+        parts.append(heading)
+        for _ in range(rng.randint(2, 4)):
+            parts.append("- " + rng.choice(SENTENCES).format(s=subject, o=rng.choice(SUBJECTS)).capitalize()
+                         + f" ({rng.randint(1, 999)})")
+    return "\n".join(parts)
+
+
+def notes(count, seed=1):
+    """The same corpus for every mode, generated in batches so it never sits in memory whole."""
+    rng = random.Random(seed)
+    for start in range(0, count, 10000):
+        yield [make_note(rng) for _ in range(min(10000, count - start))]
+
+
+def run_mode(args, mode, tmp):
+    from sqlalchemy import insert, select, text
+
+    from models import db, Note, Notebook, User
+    from services.compression_service import init_compression, note_codec, store_dictionary, train_dictionary
+    from services.search_service import init_search
+
+    path = os.path.join(tmp, f"{mode}.db")
+    note_codec.algorithm = "none" if mode == "plain" else "zlib"
+    note_codec.set_dictionaries([])
+    app = make_app(path)
+    result = {"mode": mode}
+    with app.app_context():
+        engine = db.engine
+        init_compression(engine)
+        if args.fts:
+            init_search(engine)
+        db.session.add(User(username="bench", email="bench@example.com", password="x"))
+        db.session.flush()
+        db.session.add(Notebook(title="Default", user_id=1))
+        db.session.commit()
+        if mode == "zlib+dict":
+            samples = next(notes(args.dictionary_samples, seed=2))
+            store_dictionary(engine, train_dictionary(samples))
+
+        raw_bytes, write_seconds = 0, 0.0
+        for batch in notes(args.notes):
+            raw_bytes += sum(len(n.encode("utf-8")) for n in batch)
+            rows = [{"content": n, "note_type": "explanation", "notebook_id": 1} for n in batch]
+            started = time.perf_counter()
+            db.session.execute(insert(Note), rows)
+            db.session.commit()
+            write_seconds += time.perf_counter() - started
+        result["write_us"] = write_seconds / args.notes * 1e6
+        result["raw_mb"] = raw_bytes / 1e6
+
+        with engine.connect() as conn:
+            conn.execute(text("VACUUM"))
+            result["table_mb"] = conn.execute(text("SELECT SUM(pgsize) FROM dbstat WHERE name = 'notes'")).scalar() / 1e6
+        result["file_mb"] = os.path.getsize(path) / 1e6
+
+        rng = random.Random(3)
+        ids = [rng.randint(1, args.notes) for _ in range(args.reads)]
+        for note_id in ids[:200]:  # warm the page cache and statement cache first
+            db.session.execute(select(Note.content).where(Note.id == note_id)).scalar_one()
+        latencies = []
+        for note_id in ids:
+            started = time.perf_counter()
+            db.session.execute(select(Note.content).where(Note.id == note_id)).scalar_one()
+            latencies.append(time.perf_counter() - started)
+        result["read_p50_us"] = statistics.median(latencies) * 1e6
+        result["read_p95_us"] = percentile(latencies, 0.95) * 1e6
+
+        started = time.perf_counter()
+        scanned = sum(len(c) for c in db.session.execute(select(Note.content)).scalars())
+        result["scan_s"] = time.perf_counter() - started
+        assert scanned, "empty scan"
+
+        if args.fts:
+            with engine.connect() as conn:
+                result["fts_mb"] = conn.execute(text(
+                    "SELECT SUM(pgsize) FROM dbstat WHERE name LIKE 'notes_fts%'")).scalar() / 1e6
+        db.session.remove()
+        engine.dispose()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compressed note storage: size on disk and read/write latency")
+    parser.add_argument("--notes", type=int, default=1_000_000)
+    parser.add_argument("--reads", type=int, default=5000, help="Random single-note reads per mode.")
+    parser.add_argument("--dictionary-samples", type=int, default=5000)
+    parser.add_argument("--fts", action="store_true", help="Keep the FTS index in sync while inserting (slower).")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        results = []
+        for mode in ("plain", "zlib", "zlib+dict"):
+            results.append(run_mode(args, mode, tmp))
+            os.remove(os.path.join(tmp, f"{mode}.db"))
+
+    print(f"{args.notes:,} notes, {results[0]['raw_mb']:.0f} MB of text")
+    header = f"{'mode':<10} {'notes table':>12} {'db file':>10} {'write/note':>11} {'read p50':>9} {'read p95':>9} {'full scan':>10}"
+    if args.fts:
+        header += f" {'fts index':>10}"
+    print(header)
+    for r in results:
+        line = (f"{r['mode']:<10} {r['table_mb']:9.0f} MB {r['file_mb']:7.0f} MB {r['write_us']:8.1f} us"
+                f" {r['read_p50_us']:6.1f} us {r['read_p95_us']:6.1f} us {r['scan_s']:8.2f} s")
+        if args.fts:
+            line += f" {r['fts_mb']:7.0f} MB"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+# Benchmark: main route queries on a large database, without vs. with the indexes and SQLite pragmas
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+from _support import make_app
+
+
+def route_queries(Note, Notebook, Subtopic, CustomPrompt, user_id, topic_id, subtopic_ids):
+    """(label, callable(session)) pairs mirroring what the routes run per request."""
+    from sqlalchemy import func, select
+    from services.notebook_service import list_notes
+
+    def notebook_id(session):
+        return session.execute(select(Notebook.id).where(Notebook.user_id == user_id).limit(1)).scalar()
+
+    def deep_page(session):
+        nb = notebook_id(session)
+        cursor = None
+        for _ in range(25):
+            _, cursor = list_notes(session, Note, nb, cursor=cursor, limit=20)
+        return cursor
+
+    return [
+        ("notebook by user (every notebook page)", notebook_id),
+        ("notebook page 1 (/notebook)", lambda s: list_notes(s, Note, notebook_id(s), limit=20)),
+        ("notebook pages 1-25 (keyset)", deep_page),
+        ("saved prompts (/select)", lambda s: s.execute(
+            select(CustomPrompt).where(CustomPrompt.user_id == user_id)).all()),
+        ("prompt already saved? (/generate)", lambda s: s.execute(
+            select(CustomPrompt.id).where(CustomPrompt.user_id == user_id,
+                                          CustomPrompt.prompt_text == "prompt 7").limit(1)).first()),
+        ("subtopics of a topic (/api/subtopics)", lambda s: s.execute(
+            select(Subtopic.id, Subtopic.name).where(Subtopic.topic_id == topic_id)).all()),
+        ("notebook has notes? (/download)", lambda s: s.execute(
+            select(Note.id).where(Note.notebook_id == notebook_id(s)).limit(1)).first()),
+        ("notes on removed subtopics (import)", lambda s: s.execute(
+            select(func.count()).select_from(Note).where(Note.subtopic_id.in_(subtopic_ids))).scalar()),
+    ]
+
+
+def populate(db, models, notes, users, chunk=50000):
+    from sqlalchemy import insert
+
+    Note, Notebook, Topic, Subtopic, User, CustomPrompt = models
+    session = db.session
+    session.execute(insert(User), [
+        {"username": f"user{i}", "email": f"user{i}@example.com", "password": "x"} for i in range(users)
+    ])
+    session.execute(insert(Notebook), [{"title": "Default", "user_id": i + 1} for i in range(users)])
+    session.execute(insert(Topic), [{"name": f"Topic {i}"} for i in range(100)])
+    session.execute(insert(Subtopic), [{"name": f"Subtopic {i}", "topic_id": i % 100 + 1} for i in range(5000)])
+    session.execute(insert(CustomPrompt), [
+        {"prompt_name": f"p{i}", "prompt_text": f"prompt {i % 20}", "answer_type": "custom", "user_id": i % users + 1}
+        for i in range(users * 20)
+    ])
+    for start in range(0, notes, chunk):
+        session.execute(insert(Note), [
+            {"content": f"note {i}", "topic_id": i % 100 + 1, "subtopic_id": i % 5000 + 1,
+             "note_type": "summary", "notebook_id": i % users + 1}
+            for i in range(start, min(start + chunk, notes))
+        ])
+    session.commit()
+
+
+def time_queries(engine, queries, repeat):
+    from sqlalchemy.orm import Session
+
+    results = {}
+    with Session(engine) as session:
+        for label, query in queries:
+            samples = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                query(session)
+                samples.append(time.perf_counter() - started)
+                session.expunge_all()
+            results[label] = statistics.median(samples)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Route queries on a large DB: default engine vs. indexes + SQLite pragmas")
+    parser.add_argument("--notes", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    from sqlalchemy import create_engine
+    from models import db, CustomPrompt, Note, Notebook, Subtopic, Topic, User
+    from services.db_tuning import tune_engine
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "tuning.db")
+        app = make_app(db_path)
+        with app.app_context():
+            started = time.perf_counter()
+            populate(db, (Note, Notebook, Topic, Subtopic, User, CustomPrompt), args.notes, args.users)
+            print(f"populated {args.notes:,} notes in {time.perf_counter() - started:.1f}s")
+            db.engine.dispose()
+
+        # Every secondary index declared on the models (PKs/uniques are kept)
+        indexes = [index for table in db.metadata.sorted_tables for index in table.indexes]
+        queries = route_queries(Note, Notebook, Subtopic, CustomPrompt, args.users // 2, 42, list(range(1, 51)))
+
+        baseline = create_engine(f"sqlite:///{db_path}")
+        with baseline.begin() as conn:
+            conn.exec_driver_sql("PRAGMA journal_mode=DELETE")
+            for index in indexes:
+                index.drop(conn, checkfirst=True)
+        before = time_queries(baseline, queries, args.repeat)
+        baseline.dispose()
+
+        tuned = tune_engine(create_engine(f"sqlite:///{db_path}"))
+        with tuned.begin() as conn:
+            for index in indexes:
+                index.create(conn, checkfirst=True)
+            conn.exec_driver_sql("ANALYZE")
+        after = time_queries(tuned, queries, args.repeat)
+        tuned.dispose()
+
+    print(f"{'query':<42} {'before':>11} {'after':>11} {'speedup':>9}")
+    for label, _ in queries:
+        speedup = before[label] / after[label] if after[label] else float("inf")
+        print(f"{label:<42} {before[label] * 1000:8.2f} ms {after[label] * 1000:8.2f} ms {speedup:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+# Benchmark: batched/streamed notebook export vs. the old build-everything-in-memory download (time, memory, size)
+import argparse
+import io
+import os
+import tempfile
+import time
+import tracemalloc
+import unicodedata
+
+from _support import make_app
+
+
+def legacy_export(notebook, filetype):
+    # The previous download(): one joined string, one FPDF document, latin-1 copy, BytesIO copy
+    content = "\n\n---\n\n".join(note.content for note in notebook.notes)
+    if filetype == "txt":
+        return io.BytesIO(content.encode("utf-8"))
+    from fpdf import FPDF
+    clean_content = unicodedata.normalize("NFKD", content).encode("ascii", "ignore").decode("ascii")
+    pdf = FPDF()
+    pdf.add_page()
+    pdf.set_font("Arial", size=12)
+    for line in clean_content.split("\n"):
+        pdf.multi_cell(0, 10, line)
+    return io.BytesIO(pdf.output(dest="S").encode("latin1"))
+
+
+def measure(label, fn):
+    """fn() returns the size of the export in bytes."""
+    tracemalloc.start()
+    started = time.perf_counter()
+    size = fn()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<28} {elapsed:8.2f} s   peak {peak / 1024 / 1024:8.1f} MiB   size {size / 1024 / 1024:8.2f} MiB")
+
+
+def file_size(fileobj):
+    with fileobj:
+        return fileobj.seek(0, os.SEEK_END)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Notebook export time and peak memory")
+    parser.add_argument("--notes", type=int, default=10000)
+    parser.add_argument("--formats", default="txt,md,pdf")
+    parser.add_argument("--unicode", action="store_true",
+                        help="Add a line outside Latin-1 to every note (PDF falls back to the TTF font for it).")
+    args = parser.parse_args()
+
+    from sqlalchemy import insert
+    from models import db, Note, Notebook, Subtopic, Topic, User
+    from services.export_service import iter_notes, render_to_file, stream_text
+
+    body = "Photosynthesis converts light energy into chemical energy stored in glucose. " * 12
+    if args.unicode:
+        body += "\nΔG = −RT ln K, so a reaction with K > 1 has ΔG < 0 (≈ spontaneous)."
+    with tempfile.TemporaryDirectory() as tmp:
+        app = make_app(os.path.join(tmp, "export.db"))
+        with app.app_context():
+            db.session.add(User(username="bench", email="bench@example.com", password="x"))
+            db.session.add(Topic(name="Biology"))
+            db.session.flush()
+            db.session.add(Subtopic(name="Plants", topic_id=1))
+            db.session.add(Notebook(title="Default", user_id=1))
+            db.session.commit()
+            db.session.execute(insert(Note), [
+                {"content": f"Note {i}\n{body}", "topic_id": 1, "subtopic_id": 1,
+                 "note_type": "summary", "notebook_id": 1}
+                for i in range(args.notes)
+            ])
+            db.session.commit()
+
+            for filetype in args.formats.split(","):
+                if filetype in ("txt", "pdf"):
+                    db.session.expunge_all()
+                    measure(f"legacy {filetype}",
+                            lambda: file_size(legacy_export(db.session.get(Notebook, 1), filetype)))
+                db.session.expunge_all()
+                if filetype in ("txt", "md"):
+                    measure(f"streamed {filetype}",
+                            lambda: sum(len(c.encode("utf-8"))
+                                        for c in stream_text(filetype, iter_notes(db.session, Note, Topic, Subtopic, 1))))
+                else:
+                    measure(f"batched {filetype}",
+                            lambda: file_size(render_to_file(filetype, iter_notes(db.session, Note, Topic, Subtopic, 1))))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+# Benchmark: login storm throughput and page latency, inline hashing vs. the hashing pool; user loader queries with the user cache
+import argparse
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+from _support import make_app
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))] if ordered else 0.0
+
+
+def build_app(db_path, hasher, cache):
+    from flask import request
+    from flask_login import LoginManager, current_user, login_required, login_user
+    from sqlalchemy import event
+    from models import User, db
+
+    app = make_app(db_path)
+    app.config["SECRET_KEY"] = "bench"
+    login_manager = LoginManager(app)
+    cache.watch(User)
+    app.selects = 0
+
+    with app.app_context():
+        @event.listens_for(db.engine, "before_cursor_execute")
+        def _count(conn, cursor, statement, *args):
+            if statement.lstrip().upper().startswith("SELECT"):
+                app.selects += 1
+
+    @login_manager.user_loader
+    def load_user(user_id):
+        return cache.get(db.session, User, int(user_id))
+
+    @app.route("/login", methods=["POST"])
+    def login():
+        user = User.query.filter_by(email=request.form["email"]).first()
+        matches, new_hash = hasher.verify(user.password, request.form["password"])
+        if not matches:
+            return "no", 401
+        if new_hash:
+            user.password = new_hash
+            db.session.commit()
+        login_user(user)
+        return "ok"
+
+    @app.route("/me")
+    @login_required
+    def me():
+        return current_user.username
+
+    @app.route("/ping")
+    def ping():
+        return "pong"
+
+    return app
+
+
+def seed(app, hasher, users):
+    from models import User, db
+
+    stored = hasher.hash("correct horse")
+    with app.app_context():
+        db.session.add_all(User(username=f"u{i}", email=f"u{i}@class.test", password=stored) for i in range(users))
+        db.session.commit()
+
+
+def login_storm(app, args):
+    """`args.students` threads log in at once while another thread keeps loading a cheap page."""
+    logins, pings = [], []
+    done = threading.Event()
+    start = threading.Barrier(args.students + 1)
+
+    def student(i):
+        client = app.test_client()
+        start.wait()
+        t = time.perf_counter()
+        response = client.post("/login", data={"email": f"u{i}@class.test", "password": "correct horse"})
+        logins.append(time.perf_counter() - t)
+        assert response.status_code == 200, response.status_code
+
+    def browser():
+        client = app.test_client()
+        start.wait()
+        while not done.is_set():
+            t = time.perf_counter()
+            client.get("/ping")
+            pings.append(time.perf_counter() - t)
+            time.sleep(0.005)
+
+    threads = [threading.Thread(target=student, args=(i,)) for i in range(args.students)]
+    pinger = threading.Thread(target=browser)
+    started = time.perf_counter()
+    for thread in threads + [pinger]:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    done.set()
+    pinger.join()
+    return elapsed, logins, pings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Login storm and user loading: inline vs. pooled hashing, with vs. without the user cache")
+    parser.add_argument("--students", type=int, default=40, help="Simultaneous logins")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Hashing pool size")
+    parser.add_argument("--method", default="scrypt:32768:8:1")
+    parser.add_argument("--pages", type=int, default=500, help="Authenticated page loads per user-cache mode")
+    args = parser.parse_args()
+
+    from services.auth_service import PasswordHasher, UserCache
+
+    print(f"{args.students} simultaneous logins ({args.method}, {os.cpu_count()} cpu)")
+    print(f"{'hashing':<14} {'logins/s':>9} {'login p95':>10} {'page p50':>9} {'page p95':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for label, workers in (("inline", 0), (f"pool ({args.workers})", args.workers)):
+            hasher = PasswordHasher(method=args.method, workers=workers)
+            hasher.start()
+            app = build_app(os.path.join(tmp, f"login-{workers}.db"), hasher, UserCache(ttl=0))
+            seed(app, hasher, args.students)
+            elapsed, logins, pings = login_storm(app, args)
+            print(f"{label:<14} {args.students / elapsed:9.1f} {percentile(logins, 95) * 1000:8.0f}ms "
+                  f"{statistics.median(pings) * 1000:7.1f}ms {percentile(pings, 95) * 1000:7.1f}ms")
+            hasher.shutdown()
+
+        # Parameters raised: the first login with the old hash rehashes it, later logins don't
+        old = PasswordHasher(method="pbkdf2:sha256:100000", workers=0)
+        new = PasswordHasher(method=args.method, workers=0)
+        app = build_app(os.path.join(tmp, "rehash.db"), new, UserCache(ttl=0))
+        seed(app, old, 1)
+        client = app.test_client()
+        for _ in range(3):
+            client.post("/login", data={"email": "u0@class.test", "password": "correct horse"})
+        print(f"\nrehash after changing parameters: {new.rehashed} of 3 logins rehashed")
+
+        print(f"\n{args.pages} authenticated page loads")
+        print(f"{'user loader':<14} {'SELECTs/page':>13} {'p50':>8} {'hit rate':>9}")
+        for label, ttl in (("query", 0), ("cached", 30)):
+            cache = UserCache(ttl=ttl)
+            hasher = PasswordHasher(method="pbkdf2:sha256:1000", workers=0)
+            app = build_app(os.path.join(tmp, f"pages-{ttl}.db"), hasher, cache)
+            seed(app, hasher, 1)
+            client = app.test_client()
+            client.post("/login", data={"email": "u0@class.test", "password": "correct horse"})
+            app.selects, samples = 0, []
+            for _ in range(args.pages):
+                t = time.perf_counter()
+                client.get("/me")
+                samples.append(time.perf_counter() - t)
+            lookups = cache.hits + cache.misses
+            print(f"{label:<14} {app.selects / args.pages:13.2f} {statistics.median(samples) * 1000:6.2f}ms "
+                  f"{(cache.hits / lookups if lookups else 0):9.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+# Benchmark: keyset-paginated notebook listing; fails if the query count grows with page size
+import argparse
+import os
+import tempfile
+import time
+
+from _support import make_app
+
+MAX_QUERIES_PER_PAGE = 3  # notes + selectin topics + selectin subtopics
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Notebook listing latency and query count")
+    parser.add_argument("--notes", type=int, default=50000)
+    parser.add_argument("--page-size", type=int, default=20)
+    parser.add_argument("--pages", type=int, default=50)
+    args = parser.parse_args()
+
+    from sqlalchemy import event, insert
+    from models import db, Note, Notebook, Subtopic, Topic, User
+    from services.notebook_service import list_notes
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = make_app(os.path.join(tmp, "notebook.db"))
+        with app.app_context():
+            db.session.add(User(username="bench", email="bench@example.com", password="x"))
+            db.session.add_all([Topic(name=f"Topic {i}") for i in range(50)])
+            db.session.flush()
+            db.session.add_all([Subtopic(name=f"Subtopic {i}", topic_id=i % 50 + 1) for i in range(500)])
+            db.session.add(Notebook(title="Default", user_id=1))
+            db.session.commit()
+            db.session.execute(insert(Note), [
+                {"content": f"note {i}", "topic_id": i % 50 + 1, "subtopic_id": i % 500 + 1,
+                 "note_type": "summary", "notebook_id": 1}
+                for i in range(args.notes)
+            ])
+            db.session.commit()
+
+            statements = []
+            event.listen(db.engine, "before_cursor_execute", lambda *a: statements.append(a[2]))
+
+            cursor, worst, started = None, 0, time.perf_counter()
+            for _ in range(args.pages):
+                statements.clear()
+                notes, cursor = list_notes(db.session, Note, 1, cursor=cursor, limit=args.page_size)
+                # Touch the relationships the template renders; must not trigger lazy loads
+                for note in notes:
+                    _ = (note.topic.name, note.subtopic.name)
+                worst = max(worst, len(statements))
+                db.session.expunge_all()
+                if not cursor:
+                    break
+            elapsed = time.perf_counter() - started
+
+    print(f"{args.pages} pages of {args.page_size}: {elapsed / args.pages * 1000:.2f} ms/page, "
+          f"max {worst} queries/page")
+    assert worst <= MAX_QUERIES_PER_PAGE, f"N+1 regression: {worst} queries for one page"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+# Micro-benchmark: compiled prompt registry vs. per-request file read + str.replace
+import argparse
+import os
+import sys
+import tempfile
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+from services.prompt_service import TemplateRegistry  # noqa: E402
+
+TEMPLATE = (
+    "Write a detailed {{topic}} explanation focused on {{subtopic}}.\n"
+    + "Use examples a first-year student understands. " * 20
+    + "\nIf the student said something, take it into account: {{user_feedback}}\n"
+)
+
+
+def legacy_render(template_dir, prompt_type, topic, subtopic, user_feedback=""):
+    # The previous load_prompt_template implementation
+    file_path = os.path.join(template_dir, f"{prompt_type}.txt")
+    if not os.path.exists(file_path):
+        return None
+    with open(file_path, "r", encoding="utf-8") as file:
+        template = file.read()
+    return (
+        template.replace("{{topic}}", topic)
+                .replace("{{subtopic}}", subtopic)
+                .replace("{{user_feedback}}", user_feedback)
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prompt template render throughput")
+    parser.add_argument("--number", type=int, default=20000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as template_dir:
+        for name in ("definition", "summary", "interview"):
+            with open(os.path.join(template_dir, f"{name}.txt"), "w", encoding="utf-8") as f:
+                f.write(TEMPLATE)
+        registry = TemplateRegistry(template_dir).load()
+
+        assert registry.get("summary").render(topic="Math", subtopic="Algebra", user_feedback="") == \
+            legacy_render(template_dir, "summary", "Math", "Algebra")
+
+        legacy = timeit.timeit(lambda: legacy_render(template_dir, "summary", "Math", "Algebra"), number=args.number)
+        compiled = timeit.timeit(
+            lambda: registry.get("summary").render(topic="Math", subtopic="Algebra", user_feedback=""),
+            number=args.number,
+        )
+        listing = timeit.timeit(registry.prompt_types, number=args.number)
+
+    print(f"legacy file read + replace : {args.number / legacy:12,.0f} renders/s")
+    print(f"compiled registry          : {args.number / compiled:12,.0f} renders/s ({legacy / compiled:.1f}x)")
+    print(f"prompt type listing        : {args.number / listing:12,.0f} calls/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+# Benchmark: tail latency of one provider vs. race / hedged race / fallback across two fake providers
+import argparse
+import random
+import statistics
+import time
+
+from _support import APP_DIR  # noqa: F401  (puts app/ on sys.path)
+
+
+class FlakyLatency:
+    """Usually `fast` seconds, but `slow` seconds for a `slow_rate` fraction of calls."""
+
+    def __init__(self, fast, slow, slow_rate, seed):
+        self.fast, self.slow, self.slow_rate = fast, slow, slow_rate
+        self.rng = random.Random(seed)
+
+    def __call__(self):
+        return self.slow if self.rng.random() < self.slow_rate else self.fast * self.rng.uniform(0.8, 1.2)
+
+
+def make_backend(name, latency):
+    from services.llm_backends import FakeBackend, register_backend
+
+    class DegradedBackend(FakeBackend):
+        def _first_token_delay(self):
+            self.calls += 1
+            return latency()
+
+    return register_backend(DegradedBackend(name))
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Provider strategies under a degraded provider: p50/p95/p99 latency")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--fast", type=float, default=0.02, help="Typical provider latency (s)")
+    parser.add_argument("--slow", type=float, default=0.5, help="Latency of a degraded call (s)")
+    parser.add_argument("--slow-rate", type=float, default=0.1, help="Fraction of degraded calls per provider")
+    parser.add_argument("--hedge-delay", type=float, default=0.05)
+    args = parser.parse_args()
+
+    from services import llm_service
+
+    a = make_backend("bench-a", FlakyLatency(args.fast, args.slow, args.slow_rate, seed=1))
+    b = make_backend("bench-b", FlakyLatency(args.fast, args.slow, args.slow_rate, seed=2))
+    providers = ["bench-a", "bench-b"]
+
+    runs = [
+        ("single provider", dict(provider="bench-a")),
+        ("race (both at once)", dict(strategy="race", providers=providers)),
+        (f"hedged race ({args.hedge_delay * 1000:.0f} ms)", dict(strategy="race", providers=providers)),
+        ("fallback", dict(strategy="fallback", providers=providers)),
+    ]
+    print(f"{args.requests} requests, {args.slow_rate:.0%} of calls degraded to {args.slow * 1000:.0f} ms")
+    print(f"{'strategy':<24} {'p50':>8} {'p95':>8} {'p99':>8} {'calls/req':>10}")
+    for label, kwargs in runs:
+        llm_service.DEFAULT_HEDGE_DELAY = args.hedge_delay if label.startswith("hedged") else 0.0
+        a.calls = b.calls = 0
+        samples = []
+        for i in range(args.requests):
+            started = time.perf_counter()
+            text = llm_service.generate_llm_response(f"{label} {i}", use_cache=False, **kwargs)
+            samples.append(time.perf_counter() - started)
+            assert not llm_service.is_error_response(text), text
+        print(f"{label:<24} {statistics.median(samples) * 1000:6.1f}ms {percentile(samples, 95) * 1000:6.1f}ms "
+              f"{percentile(samples, 99) * 1000:6.1f}ms {(a.calls + b.calls) / args.requests:10.2f}")
+
+
+if __name__ == "__main__":
+    main()
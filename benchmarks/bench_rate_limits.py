@@ -0,0 +1,111 @@
+# Benchmark: quota bookkeeping overhead, and whether one hammering user starves everyone else on a shared key
+import argparse
+import itertools
+import os
+import tempfile
+import threading
+import time
+
+from _support import APP_DIR  # noqa: F401  (puts app/ on sys.path)
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))] if ordered else 0.0
+
+
+def overhead(repeat, tmp):
+    from services.rate_limit_service import Quotas
+
+    print(f"{'store':<8} {'reserve_user':>14} {'provider_call':>15}")
+    for label, path in (("memory", ""), ("sqlite", os.path.join(tmp, "quotas.db"))):
+        quotas = Quotas(path=path, user_rpm=1e9, user_tpm=1e12, provider_rpm=1e9, provider_tpm=1e12)
+        started = time.perf_counter()
+        for i in range(repeat):
+            quotas.reserve_user(i % 50, 500).settle(200)
+        user = (time.perf_counter() - started) / repeat
+        started = time.perf_counter()
+        for _ in range(repeat):
+            with quotas.provider_call("bench", "key", 500) as reservation:
+                reservation.settle(200)
+        provider = (time.perf_counter() - started) / repeat
+        print(f"{label:<8} {user * 1e6:11.0f} us {provider * 1e6:12.0f} us")
+
+
+def fairness(args, user_rpm):
+    """Normal users' outcomes while one user fires requests from `args.hammer_threads` threads."""
+    from services import llm_service
+    from services.llm_backends import FakeBackend, register_backend
+    from services.rate_limit_service import Quotas, RateLimited
+
+    register_backend(FakeBackend("bench-shared", latency=args.latency))
+    quotas = llm_service.quotas = Quotas(path="", user_rpm=user_rpm, user_tpm=0,
+                                         provider_rpm=args.provider_rpm, provider_tpm=0,
+                                         provider_concurrency=args.concurrency, wait_timeout=args.wait_timeout)
+    stop = time.monotonic() + args.seconds
+    outcomes = {"normal": [], "hammer": []}
+    lock = threading.Lock()
+    serial = itertools.count()  # distinct prompts, so single-flight doesn't coalesce the hammering
+
+    def request(kind, user_id):
+        started = time.perf_counter()
+        try:
+            quotas.reserve_user(user_id, 0)
+        except RateLimited:
+            status = "429"
+            if kind == "hammer":
+                time.sleep(0.01)  # a client retrying in a tight loop
+        else:
+            text = llm_service.generate_llm_response(f"{kind} {user_id} {next(serial)}", provider="bench-shared", use_cache=False)
+            status = "error" if llm_service.is_error_response(text) else "ok"
+        with lock:
+            outcomes[kind].append((status, time.perf_counter() - started))
+
+    def hammer():
+        while time.monotonic() < stop:
+            request("hammer", 0)
+
+    def normal(user_id):
+        while time.monotonic() < stop:
+            request("normal", user_id)
+            time.sleep(args.think_time)
+
+    threads = [threading.Thread(target=hammer) for _ in range(args.hammer_threads)]
+    threads += [threading.Thread(target=normal, args=(uid,)) for uid in range(1, args.users + 1)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return outcomes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rate limits: bookkeeping cost and fairness under one abusive user")
+    parser.add_argument("--repeat", type=int, default=5000)
+    parser.add_argument("--seconds", type=float, default=6)
+    parser.add_argument("--users", type=int, default=5, help="Normal users (one request per think-time)")
+    parser.add_argument("--think-time", type=float, default=0.5)
+    parser.add_argument("--hammer-threads", type=int, default=8)
+    parser.add_argument("--provider-rpm", type=float, default=120, help="Shared key's requests per minute (and burst)")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--wait-timeout", type=float, default=2)
+    parser.add_argument("--user-rpm", type=float, default=30)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        overhead(args.repeat, tmp)
+
+    print(f"\n{args.hammer_threads} threads of one user vs. {args.users} normal users, shared key at "
+          f"{args.provider_rpm:.0f} rpm / {args.concurrency} concurrent, {args.seconds:.0f}s")
+    print(f"{'per-user limit':<16} {'normal ok':>10} {'normal p95':>11} {'hammer ok':>10} {'hammer 429':>11}")
+    for label, user_rpm in (("none", 0), (f"{args.user_rpm:.0f} rpm", args.user_rpm)):
+        outcomes = fairness(args, user_rpm)
+        normal, hammer = outcomes["normal"], outcomes["hammer"]
+        normal_ok = [t for status, t in normal if status == "ok"]
+        print(f"{label:<16} {len(normal_ok) / max(1, len(normal)):10.0%} {percentile(normal_ok, 95) * 1000:9.0f}ms "
+              f"{sum(s == 'ok' for s, _ in hammer):10d} {sum(s == '429' for s, _ in hammer):11d}")
+
+
+if __name__ == "__main__":
+    main()
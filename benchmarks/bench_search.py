@@ -0,0 +1,68 @@
+# Benchmark: FTS5 search vs. naive LIKE scan over a large notebook
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from _support import make_app, timer
+
+WORDS = (
+    "energy cell plant light matrix vector function derivative integral protein enzyme "
+    "atom molecule bond reaction graph tree network signal memory process thread lock "
+    "market demand supply price theorem proof lemma history empire trade river climate"
+).split()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Notebook search latency")
+    parser.add_argument("--notes", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=50)
+    args = parser.parse_args()
+
+    from sqlalchemy import insert
+    from models import db, Note, Notebook, Subtopic, Topic, User
+    import services.search_service as search_service
+
+    rng = random.Random(7)
+    with tempfile.TemporaryDirectory() as tmp:
+        app = make_app(os.path.join(tmp, "search.db"))
+        with app.app_context():
+            db.session.add(User(username="bench", email="bench@example.com", password="x"))
+            db.session.add(Topic(name="Science"))
+            db.session.flush()
+            db.session.add(Subtopic(name="Biology", topic_id=1))
+            db.session.add(Notebook(title="Default", user_id=1))
+            db.session.commit()
+
+            with timer(f"insert {args.notes} notes"):
+                for start in range(0, args.notes, 10000):
+                    db.session.execute(insert(Note), [
+                        {"content": " ".join(rng.choices(WORDS, k=150)), "topic_id": 1,
+                         "subtopic_id": 1, "note_type": "summary", "notebook_id": 1}
+                        for _ in range(min(10000, args.notes - start))
+                    ])
+                db.session.commit()
+            with timer("build FTS index"):
+                search_service.init_search(db.engine)
+
+            queries = [" ".join(rng.sample(WORDS, 2)) for _ in range(args.queries)]
+
+            def run(label):
+                latencies = []
+                for q in queries:
+                    started = time.perf_counter()
+                    search_service.search_notes(db.session, 1, q, Note, Topic, Subtopic)
+                    latencies.append((time.perf_counter() - started) * 1000)
+                latencies.sort()
+                print(f"{label:<12} p50 {statistics.median(latencies):8.1f} ms   "
+                      f"p95 {latencies[int(len(latencies) * 0.95) - 1]:8.1f} ms")
+
+            run("FTS5")
+            search_service._fts_engines.clear()  # force the LIKE fallback path
+            run("LIKE scan")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+# Benchmark: semantic cache lookup latency at 1M cached prompts, and hit / false-hit rates by threshold
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from _support import APP_DIR  # noqa: F401  (puts app/ on sys.path)
+
+SUBJECTS = [
+    "photosynthesis", "the chain rule", "the product rule", "quadratic equations", "newton's second law",
+    "binary search", "supply and demand", "the french revolution", "cellular respiration", "linear regression",
+    "recursion", "the water cycle", "ohm's law", "prime numbers", "plate tectonics", "big o notation",
+]
+# Ways students phrase the same request; the first one is what gets cached
+PHRASINGS = {
+    "simple": ["explain {s} simply", "explain {s} in simple terms", "can you explain {s} simply please",
+               "simple explanation of {s}"],
+    "example": ["explain {s} with an example", "explain {s} with examples", "give an example of {s} and explain it",
+                "{s} explained with an example"],
+    "questions": ["give me 5 practice questions on {s}", "5 practice questions about {s} please",
+                  "practice questions on {s}", "write five practice questions for {s}"],
+    "summary": ["summarize {s} in three sentences", "summary of {s} in 3 sentences", "short summary of {s}",
+                "summarise {s} briefly"],
+}
+
+# (cached prompt, different question worded alike): a hit on any of these serves the wrong answer
+NEGATIVE_PAIRS = [
+    ("explain the difference between python lists and tuples with examples",
+     "explain the difference between python lists and sets with examples"),
+    ("explain how binary search works step by step with a worked example in python",
+     "explain how linear search works step by step with a worked example in python"),
+    ("explain lists and tuples", "explain lists and sets"),
+    ("explain binary search", "explain linear search"),
+    ("explain the chain rule with an example", "explain the product rule with an example"),
+    ("difference between mitosis and meiosis", "difference between mitosis and cytokinesis"),
+    ("explain tcp vs udp", "explain tcp vs ip"),
+    ("explain python lists simply", "explain python dictionaries simply"),
+    ("summarize the first world war", "summarize the second world war"),
+    ("give 5 practice questions on integration by parts", "give 5 practice questions on integration by substitution"),
+    ("explain depth first search", "explain breadth first search"),
+    ("explain the krebs cycle in simple terms", "explain the calvin cycle in simple terms"),
+    ("explain stack vs queue", "explain stack vs heap"),
+    ("explain kinetic energy with an example", "explain potential energy with an example"),
+    ("explain supply and demand", "explain supply and inflation"),
+    ("explain sql joins", "explain sql indexes"),
+    ("explain newton's first law", "explain newton's third law"),
+    ("explain alpha decay", "explain beta decay"),
+]
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def fill_index(index, entries, groups, dim, chunk=100_000):
+    """Random unit vectors spread over `groups` groups (embedding 1M prompts isn't what's being measured)."""
+    import numpy as np
+
+    rng = np.random.default_rng(0)
+    for start in range(0, entries, chunk):
+        count = min(chunk, entries - start)
+        vectors = rng.standard_normal((count, dim), dtype=np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        index.reserve(start + count)
+        index._vectors[start:start + count] = vectors
+        for row in range(start, start + count):
+            index.track(row, row % groups)
+
+
+def lookup_latency(args):
+    from services.semantic_cache import HashingEmbedder, VectorIndex
+
+    embedder = HashingEmbedder(args.dim)
+    queries = [embedder.embed(f"explain {SUBJECTS[i % len(SUBJECTS)]} simply, take {i}") for i in range(args.lookups)]
+    started = time.perf_counter()
+    for i in range(args.lookups):
+        embedder.embed(f"explain {SUBJECTS[i % len(SUBJECTS)]} simply, take {i}")
+    embed_us = (time.perf_counter() - started) / args.lookups * 1e6
+
+    with tempfile.TemporaryDirectory() as tmp:
+        indexes = [("in memory", VectorIndex(args.dim))]
+        if args.memmap:
+            indexes.append(("memory-mapped", VectorIndex(args.dim, os.path.join(tmp, "vectors.f32"))))
+        print(f"\n{args.entries:,} cached prompts, {args.dim} dims, {args.groups:,} topic/subtopic groups"
+              f" (embedding a prompt: {embed_us:.0f} us)")
+        print(f"{'index':<16} {'search':<24} {'p50':>9} {'p95':>9} {'p99':>9}")
+        for label, index in indexes:
+            started = time.perf_counter()
+            fill_index(index, args.entries, args.groups, args.dim)
+            index.flush()
+            build = time.perf_counter() - started
+            for scope, group_of in (("one subtopic", lambda i: i % args.groups), ("everything (no group)", None)):
+                samples = []
+                for i, query in enumerate(queries):
+                    group = group_of(i) if group_of else None
+                    t = time.perf_counter()
+                    index.search(query, group)
+                    samples.append(time.perf_counter() - t)
+                print(f"{label:<16} {scope:<24} {statistics.median(samples) * 1e3:7.3f}ms "
+                      f"{percentile(samples, 95) * 1e3:7.3f}ms {percentile(samples, 99) * 1e3:7.3f}ms")
+            print(f"{'':<16} (filled in {build:.1f}s)")
+            del index
+
+
+def hit_rates(args):
+    from services.semantic_cache import SemanticCache
+
+    thresholds = [float(t) for t in args.thresholds.split(",")]
+    print(f"\nHit rate on {len(SUBJECTS) * len(PHRASINGS) * 3} paraphrased prompts"
+          f" ({len(SUBJECTS)} subjects x {len(PHRASINGS)} intents cached, all in one subtopic);"
+          f" false hits on {len(NEGATIVE_PAIRS)} look-alike questions, each alone in its subtopic")
+    print(f"{'threshold':>9} {'hits':>7} {'correct':>8} {'wrong answer':>13} {'missed':>7} {'false hits':>11}")
+    for threshold in thresholds:
+        cache = SemanticCache(path="", threshold=threshold, thresholds="")
+        for subject in SUBJECTS:
+            for intent, phrasings in PHRASINGS.items():
+                cache.store(phrasings[0].format(s=subject), f"{intent}:{subject}", 1, 1)
+        correct = wrong = missed = 0
+        for subject in SUBJECTS:
+            for intent, phrasings in PHRASINGS.items():
+                for phrasing in phrasings[1:]:
+                    hit = cache.lookup(phrasing.format(s=subject), 1, 1)
+                    if hit is None:
+                        missed += 1
+                    elif hit.answer == f"{intent}:{subject}":
+                        correct += 1
+                    else:
+                        wrong += 1
+        false_hits = 0
+        for i, (cached, asked) in enumerate(NEGATIVE_PAIRS):
+            cache.store(cached, cached, 2, i)
+            false_hits += cache.lookup(asked, 2, i) is not None
+        total = correct + wrong + missed
+        print(f"{threshold:9.2f} {(correct + wrong) / total:7.1%} {correct / total:8.1%} {wrong / total:13.1%}"
+              f" {missed / total:7.1%} {false_hits / len(NEGATIVE_PAIRS):11.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Semantic cache: lookup latency at scale and hit-rate by threshold")
+    parser.add_argument("--entries", type=int, default=1_000_000)
+    parser.add_argument("--groups", type=int, default=5000, help="Distinct topic/subtopic/answer-type groups")
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--lookups", type=int, default=200)
+    parser.add_argument("--memmap", action="store_true", help="Also measure the memory-mapped index")
+    parser.add_argument("--thresholds", default="0.7,0.75,0.8,0.85,0.9")
+    parser.add_argument("--hit-rates-only", action="store_true", help="Skip the 1M-entry latency part")
+    args = parser.parse_args()
+
+    random.seed(0)
+    hit_rates(args)
+    if not args.hit_rates_only:
+        lookup_latency(args)
+
+
+if __name__ == "__main__":
+    main()
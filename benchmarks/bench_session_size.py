@@ -0,0 +1,102 @@
+# Benchmark: session cookie size and navigation latency, cookie-stored responses vs. server-side history
+import argparse
+import os
+import random
+import tempfile
+import time
+import warnings
+
+from _support import APP_DIR  # noqa: F401  (puts app/ on sys.path)
+
+# Browsers drop cookies larger than this
+COOKIE_LIMIT = 4093
+
+
+def build_app(history_store):
+    from flask import Flask, request, session
+
+    from services.history_service import new_history_id
+
+    app = Flask(__name__)
+    app.config["SECRET_KEY"] = "bench"
+
+    # ✅ Old behaviour: every response appended to the signed cookie
+    @app.route("/legacy/generate", methods=["POST"])
+    def legacy_generate():
+        session.setdefault("responses", []).append(request.form["text"])
+        session["response_index"] = len(session["responses"]) - 1
+        session.modified = True
+        return session["responses"][-1]
+
+    @app.route("/legacy/previous")
+    def legacy_previous():
+        if session["response_index"] > 0:
+            session["response_index"] -= 1
+        return session["responses"][session["response_index"]]
+
+    # ✅ New behaviour: the cookie holds an id and a position
+    @app.route("/history/generate", methods=["POST"])
+    def history_generate():
+        if "history_id" not in session:
+            session["history_id"] = new_history_id()
+        session["history_seq"] = history_store.append(session["history_id"], request.form["text"], "prompt")
+        return request.form["text"]
+
+    @app.route("/history/previous")
+    def history_previous():
+        entry = history_store.step(session["history_id"], session["history_seq"], -1)
+        session["history_seq"] = entry["seq"]
+        return entry["content"]
+
+    return app
+
+
+def run(app, prefix, texts, navigations):
+    client = app.test_client()
+    for text in texts:
+        client.post(f"{prefix}/generate", data={"text": text})
+    cookie = client.get_cookie("session")
+    cookie_bytes = len(cookie.value) if cookie else 0
+
+    started = time.perf_counter()
+    for _ in range(navigations):
+        client.get(f"{prefix}/previous")
+    elapsed = (time.perf_counter() - started) / navigations
+    return cookie_bytes, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Session cookie size and latency: cookie vs. server-side response history")
+    parser.add_argument("--responses", type=int, default=10)
+    parser.add_argument("--response-chars", type=int, default=2000)
+    parser.add_argument("--navigations", type=int, default=500)
+    args = parser.parse_args()
+
+    from services.history_service import HistoryStore
+
+    # The legacy numbers are expected to trip werkzeug's oversized-cookie warning
+    warnings.filterwarnings("ignore", message="The 'session' cookie is too large")
+
+    # Varied words, so the cookie's zlib compression doesn't flatter the legacy numbers
+    words = "derivative function limit integral vector matrix series proof theorem input output rate".split()
+    rng = random.Random(0)
+    texts = [
+        " ".join(rng.choice(words) for _ in range(args.response_chars))[:args.response_chars]
+        for _ in range(args.responses)
+    ]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = build_app(HistoryStore(os.path.join(tmp, "history.db"), limit=args.responses))
+        rows = [
+            ("cookie (legacy)",) + run(app, "/legacy", texts, args.navigations),
+            ("server-side history",) + run(app, "/history", texts, args.navigations),
+        ]
+
+    print(f"{args.responses} responses of {args.response_chars} chars, {args.navigations} 'previous' requests")
+    for label, cookie_bytes, elapsed in rows:
+        note = "  (over the browser cookie limit)" if cookie_bytes > COOKIE_LIMIT else ""
+        print(f"{label:<24} Cookie header {cookie_bytes:>8} bytes   {elapsed * 1000:7.3f} ms/request{note}")
+
+
+if __name__ == "__main__":
+    main()
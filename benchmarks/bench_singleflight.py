@@ -0,0 +1,75 @@
+# Benchmark: a class clicking "Generate" at once - provider calls and latency without vs. with request coalescing
+import argparse
+import multiprocessing
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+from _support import APP_DIR  # noqa: F401  (puts app/ on sys.path)
+
+
+def worker(args, coalesce, path, barrier, results):
+    """One worker process: `args.threads` students generating the same answer at the same moment."""
+    from services import llm_service
+    from services.llm_backends import FakeBackend, register_backend
+    from services.singleflight import SingleFlight
+
+    backend = register_backend(FakeBackend("bench-class", latency=args.latency))
+    llm_service.flights = SingleFlight(path=path if args.processes > 1 else "", enabled=coalesce)
+    latencies = []
+    start = threading.Barrier(args.threads)
+
+    def student():
+        start.wait()
+        started = time.perf_counter()
+        text = llm_service.generate_llm_response("Explain the chain rule", provider="bench-class")
+        latencies.append(time.perf_counter() - started)
+        assert not llm_service.is_error_response(text), text
+
+    threads = [threading.Thread(target=student) for _ in range(args.threads)]
+    barrier.wait()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    results.put((backend.calls, latencies))
+
+
+def run(args, coalesce, path):
+    ctx = multiprocessing.get_context("fork")
+    barrier, results = ctx.Barrier(args.processes), ctx.Queue()
+    procs = [ctx.Process(target=worker, args=(args, coalesce, path, barrier, results)) for _ in range(args.processes)]
+    for proc in procs:
+        proc.start()
+    calls, latencies = 0, []
+    for _ in procs:
+        proc_calls, proc_latencies = results.get()
+        calls += proc_calls
+        latencies += proc_latencies
+    for proc in procs:
+        proc.join()
+    return calls, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Identical concurrent generations: provider calls without vs. with single-flight")
+    parser.add_argument("--processes", type=int, default=4, help="Worker processes (like gunicorn workers)")
+    parser.add_argument("--threads", type=int, default=10, help="Concurrent requests per worker")
+    parser.add_argument("--latency", type=float, default=0.5, help="Fake provider latency (s)")
+    args = parser.parse_args()
+
+    # The fake provider's answers mustn't come from a response cache warmed by an earlier run
+    os.environ["LLM_CACHE_PATH"] = ""
+    print(f"{args.processes} workers x {args.threads} threads = {args.processes * args.threads} identical requests, "
+          f"provider latency {args.latency * 1000:.0f} ms")
+    print(f"{'mode':<14} {'provider calls':>15} {'p50':>9} {'max':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for label, coalesce in (("no coalescing", False), ("single-flight", True)):
+            calls, latencies = run(args, coalesce, os.path.join(tmp, f"flights-{label}.db"))
+            print(f"{label:<14} {calls:>15} {statistics.median(latencies) * 1000:7.0f}ms {max(latencies) * 1000:7.0f}ms")
+
+
+if __name__ == "__main__":
+    main()
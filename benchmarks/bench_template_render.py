@@ -0,0 +1,135 @@
+# Benchmark: notebook/response page rendering with and without fragment caching, bytecode cache, JSON response swap
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from _support import APP_DIR
+
+# Endpoints the templates link to; the benchmark only needs url_for to resolve them
+ENDPOINTS = ("download", "generate", "logout", "next_response", "notebook", "previous_response", "regenerate_custom",
+             "save", "search", "select", "upload_excel", "word_explanation", "login", "register")
+WORDS = "the a derivative function limit rate change slope tangent curve chain rule product quotient value".split()
+
+
+def build_app(fragments, bytecode_dir):
+    from flask import Flask, jsonify, render_template
+
+    from services.template_service import FragmentCache, init_templates
+
+    app = Flask(__name__, template_folder=os.path.join(APP_DIR, "templates"),
+                static_folder=os.path.join(APP_DIR, "static"))
+    app.config["SECRET_KEY"] = "bench"
+    for endpoint in ENDPOINTS:
+        app.add_url_rule(f"/{endpoint}", endpoint=endpoint, view_func=lambda **_: "")
+    app.add_url_rule("/api/response/<direction>", endpoint="api_response", view_func=lambda **_: "")
+    init_templates(app, bytecode_cache=bytecode_dir is not None, bytecode_cache_dir=bytecode_dir,
+                   fragments=FragmentCache(enabled=fragments))
+
+    entry = {"seq": 1, "content": make_content(random.Random(1), 400), "prompt": "Explain the chain rule",
+             "has_previous": True, "has_next": True}
+
+    @app.route("/response_page")
+    def response_page():
+        return render_template("response.html", response=entry["content"], topic="Calculus", subtopic="Chain rule",
+                               answer_type="explanation", editable_prompt=entry["prompt"],
+                               has_previous=True, has_next=True)
+
+    @app.route("/response_json")
+    def response_json():
+        return jsonify(entry)
+
+    return app
+
+
+def make_content(rng, words):
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def make_notes(count):
+    rng = random.Random(0)
+    topics = [SimpleNamespace(id=i, name=f"Topic {i}") for i in range(20)]
+    subtopics = [SimpleNamespace(id=i, name=f"Subtopic {i}") for i in range(200)]
+    start = datetime(2026, 1, 1)
+    return [
+        SimpleNamespace(id=i, content=make_content(rng, 150), note_type="explanation",
+                        topic=topics[i % 20], subtopic=subtopics[i % 200],
+                        created_at=start + timedelta(minutes=i), updated_at=start + timedelta(minutes=i))
+        for i in range(count)
+    ]
+
+
+def render_notebook(app, notes):
+    from flask import render_template
+
+    with app.test_request_context("/notebook"):
+        started = time.perf_counter()
+        render_template("notebook.html", notebook=notes, next_cursor=None, is_first_page=True, topics_version="v1")
+        return time.perf_counter() - started
+
+
+def notebook_renders(args, notes):
+    print(f"{'notebook page':<26} {'no cache':>10} {'cold cache':>11} {'warm cache':>11}")
+    for label, page in ((f"{len(notes):,} notes (one page)", notes), ("20 notes (default page)", notes[:20])):
+        plain = build_app(False, None)
+        render_notebook(plain, page)  # compile outside the timing
+        uncached = statistics.median(render_notebook(plain, page) for _ in range(args.repeat))
+        cached = build_app(True, None)
+        render_notebook(cached, [])  # compile, without caching any card
+        cold = render_notebook(cached, page)
+        warm = statistics.median(render_notebook(cached, page) for _ in range(args.repeat))
+        print(f"{label:<26} {uncached * 1000:8.1f}ms {cold * 1000:9.1f}ms {warm * 1000:9.1f}ms")
+
+
+def compile_times(args):
+    """First load of every template in a new worker: parse + compile vs. loading bytecode from disk."""
+    names = ["base.html", "notebook.html", "response.html", "select.html", "search.html"]
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in names:  # the first worker writes the bytecode
+            build_app(False, tmp).jinja_env.get_template(name)
+        print(f"\n{'first template load':<26} {'compile':>10} {'bytecode':>11}")
+        for label, bytecode_dir in (("compile", None), ("bytecode", tmp)):
+            samples = []
+            for _ in range(args.repeat):
+                env = build_app(False, bytecode_dir).jinja_env
+                started = time.perf_counter()
+                for name in names:
+                    env.get_template(name)
+                samples.append(time.perf_counter() - started)
+            if label == "compile":
+                compiled = statistics.median(samples)
+            else:
+                print(f"{len(names)} templates{'':<16} {compiled * 1000:8.1f}ms {statistics.median(samples) * 1000:9.1f}ms")
+
+
+def response_swap(args):
+    app = build_app(True, None)
+    client = app.test_client()
+    print(f"\n{'previous/next response':<26} {'latency':>10} {'bytes':>11}")
+    for label, path in (("full page render", "/response_page"), ("JSON swap", "/response_json")):
+        client.get(path)
+        samples, size = [], 0
+        for _ in range(args.repeat * 10):
+            started = time.perf_counter()
+            size = len(client.get(path).data)
+            samples.append(time.perf_counter() - started)
+        print(f"{label:<26} {statistics.median(samples) * 1000:8.2f}ms {size:11,d}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Template rendering: fragment cache, bytecode cache and JSON response swaps")
+    parser.add_argument("--notes", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    notebook_renders(args, make_notes(args.notes))
+    compile_times(args)
+    response_swap(args)
+
+
+if __name__ == "__main__":
+    main()
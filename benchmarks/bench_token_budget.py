@@ -0,0 +1,60 @@
+# Benchmark: provider latency/tokens with a fixed 1200-token cap vs. per-answer-type budgets, plus local counting cost
+import argparse
+import statistics
+import time
+
+from _support import APP_DIR  # noqa: F401  (puts app/ on sys.path)
+
+PROMPTS = {
+    "word_explanation": "Explain the meaning of the word '{i}' in simple terms, with an example in one sentence.",
+    "definition": "Define subtopic {i} of the topic in two or three sentences.",
+    "custom": "Topic: Algebra\nInstruction: {i} " + "please elaborate on every step in great detail " * 200,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fixed max_tokens vs. per-answer-type token budgets on a paced fake provider")
+    parser.add_argument("--requests", type=int, default=20, help="Requests per answer type")
+    parser.add_argument("--tokens-per-sec", type=float, default=4000, help="Fake provider generation speed")
+    parser.add_argument("--answer-tokens", type=int, default=1200, help="How long the fake model likes to talk")
+    parser.add_argument("--count-repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    from services.llm_backends import FakeBackend, register_backend
+    from services.llm_service import MAX_TOKENS, generate_llm_response
+    from services.prompt_service import PROMPT_MAX_TOKENS
+    from services.token_service import TokenUsage, count_tokens, fit_custom_prompt
+
+    register_backend(FakeBackend("bench-verbose", latency=0.005, tokens_per_sec=args.tokens_per_sec,
+                                 answer_tokens=args.answer_tokens))
+    budgets = dict(PROMPT_MAX_TOKENS, definition=300)
+
+    print(f"{'answer type':<18} {'budget':>12} {'latency':>10} {'completion':>11} {'prompt':>8}")
+    for prompt_type, template in PROMPTS.items():
+        for label, max_tokens in (("fixed", MAX_TOKENS), ("per type", budgets[prompt_type])):
+            samples, completion, prompt_tokens = [], 0, 0
+            for i in range(args.requests):
+                prompt = template.format(i=i)
+                if label == "per type" and prompt_type == "custom":
+                    prompt, _ = fit_custom_prompt(prompt)
+                usage = TokenUsage()
+                started = time.perf_counter()
+                generate_llm_response(prompt, provider="bench-verbose", use_cache=False,
+                                      max_tokens=max_tokens, usage=usage)
+                samples.append(time.perf_counter() - started)
+                completion += usage.completion_tokens
+                prompt_tokens += usage.prompt_tokens
+            print(f"{prompt_type:<18} {label + ' ' + str(max_tokens):>12} {statistics.median(samples) * 1000:8.1f}ms "
+                  f"{completion / args.requests:11.0f} {prompt_tokens / args.requests:8.0f}")
+
+    text = PROMPTS["custom"].format(i=0)
+    started = time.perf_counter()
+    for _ in range(args.count_repeat):
+        count_tokens(text)
+    per_call = (time.perf_counter() - started) / args.count_repeat
+    print(f"\ncount_tokens on a {len(text)}-char prompt: {per_call * 1e6:.0f} us "
+          f"({count_tokens(text)} tokens)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+# Benchmark: DB queries and latency per request on the real select / subtopics / generate / save routes, with and without the lookup caches
+import argparse
+import os
+import tempfile
+import time
+from types import SimpleNamespace
+
+from bench_app_flow import PASSWORD, _QUERIES, build_app, configure, percentile
+
+ROUTES = ("select", "subtopics", "generate", "save")
+
+
+class UncachedTopics:
+    """Stand-in for reference_service.topic_cache that reads both tables on every call."""
+
+    loads = 0
+
+    def get(self, session, Topic, Subtopic):
+        from services.reference_service import load_topic_tree
+        self.loads += 1
+        return load_topic_tree(session, Topic, Subtopic, self.loads)
+
+    def invalidate(self):
+        pass
+
+
+def run(client, catalog, prompt_types, pages):
+    """`pages` x (select, subtopics, generate, save); returns {route: [(seconds, queries)]}."""
+    samples = {route: [] for route in ROUTES}
+
+    def step(route, method, path, data=None, expect=200):
+        started = time.perf_counter()
+        response = client.open(path, method=method, data=data)
+        response.get_data()
+        seconds = time.perf_counter() - started
+        assert response.status_code == expect, f"{route}: HTTP {response.status_code}"
+        match = _QUERIES.search(response.headers.get("Server-Timing", ""))
+        samples[route].append((seconds, int(match.group(1)) if match else 0))
+        return response
+
+    for i in range(pages):
+        topic_id, subtopic_id = catalog[i % len(catalog)]
+        select = step("select", "GET", "/select")
+        assert b"Bench prompt" in select.get_data(), "saved prompt missing from the select page"
+        step("subtopics", "GET", f"/api/subtopics/{topic_id}")
+        step("generate", "POST", "/generate", {
+            "topic_id": topic_id, "subtopic_id": subtopic_id, "prompt_type": prompt_types[i % len(prompt_types)],
+            "llm_provider": "openai", "llm_api_key": "",
+        })
+        step("save", "POST", "/save", {"note": f"Note {i} on subtopic {subtopic_id}."}, expect=302)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Select/subtopics/generate/save through app_debug: "
+                                                 "queries and latency per request, with and without the lookup caches")
+    parser.add_argument("--topics", type=int, default=200)
+    parser.add_argument("--subtopics", type=int, default=50, help="subtopics per topic")
+    parser.add_argument("--pages", type=int, default=200)
+    args = parser.parse_args()
+    # Fake provider answers instantly and the response caches stay off: only the lookups differ between modes
+    args = SimpleNamespace(**vars(args), rate_limits=False, caches=False,
+                           llm_latency=0.0, llm_tokens_per_sec=0.0, answer_tokens=50)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        configure(args, tmp)
+        os.environ["TOPIC_CACHE_VERSION_FILE"] = os.path.join(tmp, "topics.version")
+        app, catalog, prompt_types = build_app(args, tmp)
+        import app_debug
+        from models import CustomPrompt, User
+        from services.reference_service import SavedPromptCache
+
+        client = app.test_client()
+        client.post("/register", data={"email": "bench@bench.test", "password": PASSWORD})
+        client.post("/login", data={"email": "bench@bench.test", "password": PASSWORD})
+        with app.app_context():
+            user_id = User.query.filter_by(email="bench@bench.test").one().id
+            app_debug.db.session.add(CustomPrompt(user_id=user_id, prompt_name="Bench prompt", answer_type="quiz",
+                                                  prompt_text="Quiz me on {{subtopic}}."))
+            app_debug.db.session.commit()
+
+        print(f"{args.topics} topics x {args.subtopics} subtopics, {args.pages} pages, "
+              f"{len(prompt_types)} prompt types, 1 saved prompt")
+        print(f"{'mode':<9} {'route':<10} {'queries':>8} {'p50 ms':>8} {'p95 ms':>8}")
+        cached = (app_debug.topic_cache, app_debug.saved_prompts)
+        modes = (("uncached", (UncachedTopics(), SavedPromptCache(ttl=0))), ("cached", cached))
+        results = {}
+        for mode, (topics, prompts) in modes:
+            app_debug.topic_cache, app_debug.saved_prompts = topics, prompts
+            run(client, catalog, prompt_types, 1)  # warm-up (loads the caches)
+            results[mode] = run(client, catalog, prompt_types, args.pages)
+            for route in ROUTES:
+                samples = results[mode][route]
+                seconds = [s for s, _ in samples]
+                queries = sum(q for _, q in samples) / len(samples)
+                print(f"{mode:<9} {route:<10} {queries:8.2f} "
+                      f"{percentile(seconds, 50) * 1000:8.2f} {percentile(seconds, 95) * 1000:8.2f}")
+        app_debug.topic_cache, app_debug.saved_prompts = cached
+
+        # With the user cache as well, select and subtopics never reach the database
+        for route in ("select", "subtopics"):
+            assert not any(q for _, q in results["cached"][route]), f"cached {route} still hits the database"
+
+        # A browser revalidating the subtopics list with its ETag gets a 304
+        topic_id = catalog[0][0]
+        etag = client.get(f"/api/subtopics/{topic_id}").headers["ETag"]
+        revalidated = client.get(f"/api/subtopics/{topic_id}", headers={"If-None-Match": etag})
+        print(f"revalidation: {revalidated.status_code}, {app_debug.topic_cache.loads} topic tree load(s)")
+
+        # Saving another prompt drops the user's entry, so the next select page lists it
+        with app.app_context():
+            app_debug.db.session.add(CustomPrompt(user_id=user_id, prompt_name="Second prompt", answer_type="summary",
+                                                  prompt_text="Summarise {{subtopic}}."))
+            app_debug.db.session.commit()
+        assert b"Second prompt" in client.get("/select").get_data(), "new prompt not shown after saving"
+        print(f"saved prompts: {app_debug.saved_prompts.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""Add indexes for the columns the routes filter on
+
+Revision ID: 3f1c2a9d7b10
+Revises:
+Create Date: 2026-10-18 10:00:00.000000
+
+Databases created with db.create_all() before this revision have no
+migration history, so every index is only created when it is missing and
+tables that don't exist yet are skipped (create_all adds the indexes).
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c2a9d7b10'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+INDEXES = [
+    ('ix_notes_notebook_created', 'notes', ['notebook_id', 'created_at', 'id']),
+    ('ix_notes_topic_id', 'notes', ['topic_id']),
+    ('ix_notes_subtopic_id', 'notes', ['subtopic_id']),
+    ('ix_subtopics_topic_name', 'subtopics', ['topic_id', 'name']),
+    ('ix_notebooks_user_id', 'notebooks', ['user_id']),
+    ('ix_custom_prompts_user_prompt', 'custom_prompts', ['user_id', 'prompt_text']),
+]
+
+
+def _existing_indexes(inspector, table):
+    return {index['name'] for index in inspector.get_indexes(table)}
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    tables = set(inspector.get_table_names())
+    for name, table, columns in INDEXES:
+        if table in tables and name not in _existing_indexes(inspector, table):
+            op.create_index(name, table, columns)
+
+
+def downgrade():
+    inspector = sa.inspect(op.get_bind())
+    tables = set(inspector.get_table_names())
+    for name, table, _ in reversed(INDEXES):
+        if table in tables and name in _existing_indexes(inspector, table):
+            op.drop_index(name, table_name=table)
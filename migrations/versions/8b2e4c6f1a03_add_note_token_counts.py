@@ -0,0 +1,47 @@
+"""Record prompt/completion token counts per note
+
+Revision ID: 8b2e4c6f1a03
+Revises: 3f1c2a9d7b10
+Create Date: 2026-10-18 12:00:00.000000
+
+Like the index revision, columns are only added when missing: the
+standalone app adds them itself on startup (services/schema_service.py).
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b2e4c6f1a03'
+down_revision = '3f1c2a9d7b10'
+branch_labels = None
+depends_on = None
+
+
+COLUMNS = ['prompt_tokens', 'completion_tokens']
+
+
+def _existing_columns(inspector, table):
+    return {column['name'] for column in inspector.get_columns(table)}
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if 'notes' not in inspector.get_table_names():
+        return
+    existing = _existing_columns(inspector, 'notes')
+    with op.batch_alter_table('notes') as batch_op:
+        for name in COLUMNS:
+            if name not in existing:
+                batch_op.add_column(sa.Column(name, sa.Integer(), nullable=True))
+
+
+def downgrade():
+    inspector = sa.inspect(op.get_bind())
+    if 'notes' not in inspector.get_table_names():
+        return
+    existing = _existing_columns(inspector, 'notes')
+    with op.batch_alter_table('notes') as batch_op:
+        for name in reversed(COLUMNS):
+            if name in existing:
+                batch_op.drop_column(name)
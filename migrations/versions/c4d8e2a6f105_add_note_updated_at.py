@@ -0,0 +1,42 @@
+"""Track when a note last changed (keys the rendered note card cache)
+
+Revision ID: c4d8e2a6f105
+Revises: 8b2e4c6f1a03
+Create Date: 2026-10-18 15:00:00.000000
+
+The column is added when missing (the standalone app adds it itself on
+startup, see services/schema_service.py); existing notes get their
+created_at as a starting value.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4d8e2a6f105'
+down_revision = '8b2e4c6f1a03'
+branch_labels = None
+depends_on = None
+
+
+def _existing_columns(inspector, table):
+    return {column['name'] for column in inspector.get_columns(table)}
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if 'notes' not in inspector.get_table_names():
+        return
+    if 'updated_at' not in _existing_columns(inspector, 'notes'):
+        with op.batch_alter_table('notes') as batch_op:
+            batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+    op.execute("UPDATE notes SET updated_at = created_at WHERE updated_at IS NULL")
+
+
+def downgrade():
+    inspector = sa.inspect(op.get_bind())
+    if 'notes' not in inspector.get_table_names():
+        return
+    if 'updated_at' in _existing_columns(inspector, 'notes'):
+        with op.batch_alter_table('notes') as batch_op:
+            batch_op.drop_column('updated_at')
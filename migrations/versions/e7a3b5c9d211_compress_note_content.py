@@ -0,0 +1,67 @@
+"""Store note content and custom prompts compressed (SQLite)
+
+Revision ID: e7a3b5c9d211
+Revises: c4d8e2a6f105
+Create Date: 2026-10-18 18:00:00.000000
+
+Existing rows are rewritten in batches with the NOTE_COMPRESSION settings
+(see app/services/compression_service.py); the text itself is unchanged.
+The FTS index is replaced with an external-content one that indexes
+note_text(content) through a view (no second, uncompressed copy of the
+text); its triggers are dropped while the rows are rewritten so the index
+isn't churned. Other
+databases keep plain text and are left alone.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from app.services.compression_service import recompress, register_sql_functions
+from app.services.search_service import FTS_TABLE, drop_index, install_triggers, rebuild_index
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7a3b5c9d211'
+down_revision = 'c4d8e2a6f105'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+COLUMNS = (('notes', 'content', True), ('custom_prompts', 'prompt_text', False))
+FTS_TRIGGERS = ('notes_fts_ai', 'notes_fts_au')
+
+
+def _prepare(conn):
+    # The triggers call note_text(); create_app() has loaded the dictionaries already
+    register_sql_functions(conn.connection.dbapi_connection)
+    tables = set(sa.inspect(conn).get_table_names())
+    for name in FTS_TRIGGERS:
+        op.execute(f"DROP TRIGGER IF EXISTS {name}")
+    return tables
+
+
+def _rewrite(conn, tables, plain):
+    for table, column, use_dictionary in COLUMNS:
+        if table in tables:
+            recompress(conn, table, column, use_dictionary, BATCH_SIZE, plain=plain, commit=False)
+
+
+def upgrade():
+    conn = op.get_bind()
+    if conn.dialect.name != 'sqlite':
+        return
+    tables = _prepare(conn)
+    _rewrite(conn, tables, plain=False)
+    if FTS_TABLE in tables:
+        install_triggers(conn)
+        rebuild_index(conn)
+
+
+def downgrade():
+    conn = op.get_bind()
+    if conn.dialect.name != 'sqlite':
+        return
+    # Drop the external-content index: the previous release's startup recreates its own and backfills it
+    tables = _prepare(conn)
+    _rewrite(conn, tables, plain=True)
+    if FTS_TABLE in tables:
+        drop_index(conn)